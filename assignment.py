@@ -0,0 +1,115 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# --- WORKLOAD-AWARE BATCH ASSIGNMENT ---
+# Assigns a batch of defects to developers at once, respecting capacity.
+# Scores follow the Forge manager (pit-crew-chief/src/manager.js):
+#   score = history * 0.7 + availability * 0.3
+# history: the developer's ownership affinity for the defect's context key
+# (Titans facts, normalized by the key's strongest owner; exclusive owners
+# score 1), availability: 1 - load.
+#
+# Capacity expansion: developer j gets one slot per defect they can still
+# take, and every defect already given to them adds defect_load, so slot k
+# has availability 1 - (load_j + k * defect_load). Capacity is the number of
+# slots before load reaches 1 (or an explicit cap). The defects x slots cost
+# matrix is solved exactly by the Hungarian method (linear_sum_assignment);
+# since a developer's slots only get worse, they are filled in order.
+
+HISTORY_WEIGHT = 0.7
+AVAILABILITY_WEIGHT = 0.3
+DEFAULT_DEFECT_LOAD = 0.1
+
+
+def history_matrix(store, keys, names):
+    """(len(keys), len(names)) ownership affinities from a TitansStore."""
+    col = {name: j for j, name in enumerate(names)}
+    hist = np.zeros((len(keys), len(names)))
+    for i, key in enumerate(keys):
+        owners = store.affinities(key)
+        top = max((w for w, _ in owners.values()), default=0.0)
+        for owner, (weight, exclusive) in owners.items():
+            j = col.get(owner)
+            if j is not None and top > 0:
+                hist[i, j] = 1.0 if exclusive else weight / top
+    return hist
+
+
+def capacities(loads, defect_load=DEFAULT_DEFECT_LOAD, caps=None):
+    """Defects each developer can still take: slots before load reaches 1, at most caps."""
+    loads = np.asarray(loads, dtype=np.float64)
+    slots = np.floor((1.0 - loads) / defect_load + 1e-9).clip(min=0).astype(np.int64)
+    if caps is not None:
+        slots = np.minimum(slots, np.asarray(caps, dtype=np.int64))
+    return slots
+
+
+def solve(history, loads, defect_load=DEFAULT_DEFECT_LOAD, caps=None):
+    """
+    history: (n_defects, n_devs) affinities in [0, 1]; loads: (n_devs,).
+    Returns (developer index per defect, -1 when capacity ran out;
+    score per defect, nan when unassigned).
+    """
+    history = np.asarray(history, dtype=np.float64)
+    loads = np.asarray(loads, dtype=np.float64)
+    n = history.shape[0]
+    # A developer never needs more slots than there are defects
+    slots = np.minimum(capacities(loads, defect_load, caps), n)
+    slot_dev = np.repeat(np.arange(len(loads)), slots)
+    slot_k = np.arange(len(slot_dev)) - np.repeat(np.cumsum(slots) - slots, slots)
+    avail = 1.0 - (loads[slot_dev] + slot_k * defect_load)
+
+    dev = np.full(n, -1, dtype=np.int64)
+    score = np.full(n, np.nan)
+    if n == 0 or len(slot_dev) == 0:
+        return dev, score
+    gain = HISTORY_WEIGHT * history[:, slot_dev] + AVAILABILITY_WEIGHT * avail
+    rows, cols = linear_sum_assignment(gain, maximize=True)
+    dev[rows] = slot_dev[cols]
+    score[rows] = gain[rows, cols]
+    return dev, score
+
+
+def greedy(history, loads, defect_load=DEFAULT_DEFECT_LOAD, caps=None):
+    """
+    Reference: each defect in turn takes its best developer with capacity
+    left (the per-defect manager.js ranking plus a load update).
+    """
+    history = np.asarray(history, dtype=np.float64)
+    load = np.array(loads, dtype=np.float64)
+    left = capacities(load, defect_load, caps)
+    dev = np.full(history.shape[0], -1, dtype=np.int64)
+    score = np.full(history.shape[0], np.nan)
+    for i in range(history.shape[0]):
+        gain = HISTORY_WEIGHT * history[i] + AVAILABILITY_WEIGHT * (1.0 - load)
+        gain[left <= 0] = -np.inf
+        j = int(np.argmax(gain))
+        if np.isfinite(gain[j]):
+            dev[i], score[i] = j, gain[j]
+            left[j] -= 1
+            load[j] += defect_load
+    return dev, score
+
+
+def assign_batch(store, context_keys, developers, defect_load=DEFAULT_DEFECT_LOAD):
+    """
+    context_keys: one per defect; developers: [{"name", "load"=0, "capacity"=None}].
+    Returns [{"assignee", "score", "history"}] in defect order (assignee
+    None when the team is out of capacity).
+    """
+    names = [d["name"] for d in developers]
+    loads = np.array([float(d.get("load", 0.0)) for d in developers])
+    caps = [d["capacity"] if d.get("capacity") is not None else np.iinfo(np.int64).max for d in developers]
+    # One history row per distinct context key, fanned out to the defects
+    keys, key_row = np.unique(np.array([str(k) for k in context_keys], dtype=object), return_inverse=True)
+    history = history_matrix(store, keys, names)[key_row.reshape(-1)]
+    dev, score = solve(history, loads, defect_load, caps)
+
+    out = []
+    for i, j in enumerate(dev.tolist()):
+        if j < 0:
+            out.append({"assignee": None, "score": None, "history": None})
+        else:
+            out.append({"assignee": names[j], "score": round(float(score[i]), 4),
+                        "history": round(float(history[i, j]), 4)})
+    return out
@@ -0,0 +1,239 @@
+import math
+
+import numpy as np
+
+from compact_lm import CompactTrigramLM
+from model_store import ID_BITS, MAX_VOCAB, MappedTrigramLM
+
+# --- BATCHED BEAM SEARCH ---
+# Decodes many sentences at once. All live hypotheses sit in flat arrays
+# (sentence, p2, p1, score, history slot); a hypothesis' tokens are recovered
+# at the end by following backpointers through the history arrays instead of
+# copying lists at every step. The LM is scored for all extensions of a step
+# with one vectorized lookup into a packed-key table.
+
+LM_WEIGHT = 0.5
+
+
+def _ragged_arange(lengths):
+    """[0..l0-1, 0..l1-1, ...] for an array of lengths."""
+    total = int(lengths.sum())
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total) - starts
+
+
+class LMScorer:
+    """
+    Vectorized view of DefectTranslator._get_lm_score.
+    Every score is precomputed with math.log exactly as the scalar path does
+    ((count + 0.1) / (total + 1000)), so batch and per-sentence decoding
+    produce bit-identical scores.
+    """
+    def __init__(self, lm_data):
+        self.source = lm_data
+        self.enabled = bool(lm_data)
+        self.backoff = None
+        if isinstance(lm_data, CompactTrigramLM):
+            self._init_compact(lm_data)
+        elif isinstance(lm_data, MappedTrigramLM):
+            self._init_mapped(lm_data)
+        else:
+            self._init_dict(lm_data)
+        self.unseen_ctx = math.log(0.1 / 1000)
+
+    def _init_dict(self, lm_data):
+        self.token_to_id = {}
+        ng_keys, ng_scores, ctx_keys, ctx_unseen = [], [], [], []
+        if lm_data:
+            ngram, ctx_count = lm_data
+            ids = self.token_to_id
+            for toks in list(ngram.keys()):
+                for t in toks:
+                    ids.setdefault(t, len(ids))
+                for w in ngram[toks]:
+                    ids.setdefault(w, len(ids))
+            if len(ids) >= MAX_VOCAB:
+                raise ValueError("LM vocabulary too large for packed keys")
+            for (p2, p1), row in list(ngram.items()):
+                total = ctx_count.get((p2, p1), 0)
+                ck = (ids[p2] << ID_BITS) | ids[p1]
+                for w, c in row.items():
+                    if c > 0:
+                        ng_keys.append((ck << ID_BITS) | ids[w])
+                        ng_scores.append(math.log((c + 0.1) / (total + 1000)))
+            for (p2, p1), total in ctx_count.items():
+                ctx_keys.append((ids[p2] << ID_BITS) | ids[p1])
+                ctx_unseen.append(math.log((0 + 0.1) / (total + 1000)))
+        self.lookup_id = self.token_to_id.get
+        self._set_tables(ng_keys, ng_scores, ctx_keys, ctx_unseen)
+
+    def _init_mapped(self, lm):
+        ng_counts = np.asarray(lm.ngrams.counts)
+        ng_keys = np.asarray(lm.ngrams.keys)
+        ctx_keys = np.asarray(lm.contexts.keys)
+        ctx_totals = np.asarray(lm.contexts.counts)
+        # Every trigram's context has an entry in the (sorted) context table.
+        totals = ctx_totals[np.searchsorted(ctx_keys, ng_keys >> ID_BITS)] if len(ng_keys) else ng_counts
+        ng_scores = [math.log((c + 0.1) / (t + 1000)) for c, t in zip(ng_counts.tolist(), totals.tolist())]
+        ctx_unseen = [math.log((0 + 0.1) / (t + 1000)) for t in ctx_totals.tolist()]
+        self._vocab = lm.vocab
+        self.lookup_id = self._mapped_id
+        self._set_tables(ng_keys, ng_scores, ctx_keys, ctx_unseen)
+
+    def _init_compact(self, lm):
+        self.lookup_id = lm.token_to_id.get
+        if lm.smoothing == "backoff":
+            # Scores depend on three tables; CompactTrigramLM vectorizes them itself.
+            self.backoff = lm
+            self._set_tables([], [], [], [])
+            return
+        totals = lm.ctx_totals[np.searchsorted(lm.ctx_keys, lm.tri_keys >> ID_BITS)] if len(lm) else lm.tri_counts
+        ng_scores = [math.log((c + 0.1) / (t + 1000)) for c, t in zip(lm.tri_counts.tolist(), totals.tolist())]
+        ctx_unseen = [math.log((0 + 0.1) / (t + 1000)) for t in lm.ctx_totals.tolist()]
+        self._set_tables(lm.tri_keys, ng_scores, lm.ctx_keys, ctx_unseen)
+
+    def _mapped_id(self, tok, default=None):
+        i = self._vocab.lookup(tok)
+        return default if i < 0 else i
+
+    def _set_tables(self, ng_keys, ng_scores, ctx_keys, ctx_unseen):
+        ng_keys = np.asarray(ng_keys, dtype=np.int64)
+        order = np.argsort(ng_keys, kind="stable")
+        self.ng_keys = ng_keys[order]
+        self.ng_scores = np.asarray(ng_scores, dtype=np.float64)[order]
+        ctx_keys = np.asarray(ctx_keys, dtype=np.int64)
+        order = np.argsort(ctx_keys, kind="stable")
+        self.ctx_keys = ctx_keys[order]
+        self.ctx_unseen = np.asarray(ctx_unseen, dtype=np.float64)[order]
+
+    def encode(self, tokens):
+        """Token list -> int64 ids (-1 for tokens the LM has never seen)."""
+        return np.asarray([self.lookup_id(t, -1) for t in tokens], dtype=np.int64)
+
+    @staticmethod
+    def _find(keys, query):
+        if len(keys) == 0:
+            return np.zeros(len(query), dtype=np.int64), np.zeros(len(query), dtype=bool)
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return pos, keys[pos] == query
+
+    def score(self, p2, p1, w):
+        """
+        Vectorized LM log-score for arrays of (p2, p1, w) ids.
+        """
+        if not self.enabled:
+            return np.zeros(len(w))
+        if self.backoff is not None:
+            return self.backoff.logprob_ids(p2, p1, w)
+        out = np.full(len(w), self.unseen_ctx)
+        ctx_ok = (p2 >= 0) & (p1 >= 0)
+        ctx = np.where(ctx_ok, (p2 << ID_BITS) | p1, -1)
+        pos, hit = self._find(self.ctx_keys, ctx)
+        hit &= ctx_ok
+        out[hit] = self.ctx_unseen[pos[hit]]
+
+        ng_ok = hit & (w >= 0)
+        key = np.where(ng_ok, (ctx << ID_BITS) | np.maximum(w, 0), -1)
+        pos, found = self._find(self.ng_keys, key)
+        found &= ng_ok
+        out[found] = self.ng_scores[pos[found]]
+        return out
+
+
+def decode_batch(model, texts, beam_width=5, stops=frozenset()):
+    """
+    Beam-search decodes every text in one pass. Returns the same best
+    hypotheses as DefectTranslator.translate (for the same beam width).
+    """
+    _, lm_data, index = model.snapshot()
+    scorer = getattr(model, "_lm_scorer", None)
+    if scorer is None or scorer.source is not lm_data:
+        scorer = model._lm_scorer = LMScorer(lm_data)
+    target_lm_ids = scorer.encode(index.targets)
+    tgt_ids = np.asarray(index.tgt_ids, dtype=np.int64)
+    cand_logp = np.asarray(index.logp, dtype=np.float64)
+    indptr = np.asarray(index.indptr, dtype=np.int64)
+
+    sents = [[w for w in model.tokenize(t) if w not in stops] for t in texts]
+    n = len(sents)
+    bos = scorer.lookup_id("<s>", -1)
+
+    # Live hypotheses (kept grouped by sentence, best first within a sentence)
+    h_sent = np.arange(n, dtype=np.int64)
+    h_p2 = np.full(n, bos, dtype=np.int64)
+    h_p1 = np.full(n, bos, dtype=np.int64)
+    h_score = np.zeros(n)
+    h_slot = np.full(n, -1, dtype=np.int64)
+    # History: token (index target id) and backpointer per emitted hypothesis
+    hist_tok, hist_back = [], []
+    hist_size = 0
+    dead = np.zeros(n, dtype=bool)
+
+    max_len = max((len(s) for s in sents), default=0)
+    for step in range(max_len):
+        active = np.asarray([len(s) > step for s in sents], dtype=bool) & ~dead
+        if not active.any():
+            break
+        # Candidate rows for the current source word of every active sentence
+        lo = np.zeros(n, dtype=np.int64)
+        cnt = np.zeros(n, dtype=np.int64)
+        for s in np.flatnonzero(active).tolist():
+            r = index.row_of.get(sents[s][step])
+            if r is not None:
+                lo[s], cnt[s] = indptr[r], indptr[r + 1] - indptr[r]
+        # A source word without candidates empties that sentence's beam.
+        newly_dead = active & (cnt == 0)
+        dead |= newly_dead
+        extend = active & ~newly_dead
+
+        keep = ~newly_dead[h_sent]
+        h_sent, h_p2, h_p1, h_score, h_slot = (a[keep] for a in (h_sent, h_p2, h_p1, h_score, h_slot))
+        moving = extend[h_sent]
+        if not moving.any():
+            continue
+
+        # Extensions: every moving hypothesis x every candidate (hyp-major order)
+        m_idx = np.flatnonzero(moving)
+        reps = cnt[h_sent[m_idx]]
+        parent = np.repeat(m_idx, reps)
+        cand = lo[h_sent[parent]] + _ragged_arange(reps)
+        tid = tgt_ids[cand]
+        lm = scorer.score(h_p2[parent], h_p1[parent], target_lm_ids[tid])
+        e_score = h_score[parent] + cand_logp[cand] + (LM_WEIGHT * lm)
+        e_sent = h_sent[parent]
+
+        # Prune per sentence: score descending, ties in extension order
+        order = np.lexsort((np.arange(len(e_score)), -e_score, e_sent))
+        sorted_sent = e_sent[order]
+        first = np.searchsorted(sorted_sent, sorted_sent, side="left")
+        order = order[(np.arange(len(order)) - first) < beam_width]
+        parent, tid = parent[order], tid[order]
+
+        slots = np.arange(hist_size, hist_size + len(order), dtype=np.int64)
+        hist_tok.append(tid)
+        hist_back.append(h_slot[parent])
+        hist_size += len(order)
+
+        new = (e_sent[order], h_p1[parent], target_lm_ids[tid], e_score[order], slots)
+        # Sentences that did not move this step keep their beams unchanged.
+        stay = ~moving
+        h_sent, h_p2, h_p1, h_score, h_slot = (
+            np.concatenate([a[stay], b]) for a, b in zip((h_sent, h_p2, h_p1, h_score, h_slot), new))
+        regroup = np.argsort(h_sent, kind="stable")
+        h_sent, h_p2, h_p1, h_score, h_slot = (a[regroup] for a in (h_sent, h_p2, h_p1, h_score, h_slot))
+
+    tok = np.concatenate(hist_tok) if hist_tok else np.zeros(0, dtype=np.int64)
+    back = np.concatenate(hist_back) if hist_back else np.zeros(0, dtype=np.int64)
+    results = [""] * n
+    best = {}
+    for s, slot in zip(h_sent.tolist(), h_slot.tolist()):
+        best.setdefault(s, slot)
+    for s, slot in best.items():
+        if dead[s]:
+            continue
+        out = []
+        while slot >= 0:
+            out.append(index.targets[int(tok[slot])])
+            slot = int(back[slot])
+        results[s] = " ".join(reversed(out))
+    return results
@@ -0,0 +1,127 @@
+"""
+/analyze latency with the columnar dataset cache: cold (first request converts the CSV),
+warm (memory-mapped frame from the LRU), against the previous per-request pd.read_csv.
+Also checks that a warm log is served while another one converts and that
+concurrent first requests for one log convert it once, and that rewriting a
+log after a restart removes the old conversion from disk.
+Usage: python bench_analyze.py --rows 5000000 --requests 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_common import percentile
+
+
+def write_log(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "timestamp": np.arange(rows),
+        "latency_ms": rng.lognormal(6.0, 0.5, rows).round(1),
+        "status": rng.choice([200, 200, 200, 201, 404, 500, 503], rows),
+    }).to_csv(path, index=False)
+
+
+def check_concurrent(datasets, warm_path, cold_path, threads=4):
+    """(warm get() latencies during the conversion of cold_path, conversions, conversion seconds)."""
+    datasets.get(warm_path)
+    before = datasets.stats["conversions"]
+    frames = []
+
+    def convert():
+        frames.append(datasets.get(cold_path))
+
+    workers = [threading.Thread(target=convert) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in workers:
+        t.start()
+    lat = []
+    while any(t.is_alive() for t in workers):
+        t1 = time.perf_counter()
+        datasets.get(warm_path)
+        lat.append(time.perf_counter() - t1)
+        time.sleep(0.001)
+    convert_s = time.perf_counter() - t0
+    for t in workers:
+        t.join()
+    same = all(f is frames[0] for f in frames)
+    return lat, datasets.stats["conversions"] - before if same else -1, convert_s
+
+
+def check_stale_cleanup(workdir, rows):
+    """Versions of the log left on disk after a rewrite seen only by a restarted manager."""
+    from log_store import DatasetManager, fingerprint
+
+    path = os.path.join(workdir, "rewritten.csv")
+    cache_dir = os.path.join(workdir, "cache_restart")
+    write_log(path, rows)
+    DatasetManager(cache_dir=cache_dir).get(path)
+    time.sleep(0.01)
+    write_log(path, rows, seed=2)
+    restarted = DatasetManager(cache_dir=cache_dir)
+    restarted.get(path)
+    source_dir, current = os.path.split(restarted._dataset_dir(fingerprint(path)))
+    return sorted(os.listdir(source_dir)), current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pcc_analyze_")
+    csv_path = os.path.join(workdir, "logs.csv")
+    write_log(csv_path, args.rows)
+    print(f"log: {args.rows} rows, {os.path.getsize(csv_path) / 2**20:.1f}MB")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import brain_server
+        from log_store import DatasetManager
+        brain_server.analyst.datasets = DatasetManager(cache_dir=os.path.join(workdir, "cache"))
+        brain_server.CSV_PATH = csv_path
+        client = brain_server.app.test_client()
+        body = {"defect": "Gateway Timeout 504", "requirement": "Latency must be under 500ms"}
+
+        t0 = time.perf_counter()
+        client.post("/analyze", json=body)
+        cold = time.perf_counter() - t0
+        warm = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            verdict = client.post("/analyze", json=body).json["verdict"]
+            warm.append(time.perf_counter() - t0)
+
+    baseline = []
+    for _ in range(min(args.requests, 3)):
+        t0 = time.perf_counter()
+        pd.read_csv(csv_path)["latency_ms"].quantile(0.99)
+        baseline.append(time.perf_counter() - t0)
+
+    print(f"verdict: {verdict}")
+    print(f"cold (convert + map) : {cold * 1000:10.1f}ms")
+    print(f"warm p50 / p99       : {percentile(warm, 50) * 1000:10.1f}ms / {percentile(warm, 99) * 1000:.1f}ms")
+    print(f"read_csv per request : {percentile(baseline, 50) * 1000:10.1f}ms (p50, parse + quantile only)")
+
+    other = os.path.join(workdir, "other.csv")
+    write_log(other, args.rows, seed=1)
+    lat, conversions, convert_s = check_concurrent(brain_server.analyst.datasets, csv_path, other)
+    ok = conversions == 1 and bool(lat) and max(lat) < convert_s / 2
+    print(f"warm get() while 4 requests convert another log ({convert_s * 1000:.0f}ms): "
+          f"max {max(lat, default=0) * 1000:.2f}ms over {len(lat)} calls; conversions {conversions}: {ok}")
+    versions, current = check_stale_cleanup(workdir, min(args.rows, 100_000))
+    cleaned = versions == [current]
+    print(f"rewrite after restart: versions on disk {versions}, only the current one kept: {cleaned}")
+    return 0 if ok and cleaned else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
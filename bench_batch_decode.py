@@ -0,0 +1,53 @@
+"""
+Throughput benchmark: DefectTranslator.translate in a loop vs translate_batch.
+Usage: python bench_batch_decode.py --pairs 20000 --sentences 5000 [--compact-dir /tmp/pcc_compact]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from bench_common import synthetic_pairs
+from mmloso_translator import DefectTranslator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--sentences", type=int, default=5000)
+    parser.add_argument("--beam-width", type=int, default=5)
+    parser.add_argument("--compact-dir", default=None,
+                        help="also decode through a compact (memory-mapped) copy of the model")
+    args = parser.parse_args(argv)
+
+    model = DefectTranslator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(synthetic_pairs(args.pairs), em_iter=3)
+    texts = [req for req, _ in synthetic_pairs(args.sentences, seed=1)]
+
+    models = [("dict", model)]
+    if args.compact_dir:
+        model.save_compact(args.compact_dir)
+        mapped = DefectTranslator()
+        mapped.load(args.compact_dir)
+        models.append(("compact", mapped))
+
+    ok = True
+    for name, m in models:
+        t0 = time.perf_counter()
+        loop_out = [m.translate(t) for t in texts]
+        loop_secs = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        batch_out = m.translate_batch(texts, beam_width=args.beam_width)
+        batch_secs = time.perf_counter() - t0
+        same = loop_out == batch_out
+        ok &= same or args.beam_width != 5
+        print(f"[{name}] translate loop: {len(texts) / loop_secs:9.0f} sent/s   "
+              f"translate_batch: {len(texts) / batch_secs:9.0f} sent/s   "
+              f"(x{loop_secs / batch_secs:.1f})  identical: {same}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
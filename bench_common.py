@@ -0,0 +1,53 @@
+import random
+import time
+import tracemalloc
+
+# --- SHARED BENCHMARK HELPERS ---
+# Synthetic Requirement/Defect corpora and timing utilities used by the bench_*.py scripts.
+
+VERBS = ["verify", "validate", "encrypt", "log", "load", "return", "store", "render", "authorize", "export"]
+NOUNS = ["patient", "record", "prescription", "session", "password", "profile", "report", "image", "token", "invoice"]
+ERRORS = ["NullPointerException", "TimeoutException", "SQLInjectionWarning", "PrivacyViolation",
+          "AuthError", "UploadFailed", "IntegrityConstraintViolation", "GatewayTimeout"]
+
+
+def synthetic_pairs(n, seed=0, n_components=2000):
+    """
+    Generates n (Requirement_Text, Defect_Text) pairs shaped like the iTrust corpus,
+    with a vocabulary that keeps growing with n (component names, numbers).
+    """
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        comp = f"Component{int(rng.paretovariate(1.2)) % n_components}"
+        verb, noun = rng.choice(VERBS), rng.choice(NOUNS)
+        limit = rng.choice([100, 200, 500, 1000])
+        req = (f"The system shall {verb} the {noun} in {comp} within {limit}ms. "
+               f"Access to the {noun} must be logged with a timestamp.")
+        defect = (f"Error in {comp}.java: {rng.choice(ERRORS)}. "
+                  f"Failed to {verb} {noun} for user {rng.randint(1, 50000)}. "
+                  f"Latency observed: {rng.randint(50, 5000)}ms.")
+        pairs.append((req, defect))
+    return pairs
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Runs fn once and returns (result, seconds, peak_traced_bytes).
+    NumPy allocations are reported to tracemalloc as well.
+    """
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def percentile(samples, q):
+    s = sorted(samples)
+    if not s:
+        return 0.0
+    k = min(len(s) - 1, max(0, int(round(q / 100.0 * (len(s) - 1)))))
+    return s[k]
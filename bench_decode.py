@@ -0,0 +1,75 @@
+"""
+Decode-latency benchmark for DefectTranslator.translate over the iTrust requirements.
+Compares the precomputed top-K candidate index with the previous per-request
+sort + math.log path (reimplemented below as the reference) and reports p50/p99.
+Usage: python bench_decode.py [--data itrust_rovo_training.jsonl] [--extra-pairs 20000] [--repeat 20]
+"""
+import argparse
+import contextlib
+import io
+import math
+import sys
+import time
+
+from bench_common import percentile, synthetic_pairs
+from generate_data import load_itrust_pairs
+from mmloso_translator import COMMON_STOPS, DefectTranslator
+
+
+def legacy_translate(model, source_text):
+    src_toks = model.tokenize(source_text)
+    beam = [([], "<s>", "<s>", 0.0)]
+    for sw in src_toks:
+        if sw in COMMON_STOPS:
+            continue
+        candidates = model.lex_prob.get(sw, {})
+        top_cands = sorted(candidates.items(), key=lambda x: x[1], reverse=True)[:5]
+        new_beam = []
+        for hyp, p2, p1, score in beam:
+            for tw, prob in top_cands:
+                lm_prob = model._get_lm_score(tw, p2, p1)
+                new_beam.append((hyp + [tw], p1, tw, score + math.log(prob) + (0.5 * lm_prob)))
+        new_beam.sort(key=lambda x: x[3], reverse=True)
+        beam = new_beam[:5]
+    return " ".join(beam[0][0]) if beam else ""
+
+
+def run(fn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            t0 = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - t0) * 1e6)
+    return samples, [fn(q) for q in queries]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="itrust_rovo_training.jsonl")
+    parser.add_argument("--extra-pairs", type=int, default=20000,
+                        help="synthetic pairs mixed into training so rows are realistically long")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    itrust = load_itrust_pairs(args.data)
+    model = DefectTranslator(cand_k=args.k)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(itrust + synthetic_pairs(args.extra_pairs), em_iter=3)
+    queries = [req for req, _ in itrust]
+
+    legacy, legacy_out = run(lambda q: legacy_translate(model, q), queries, args.repeat)
+    fast, fast_out = run(model.translate, queries, args.repeat)
+    for name, samples in (("sort+log (before)", legacy), ("top-k index", fast)):
+        print(f"{name:<18} p50 {percentile(samples, 50):9.1f}us  p99 {percentile(samples, 99):9.1f}us  "
+              f"({len(samples)} requests)")
+    if args.k != 5:
+        return 0  # the reference decoder is fixed at 5 candidates
+    same = legacy_out == fast_out
+    print(f"identical output: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
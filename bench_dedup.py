@@ -0,0 +1,132 @@
+"""
+Near-duplicate detection benchmark: DedupIndex (MinHash + banded LSH) against
+an exact Jaccard scan of every ticket, at 10k, 100k and 1M tickets. A share of
+the synthetic tickets re-file an earlier one with a new latency figure (the
+PatientDAO-style variants). Reports build time, index size, query latency,
+recall against the scan, incremental add() cost and a save/load round trip.
+Usage: python bench_dedup.py [--sizes 10000,100000,1000000] [--queries 200] [--dup-rate 0.3]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_common import percentile, synthetic_pairs
+from dedup_index import DEFAULT_THRESHOLD, DedupIndex
+from pit_crew_core import SMTTranslator
+
+LATENCY_RE = re.compile(r"Latency observed: \d+ms")
+
+
+def refile(text, rng):
+    return LATENCY_RE.sub(f"Latency observed: {rng.randint(50, 5000)}ms", text)
+
+
+def synthetic_tickets(n, dup_rate, seed=0):
+    """n defect texts; dup_rate of them re-file an earlier ticket."""
+    rng = random.Random(seed)
+    out = []
+    for _, defect in synthetic_pairs(n, seed=seed):
+        out.append(refile(rng.choice(out), rng) if out and rng.random() < dup_rate else defect)
+    return out
+
+
+def exact_scan(index, q, threshold):
+    """Ticket ids with shingle Jaccard >= threshold, by scanning every ticket."""
+    vals = index.shingle_hashes
+    pos = np.minimum(np.searchsorted(q, vals), len(q) - 1)
+    hits = np.concatenate([[0], np.cumsum(q[pos] == vals)])
+    inter = hits[index.indptr[1:]] - hits[index.indptr[:-1]]
+    sims = inter / (np.diff(index.indptr) + len(q) - inter)
+    return np.flatnonzero(sims >= threshold)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dup-rate", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--adds", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    normalize = SMTTranslator().normalize
+    sizes = [int(s) for s in args.sizes.split(",")]
+    tickets = synthetic_tickets(max(sizes), args.dup_rate)
+    rng = random.Random(1)
+    ok = True
+    print(f"{'tickets':>9}{'build s':>9}{'MB':>8}{'lsh p50 us':>12}{'lsh p99 us':>12}"
+          f"{'scan p50 ms':>13}{'recall':>9}{'hit rate':>10}")
+    for n in sizes:
+        index = DedupIndex(normalize, threshold=args.threshold)
+        t0 = time.perf_counter()
+        index.add_many(tickets[:n])
+        build = time.perf_counter() - t0
+
+        queries = [refile(tickets[rng.randrange(n)], rng) for _ in range(args.queries)]
+        lsh_t, scan_t, found, truth, hit, dup_queries = [], [], 0, 0, 0, 0
+        for q in queries:
+            t0 = time.perf_counter()
+            near = index.near(q)
+            lsh_t.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            exact = exact_scan(index, index.shingles(q), args.threshold)
+            scan_t.append(time.perf_counter() - t0)
+            got = {d for d, _ in near}
+            ok &= got <= set(exact.tolist())
+            found += len(got)
+            truth += len(exact)
+            if len(exact):
+                dup_queries += 1
+                hit += bool(near) and near[0][1] >= args.threshold
+        recall = found / truth if truth else 1.0
+        hit_rate = hit / dup_queries if dup_queries else 1.0
+        ok &= recall >= 0.95
+        print(f"{n:>9}{build:>9.2f}{index.nbytes() / 2**20:>8.1f}{percentile(lsh_t, 50) * 1e6:>12.1f}"
+              f"{percentile(lsh_t, 99) * 1e6:>12.1f}{percentile(scan_t, 50) * 1e3:>13.2f}"
+              f"{recall:>9.4f}{hit_rate:>10.4f}")
+
+    # Journaled inserts on top of a snapshot of the last index, then reload
+    # (snapshot + journal replay) and reload again after compact()
+    path = os.path.join(tempfile.mkdtemp(prefix="pcc_dedup_"), "dedup_index.npz")
+    index.path, index.journal_path = path, path + ".journal"
+    index.save()
+    extra = [refile(rng.choice(tickets), rng) for _ in range(args.adds)]
+    t0 = time.perf_counter()
+    for i, text in enumerate(extra):
+        index.add(text, payload={"link": f"REQ-{i % 50}"}, key=f"BUG-{i}")
+    add_s = time.perf_counter() - t0
+    expected = [index.near(q) for q in queries[:50]]
+    index.close()
+    t0 = time.perf_counter()
+    replayed = DedupIndex(normalize, path=path, threshold=args.threshold)
+    load_s = time.perf_counter() - t0
+    same = [replayed.near(q) for q in queries[:50]] == expected and len(replayed) == len(index)
+    replayed.compact()
+    reloaded = DedupIndex(normalize, path=path, threshold=args.threshold)
+    same &= [reloaded.near(q) for q in queries[:50]] == expected
+    same &= reloaded.payload(len(reloaded) - 1) == {"link": f"REQ-{(args.adds - 1) % 50}"}
+    ok &= same
+    print(f"\nadd() x{args.adds}: {add_s / args.adds * 1e6:.1f}us per ticket (journaled); "
+          f"load + journal replay {load_s:.2f}s; reload identical: {same}")
+
+    # A crash between compact()'s snapshot and its journal removal: the entries
+    # already in the snapshot must not be replayed a second time.
+    reloaded.add(extra[0], key="BUG-after-compact")
+    reloaded.save()
+    reloaded.add(extra[1], key="BUG-after-save")
+    reloaded.close()
+    crashed = DedupIndex(normalize, path=path, threshold=args.threshold)
+    no_dupes = len(crashed) == len(index) + 2 and crashed.keys[-2:] == ["BUG-after-compact", "BUG-after-save"]
+    ok &= no_dupes
+    print(f"reload after a crash mid-compaction: {len(crashed)} tickets, no replayed duplicates: {no_dupes}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
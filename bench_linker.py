@@ -0,0 +1,136 @@
+"""
+Requirement-linking latency vs index size: RequirementIndex.search (max-score pruning)
+against a linear scan over all requirements. Also times incremental upsert/delete
+and checks that searches running while other threads upsert/delete never fail.
+Usage: python bench_linker.py --sizes 1000 10000 40000 --queries 500 --k 5
+"""
+import argparse
+import math
+import random
+import sys
+import threading
+import time
+
+from bench_common import ERRORS, NOUNS, VERBS, percentile
+from requirement_index import RequirementIndex
+
+QUALITIES = ["latency", "availability", "integrity", "privacy", "audit", "encryption", "timeout", "throughput"]
+
+
+def synthetic_requirements(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        comp = f"component{int(rng.paretovariate(1.1)) % max(n // 4, 1)}"
+        q = rng.choice(QUALITIES)
+        yield {
+            "id": f"REQ-{i}",
+            "text": (f"The {comp} shall {rng.choice(VERBS)} every {rng.choice(NOUNS)} "
+                     f"and keep {q} within {rng.choice([100, 200, 500, 1000])}ms."),
+            "tags": [q, comp],
+        }
+
+
+def linear_scan(index, keywords, k):
+    n_docs = len(index.records)
+    qterms = list(dict.fromkeys(t for kw in keywords for t in index.tokenize(kw)))
+    scores = []
+    for req_id, rec in index.records.items():
+        weights = index._terms(rec)
+        s = sum(math.log(1.0 + n_docs / len(index.postings[t])) * weights[t] for t in qterms if t in weights)
+        if s > 0:
+            scores.append((-s, index._seq[req_id], req_id))
+    scores.sort()
+    return [r for _, _, r in scores[:k]]
+
+
+def check_concurrent(n=2000, seconds=1.0, seed=3):
+    """Searches in one thread while others upsert / delete the same ids (POST / DELETE /requirements)."""
+    index = RequirementIndex()
+    for rec in synthetic_requirements(n):
+        index.upsert(rec)
+    errors, stop = [], threading.Event()
+
+    def writer(k):
+        rng = random.Random(seed + k)
+        try:
+            while not stop.is_set():
+                i = rng.randrange(n)
+                if rng.random() < 0.5:
+                    index.delete(f"REQ-{i}")
+                else:
+                    index.upsert({"id": f"REQ-{i}", "text": f"{rng.choice(QUALITIES)} of component{i % 50}",
+                                  "tags": [rng.choice(QUALITIES), f"component{rng.randrange(n)}"]})
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        rng = random.Random(seed)
+        try:
+            while not stop.is_set():
+                index.best([rng.choice(QUALITIES), f"component{rng.randrange(50)}"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(2)] + [threading.Thread(target=reader)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)   # switch threads often enough to hit the races
+    try:
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 40000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--scan-queries", type=int, default=20, help="queries checked against the linear scan")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    for n in args.sizes:
+        index = RequirementIndex()
+        t0 = time.perf_counter()
+        for rec in synthetic_requirements(n):
+            index.upsert(rec)
+        build = time.perf_counter() - t0
+
+        queries = [[rng.choice(QUALITIES), f"component{rng.randint(0, max(n // 4, 1))}", rng.choice(NOUNS)]
+                   for _ in range(args.queries)]
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q, k=args.k)
+            lat.append((time.perf_counter() - t0) * 1e6)
+
+        scan_lat, agree = [], True
+        for q in queries[:args.scan_queries]:
+            t0 = time.perf_counter()
+            expected = linear_scan(index, q, args.k)
+            scan_lat.append((time.perf_counter() - t0) * 1e6)
+            agree &= [r for r, _ in index.search(q, k=args.k)] == expected
+
+        t0 = time.perf_counter()
+        for i in range(200):
+            index.upsert({"id": f"REQ-{i}", "text": f"Updated {rng.choice(ERRORS)} handling", "tags": ["latency"]})
+            index.delete(f"REQ-{n - 1 - i}")
+        mutate = (time.perf_counter() - t0) / 400 * 1e6
+
+        print(f"n={n:>7}: build {build:6.2f}s  search p50 {percentile(lat, 50):8.1f}us p99 {percentile(lat, 99):8.1f}us  "
+              f"linear scan p50 {percentile(scan_lat, 50):10.1f}us  same top-{args.k}: {agree}  "
+              f"upsert/delete {mutate:6.1f}us")
+
+    errors = check_concurrent()
+    print(f"search during concurrent upsert/delete: {'ok' if not errors else repr(errors[0])}")
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
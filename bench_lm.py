@@ -0,0 +1,158 @@
+"""
+Trigram LM benchmark: Counter tables (DefectTranslator lm_backend="dict") vs
+CompactTrigramLM. Reports traced bytes per stored n-gram, scalar and vectorized
+lookups/sec, and checks that add-k scores match and that lookups leave both
+models unchanged (the old ngram[ctx][w] read inserted every unseen context).
+--check runs only a small check that lookups of unseen contexts and words
+leave every compact LM array (and the dict tables) unchanged.
+Usage: python bench_lm.py [--pairs 20000] [--queries 200000] [--min-count 2] [--check]
+"""
+import argparse
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_common import synthetic_pairs
+from compact_lm import CompactTrigramLM
+from mmloso_translator import DefectTranslator
+
+
+def traced(fn):
+    """(result, bytes still allocated by fn's result)."""
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def dict_size(lm_data):
+    ngram, ctx_count = lm_data
+    return len(ngram), sum(len(r) for r in ngram.values()), len(ctx_count)
+
+
+def legacy_score(lm_data, w, p2, p1):
+    ngram, ctx_count = lm_data
+    ctx = (p2, p1)
+    return math.log((ngram[ctx][w] + 0.1) / (ctx_count[ctx] + 1000))
+
+
+def check_readonly():
+    """Lookups of unseen contexts / words leave the model's arrays, sizes and tables unchanged."""
+    sents = [s.split() for s in ("login page fails", "login page times out", "report export fails")]
+    unseen = [("crash", "login", "page"), ("page", "billing", "report"), ("fails", "<s>", "<s>"),
+              ("</s>", "nope", "nada"), ("login", "report", "export")]
+    ok = True
+    for smoothing in ("addk", "backoff"):
+        lm = CompactTrigramLM.from_sentences(sents, smoothing=smoothing)
+        names = [k for k, v in vars(lm).items() if isinstance(v, np.ndarray)]
+        before = {k: getattr(lm, k).copy() for k in names}
+        sizes = (len(lm), lm.nbytes, len(lm.tokens), dict(lm.token_to_id))
+        for w, p2, p1 in unseen:
+            lm.logprob(w, p2, p1)
+            lm.count((p2, p1), w)
+            lm.ctx_count((p2, p1))
+        ids = [lm.encode(col) for col in zip(*unseen)]
+        lm.logprob_ids(ids[1], ids[2], ids[0])
+        same = all(np.array_equal(before[k], getattr(lm, k)) for k in names)
+        ok &= same and sizes == (len(lm), lm.nbytes, len(lm.tokens), dict(lm.token_to_id))
+    ref = DefectTranslator(lm_backend="dict")
+    dict_lm = ref._train_trigram([" ".join(s) for s in sents])
+    size = dict_size(dict_lm)
+    for w, p2, p1 in unseen:
+        ref._get_lm_score(w, p2, p1, dict_lm)
+    return ok and dict_size(dict_lm) == size
+
+
+def queries_from(model, sentences, n, seed=0):
+    """(w, p2, p1) triples from held-out sentences: mostly seen, some unseen."""
+    rng = random.Random(seed)
+    triples = []
+    for s in sentences:
+        toks = ["<s>", "<s>"] + model.tokenize(s) + ["</s>"]
+        triples.extend((toks[i], toks[i - 2], toks[i - 1]) for i in range(2, len(toks)))
+    return [rng.choice(triples) for _ in range(n)]
+
+
+def rate(fn, queries):
+    t0 = time.perf_counter()
+    for w, p2, p1 in queries:
+        fn(w, p2, p1)
+    return len(queries) / (time.perf_counter() - t0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200000)
+    parser.add_argument("--min-count", type=int, default=2, help="pruning threshold of the pruned variant")
+    parser.add_argument("--check", action="store_true", help="only run the read-only lookup check")
+    args = parser.parse_args(argv)
+
+    readonly = check_readonly()
+    print(f"unseen lookups leave arrays and sizes unchanged: {readonly}")
+    if args.check:
+        return 0 if readonly else 1
+
+    pairs = synthetic_pairs(args.pairs)
+    held_out = [t for _, t in synthetic_pairs(1000, seed=1)]
+    sents = [t for _, t in pairs]
+    ref = DefectTranslator(lm_backend="dict")
+    dict_lm, dict_bytes = traced(lambda: ref._train_trigram(sents))
+    n_grams = dict_size(dict_lm)[1]
+    variants = [("dict (Counter)", dict_lm, dict_bytes)]
+    for label, kw in (("compact add-k", {}),
+                      (f"compact backoff min_count={args.min_count}",
+                       {"min_count": args.min_count, "smoothing": "backoff"})):
+        model = DefectTranslator(lm_backend="compact", lm_min_count=kw.get("min_count", 1),
+                                 lm_smoothing=kw.get("smoothing", "addk"))
+        lm, nbytes = traced(lambda: model._train_trigram(sents))
+        variants.append((label, lm, nbytes))
+    queries = queries_from(ref, held_out, args.queries)
+
+    print(f"{n_grams} trigrams, {len(queries)} lookups ({args.pairs} training sentences)")
+    ok = True
+    for label, lm, nbytes in variants:
+        stored = n_grams if label.startswith("dict") else len(lm)
+        before = dict_size(lm) if label.startswith("dict") else (lm.nbytes, len(lm))
+        scalar = rate(lambda w, p2, p1: ref._get_lm_score(w, p2, p1, lm), queries)
+        after = dict_size(lm) if label.startswith("dict") else (lm.nbytes, len(lm))
+        line = (f"{label:<28} {nbytes / max(stored, 1):7.1f} B/ngram ({stored} kept)  "
+                f"scalar {scalar / 1e3:8.1f}k lookups/s")
+        if isinstance(lm, CompactTrigramLM):
+            ids = [lm.encode(col) for col in zip(*queries)]
+            t0 = time.perf_counter()
+            lm.probs_ids(ids[1], ids[2], ids[0])
+            line += f"  vectorized {len(queries) / (time.perf_counter() - t0) / 1e6:6.2f}M lookups/s"
+        print(line)
+        if before != after:
+            print(f"  lookups mutated the model: {before} -> {after}")
+            ok = False
+
+    # Add-k compact scores are the dict scores; scalar and vectorized paths agree
+    compact = variants[1][1]
+    sample = queries[:5000]
+    same = all(ref._get_lm_score(w, p2, p1, dict_lm) == compact.logprob(w, p2, p1) for w, p2, p1 in sample)
+    print(f"compact add-k identical to dict: {same}")
+    for label, lm, _ in variants[1:]:
+        ids = [lm.encode(col) for col in zip(*sample)]
+        vec = lm.logprob_ids(ids[1], ids[2], ids[0]).tolist()
+        agree = vec == [lm.logprob(w, p2, p1) for w, p2, p1 in sample]
+        print(f"{label}: scalar == vectorized: {agree}")
+        same &= agree
+
+    # What the previous read path did to the live tables
+    legacy = ref._train_trigram(sents)
+    size = dict_size(legacy)
+    for w, p2, p1 in queries:
+        legacy_score(legacy, w, p2, p1)
+    print(f"legacy ngram[ctx][w] lookups grew the dict LM from {size[0]} to {dict_size(legacy)[0]} contexts")
+    return 0 if ok and same and readonly else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Instrumentation overhead benchmark: cost of one stage timer (enabled, disabled
+and record()) against an empty loop, /metrics rendering time, and an
+end-to-end check that /trace requests through the Flask test client populate
+every pipeline stage on /metrics.
+Usage: python bench_metrics.py [--iterations 1000000] [--requests 200] [--threads 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import instrumentation
+
+STAGES = ("smt_translate", "requirement_link", "code_gen", "csv_load", "exec", "assignment")
+
+
+def per_call_ns(fn, iterations):
+    t0 = time.perf_counter_ns()
+    fn(iterations)
+    return (time.perf_counter_ns() - t0) / iterations
+
+
+def empty(n):
+    for _ in range(n):
+        pass
+
+
+def timed(registry):
+    def loop(n):
+        timer = registry.timer
+        for _ in range(n):
+            with timer("bench"):
+                pass
+    return loop
+
+
+def recorded(registry):
+    def loop(n):
+        rec = registry.record
+        for _ in range(n):
+            rec("bench", 1e-6)
+    return loop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    base = per_call_ns(empty, args.iterations)
+    on = instrumentation.Registry(enabled=True)
+    off = instrumentation.Registry(enabled=False)
+    rows = [("timer (enabled)", per_call_ns(timed(on), args.iterations) - base),
+            ("timer (PCC_METRICS=0)", per_call_ns(timed(off), args.iterations) - base),
+            ("record(seconds)", per_call_ns(recorded(on), args.iterations) - base)]
+
+    # Contended: every thread records into the same histogram
+    n = args.iterations // args.threads
+    threads = [threading.Thread(target=timed(on), args=(n,)) for _ in range(args.threads)]
+    t0 = time.perf_counter_ns()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    rows.append((f"timer ({args.threads} threads)", (time.perf_counter_ns() - t0) / (n * args.threads) - base))
+    for label, ns in rows:
+        print(f"{label:<24} {ns / 1000:6.2f}us per stage")
+
+    t0 = time.perf_counter()
+    text = on.render()
+    print(f"render (1 stage, {len(text.splitlines())} lines) {(time.perf_counter() - t0) * 1e3:.2f}ms")
+
+    # End to end through the Flask app (in-process exec keeps the run hermetic)
+    os.environ.setdefault("PCC_SANDBOX_WORKERS", "0")
+    os.environ.setdefault("PCC_LOG_LEVEL", "OFF")
+    os.environ.setdefault("PCC_DEDUP", "0")  # every request runs every stage
+    import brain_server
+
+    client = brain_server.app.test_client()
+    brain_server.analyst.cache = None  # exercise code gen / load / exec on every request
+    t0 = time.perf_counter()
+    for i in range(args.requests):
+        client.post("/trace", json={"defect": f"Critical latency timeout 504 error #{i}"})
+    secs = time.perf_counter() - t0
+    body = client.get("/metrics").get_data(as_text=True)
+    missing = [s for s in STAGES if f'stage="{s}",le="+Inf"}} {args.requests}' not in body]
+    print(f"/trace x{args.requests}: {secs / args.requests * 1e3:.2f}ms per request; "
+          f"stages on /metrics: {len(STAGES) - len(missing)}/{len(STAGES)}")
+    for line in body.splitlines():
+        if 'quantile="0.99"' in line:
+            print("  " + line)
+    worst = max(ns for label, ns in rows if "threads" not in label)
+    return 0 if not missing and worst < 5000 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
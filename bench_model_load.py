@@ -0,0 +1,108 @@
+"""
+Startup-time and RSS benchmark: pickled DefectTranslator vs compact memory-mapped model.
+Each format is loaded in a fresh interpreter; RssAnon is private heap, RssFile is
+file-backed pages that other workers mapping the same model share.
+Usage: python bench_model_load.py --pairs 20000 [--workdir /tmp/pcc_models]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from bench_common import synthetic_pairs
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from mmloso_translator import DefectTranslator
+t_import = time.perf_counter() - t0
+
+def rss():
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                k, v = line.split(":")
+                out[k] = int(v.split()[0]) / 1024.0
+    return out
+
+before = rss()
+t0 = time.perf_counter()
+model = DefectTranslator()
+model.load(sys.argv[1])
+t_load = time.perf_counter() - t0
+t0 = time.perf_counter()
+outputs = [model.translate(q) for q in json.loads(sys.argv[2])]
+t_first = time.perf_counter() - t0
+after = rss()
+print(json.dumps({"import_s": t_import, "load_s": t_load, "translate_s": t_first, "outputs": outputs,
+                  "anon_mb": after["RssAnon"] - before["RssAnon"], "file_mb": after["RssFile"] - before["RssFile"]}))
+"""
+
+
+def check_backoff(workdir, n_pairs=2000):
+    """
+    A backoff model must reload from its compact directory with the same
+    smoothing (and so the same translations).
+    """
+    from mmloso_translator import DefectTranslator
+
+    pairs = synthetic_pairs(n_pairs)
+    model = DefectTranslator(lm_smoothing="backoff", lm_min_count=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(pairs, em_iter=3)
+    path = os.path.join(workdir, "model_backoff")
+    model.save_compact(path)
+    loaded = DefectTranslator()
+    loaded.load(path)
+    queries = [req for req, _ in pairs[:200]]
+    expected = [model.translate(q) for q in queries]
+    got = [loaded.translate(q) for q in queries]
+    matched = sum(a == b for a, b in zip(expected, got))
+    ok = matched == len(queries) and loaded.lm_smoothing == "backoff"
+    print(f"backoff compact reload: {matched}/{len(queries)} translations match  "
+          f"(smoothing {loaded.lm_smoothing})")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args(argv)
+
+    from mmloso_translator import DefectTranslator
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pcc_models_")
+    os.makedirs(workdir, exist_ok=True)
+    pairs = synthetic_pairs(args.pairs)
+    model = DefectTranslator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(pairs, em_iter=3)
+    pkl_path = os.path.join(workdir, "model.pkl")
+    compact_path = os.path.join(workdir, "model_compact")
+    model.save(pkl_path)
+    model.save_compact(compact_path)
+    queries = json.dumps([req for req, _ in pairs[:50]])
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, path in (("pickle", pkl_path), ("compact", compact_path)):
+        out = subprocess.run([sys.executable, "-c", CHILD, path, queries], cwd=here,
+                             capture_output=True, text=True, check=True)
+        results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+        r = results[name]
+        print(f"{name:<8} load {r['load_s'] * 1000:8.1f}ms  first 50 translations {r['translate_s'] * 1000:8.1f}ms  "
+              f"RssAnon +{r['anon_mb']:.1f}MB  RssFile +{r['file_mb']:.1f}MB")
+    same = results["pickle"]["outputs"] == results["compact"]["outputs"]
+    print(f"identical translations: {same}  (models in {workdir})")
+    backoff_ok = check_backoff(workdir)
+    return 0 if same and backoff_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Incremental training: update(new_pairs) against a full retrain on the grown
+corpus, for SMTTranslator (Dice) and DefectTranslator (online EM + trigram LM).
+Checks that SMT updates without decay equal a full retrain exactly, and that
+concurrent translate calls keep working while updates are published.
+Usage: python bench_online.py --base 20000 --batch 2000 --batches 5
+"""
+import argparse
+import contextlib
+import io
+import sys
+import threading
+import time
+
+from bench_common import synthetic_pairs
+from mmloso_translator import DefectTranslator
+from pit_crew_core import SMTTranslator
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def lexicon_equal(a, b, tol=1e-12):
+    keys = {k for k, row in a.items() if row} | {k for k, row in b.items() if row}
+    for k in keys:
+        ra, rb = a.get(k, {}), b.get(k, {})
+        if ra.keys() != rb.keys() or any(abs(ra[t] - rb[t]) > tol for t in ra):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=2_000)
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--decay", type=float, default=0.98)
+    args = parser.parse_args(argv)
+
+    pairs = synthetic_pairs(args.base + args.batch * args.batches, seed=3)
+    base, rest = pairs[:args.base], pairs[args.base:]
+    batches = [rest[i * args.batch:(i + 1) * args.batch] for i in range(args.batches)]
+
+    # --- SMT (Dice) ---
+    smt = SMTTranslator()
+    quiet(smt.train, base)
+    t_upd = 0.0
+    for b in batches:
+        t0 = time.perf_counter()
+        quiet(smt.update, b)
+        t_upd += time.perf_counter() - t0
+    full = SMTTranslator()
+    t0 = time.perf_counter()
+    quiet(full.train, pairs)
+    t_full = time.perf_counter() - t0
+    exact = lexicon_equal(smt.lex_prob, full.lex_prob)
+    print(f"SMT     update {t_upd / args.batches * 1000:8.1f}ms/batch  full retrain {t_full * 1000:8.1f}ms  "
+          f"identical to retrain: {exact}")
+    decayed = SMTTranslator()
+    quiet(decayed.train, base)
+    quiet(decayed.update, batches[0], decay=args.decay)
+
+    # --- DefectTranslator (online EM) ---
+    model = DefectTranslator()
+    quiet(model.train, base)
+    probe = [r for r, _ in pairs[:200]]
+    stop, errors, calls = threading.Event(), [], [0]
+
+    def reader():
+        while not stop.is_set():
+            try:
+                model.translate(probe[calls[0] % len(probe)])
+                calls[0] += 1
+            except Exception as e:  # any inconsistency between lexicon, LM and index
+                errors.append(repr(e))
+                return
+
+    th = threading.Thread(target=reader)
+    th.start()
+    t_upd, logliks = 0.0, []
+    for b in batches:
+        t0 = time.perf_counter()
+        logliks.append(quiet(model.update, b, decay=args.decay))
+        t_upd += time.perf_counter() - t0
+    stop.set()
+    th.join()
+
+    full = DefectTranslator()
+    t0 = time.perf_counter()
+    quiet(full.train, pairs)
+    t_full = time.perf_counter() - t0
+    agree = sum(model.translate(r) == full.translate(r) for r in probe) / len(probe)
+    print(f"Defect  update {t_upd / args.batches * 1000:8.1f}ms/batch  full retrain {t_full * 1000:8.1f}ms  "
+          f"top-1 agreement with retrain {agree:.1%}")
+    print(f"        batch log-likelihood/pair: {', '.join(f'{l / args.batch:.2f}' for l in logliks)}")
+    print(f"        {calls[0]} concurrent translate calls during updates, errors: {len(errors)}")
+    return 0 if exact and not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Multi-tenant model registry: one translator + requirement set per project,
+published to a temporary PCC_MODEL_DIR, with an LRU budget that keeps only
+--resident of --projects models in memory. Measures /translate latency on a
+resident model against the first request after eviction (snapshot load),
+cycles through all projects to exercise the LRU, and hot-swaps new versions
+of a project while client threads keep sending requests to it.
+Checks that every response is 200, resident bytes stay within the budget,
+answers after a reload match the published model, swaps take effect,
+requirement edits under load are copy-on-write and persisted, and unknown
+project ids leave no per-project state behind.
+Usage: python bench_registry.py [--projects 8] [--resident 3] [--pairs 5000] [--requests 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from bench_common import percentile
+from generate_data import generate_samples
+
+
+def project_data(n, seed, components):
+    pairs, reqs = [], {}
+    for s in generate_samples(n, seed, components):
+        pairs.append((s["requirement"], s["defect"]))
+        reqs.setdefault(s["req_id"], {"id": s["req_id"], "text": s["requirement"], "context": s["context"],
+                                      "label": f"{s['req_id']}: {s['component']}"})
+    return pairs, list(reqs.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=8)
+    parser.add_argument("--resident", type=int, default=3, help="models that fit in the budget")
+    parser.add_argument("--pairs", type=int, default=5000, help="training pairs per project")
+    parser.add_argument("--components", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--swaps", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    os.environ["PCC_MODEL_DIR"] = tempfile.mkdtemp(prefix="pcc_models_")
+    os.environ.setdefault("PCC_SANDBOX_WORKERS", "0")
+    os.environ.setdefault("PCC_LOG_LEVEL", "OFF")
+    os.environ.setdefault("PCC_DEDUP", "0")
+    os.environ.setdefault("PCC_SMT_SNAPSHOT", "")
+    import brain_server
+    from pit_crew_core import SMTTranslator
+
+    registry = brain_server.registry
+    client = brain_server.app.test_client()
+    names = [f"PROJ{i}" for i in range(args.projects)]
+    queries = {}
+    t0 = time.perf_counter()
+    for i, name in enumerate(names):
+        pairs, reqs = project_data(args.pairs, seed=i, components=args.components)
+        model = SMTTranslator()
+        model.train(pairs)
+        registry.publish(name, model, reqs)
+        queries[name] = [s["defect"] for s in generate_samples(args.requests, seed=1000 + i,
+                                                               n_components=args.components)]
+    publish_s = time.perf_counter() - t0
+    # Published translators leave the update() statistics in the .stats sidecar
+    # (not resident); a republish carries the sidecar over and update() reloads it.
+    dropped = model.train_stats is None
+    registry.publish(names[-1], model, reqs)
+    model.update(pairs[:50])
+    ok_stats = dropped and model.train_stats is not None
+    print(f"train_stats dropped at publish: {dropped}; update() after republish reloads them: {ok_stats}")
+    sizes = {p: m["bytes"] for p, m in registry.stats()["models"].items() if m["resident"]}
+    size = max(sizes.values())
+    registry.budget_bytes = int(size * (args.resident + 0.5))
+    for name in names:
+        registry.evict(name)
+    ok = ok_stats
+
+    def post(name, defect):
+        resp = client.post("/translate", json={"defect": defect, "project": name})
+        return resp.status_code, resp.get_json()
+
+    # 1. Resident vs first request after eviction
+    name = names[0]
+    post(name, queries[name][0])
+    expected = [post(name, q)[1] for q in queries[name]]
+    resident_t = []
+    for q in queries[name]:
+        t0 = time.perf_counter()
+        post(name, q)
+        resident_t.append(time.perf_counter() - t0)
+    cold_t, load_t = [], []
+    for q in queries[name][:args.requests // 4 or 1]:
+        registry.evict(name)
+        t0 = time.perf_counter()
+        status, body = post(name, q)
+        cold_t.append(time.perf_counter() - t0)
+        ok &= status == 200
+    reloaded = [post(name, q)[1] for q in queries[name]]
+    ok &= reloaded == expected
+    snapshot_mb = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in
+                      os.walk(os.path.join(registry.root, name)) for f in fs if not f.endswith(".stats")) / 2**20
+    print(f"{args.projects} projects x {args.pairs} pairs published in {publish_s:.2f}s; "
+          f"model ~{size / 2**20:.1f} MB resident ({snapshot_mb:.1f} MB snapshot), "
+          f"budget {registry.budget_bytes / 2**20:.1f} MB ({args.resident} models)")
+    print(f"/translate resident          p50 {percentile(resident_t, 50) * 1e3:8.3f}ms   "
+          f"p99 {percentile(resident_t, 99) * 1e3:8.3f}ms")
+    print(f"/translate after eviction    p50 {percentile(cold_t, 50) * 1e3:8.3f}ms   "
+          f"p99 {percentile(cold_t, 99) * 1e3:8.3f}ms   (x{percentile(cold_t, 50) / percentile(resident_t, 50):.0f})")
+    print(f"answers after reload identical: {reloaded == expected}")
+
+    # 2. LRU: round-robin over every project
+    before = {p: dict(m) for p, m in registry.stats()["models"].items()}
+    over_budget = 0
+    for k in range(args.requests):
+        p = names[k % len(names)]
+        status, _ = post(p, queries[p][k % len(queries[p])])
+        ok &= status == 200
+        stats = registry.stats()
+        over_budget += stats["resident_bytes"] > registry.budget_bytes
+    ok &= over_budget == 0
+    after = registry.stats()
+    loads = sum(m.get("loads", 0) - before.get(p, {}).get("loads", 0) for p, m in after["models"].items())
+    evictions = sum(m.get("evictions", 0) - before.get(p, {}).get("evictions", 0)
+                    for p, m in after["models"].items())
+    print(f"round robin x{args.requests}: {loads} loads, {evictions} evictions, "
+          f"{sum(m['resident'] for m in after['models'].values())} resident, "
+          f"{after['resident_bytes'] / 2**20:.1f} MB (within budget every request: {over_budget == 0})")
+
+    # 3. Hot swap while client threads keep hitting the project
+    name = names[1]
+    stop = threading.Event()
+    failures, served, lock = [], [0], threading.Lock()
+
+    def hammer(qs):
+        i = 0
+        while not stop.is_set():
+            status, _ = post(name, qs[i % len(qs)])
+            with lock:
+                served[0] += 1
+                if status != 200:
+                    failures.append(status)
+            i += 1
+
+    held = registry.get(name)   # an "in-flight request" keeping the version it started with
+    threads = [threading.Thread(target=hammer, args=(queries[name][t::args.threads],)) for t in range(args.threads)]
+    for t in threads:
+        t.start()
+    swap_t = []
+    for s in range(args.swaps):
+        pairs, reqs = project_data(args.pairs, seed=500 + s, components=args.components)
+        t0 = time.perf_counter()
+        resp = client.post(f"/models/{name}", json={"pairs": pairs, "requirements": reqs})
+        swap_t.append(time.perf_counter() - t0)
+        ok &= resp.status_code == 200
+    stop.set()
+    for t in threads:
+        t.join()
+    fresh = SMTTranslator()
+    fresh.train(pairs)
+    live = registry.get(name)
+    swapped = live.version == f"v{args.swaps + 1}" and \
+        [post(name, q)[1]["keywords"] for q in queries[name][:50]] == [fresh.translate(q) for q in queries[name][:50]]
+    ok &= swapped and not failures and held.translator.translate(queries[name][0]) is not None
+    print(f"hot swap x{args.swaps} (train + publish via POST /models/{name}): "
+          f"p50 {percentile(swap_t, 50):.2f}s; {served[0]} requests served meanwhile, {len(failures)} failed; "
+          f"now {live.version}, serving the new model: {swapped}")
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    ok &= f'pcc_model_loads_total{{project="{names[0]}"}}' in metrics
+    locks = len(registry._project_locks)
+    ok &= client.post("/translate", json={"defect": "x", "project": "NOPE"}).status_code == 404
+    ok &= client.post("/translate", json={"defect": "x", "project": "../etc"}).status_code == 400
+    for i in range(100):
+        ok &= client.post("/requirements", json={"project": f"NOPE{i}", "id": "R", "text": "t"}).status_code == 404
+    ok &= len(registry._project_locks) == locks
+    for bad in (["REQ-1"], [None], "REQ-1", 5):
+        ok &= client.post("/requirements", json={"project": names[0], "requirements": bad}).status_code == 400
+
+    # 4. Requirement edits while other threads link against the same project
+    name = names[2]
+    held = registry.get(name)
+    held_ids = set(held.requirements.records)
+    stop.clear()
+    errors, statuses = [], []
+
+    def link():
+        try:
+            while not stop.is_set():
+                registry.get(name).requirements.best(["latency", "login", "edited"])
+        except Exception as e:
+            errors.append(e)
+
+    def edit(k):
+        for i in range(40):
+            rid = f"EDIT-{k}-{i}"
+            statuses.append(client.post("/requirements", json={
+                "project": name, "requirements": [{"id": rid, "text": f"edited login latency requirement {i}"}]
+            }).status_code)
+            if i % 2:
+                statuses.append(client.delete(f"/requirements/{rid}?project={name}").status_code)
+
+    threads = [threading.Thread(target=link) for _ in range(2)] + \
+        [threading.Thread(target=edit, args=(k,)) for k in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads[2:]:
+        t.join()
+    stop.set()
+    for t in threads[:2]:
+        t.join()
+    live_ids = set(registry.get(name).requirements.records)
+    registry.evict(name)
+    edits_ok = (not errors and set(statuses) == {200} and set(held.requirements.records) == held_ids
+                and live_ids == held_ids | {f"EDIT-{k}-{i}" for k in range(args.threads) for i in range(0, 40, 2)}
+                and set(registry.get(name).requirements.records) == live_ids)
+    ok &= edits_ok
+    print(f"requirement edits x{len(statuses)} during linking: held set unchanged, edits live and persisted: "
+          f"{edits_ok}; unknown projects added no locks: {len(registry._project_locks) == locks}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
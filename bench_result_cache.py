@@ -0,0 +1,96 @@
+"""
+Repeated /analyze calls for the same (requirement, log) with and without the
+two-level result cache; checks that a rewritten log is re-analyzed and that the
+SQLite tier serves results after a restart.
+Usage: python bench_result_cache.py --rows 1000000 --requests 50
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from bench_analyze import write_log
+from bench_common import percentile
+from log_store import DatasetManager
+from pit_crew_core import CausalAnalyst
+from result_cache import ResultCache
+
+DEFECT = "Gateway Timeout 504"
+REQUIREMENT = "Latency must be under 500ms"
+
+
+def timed_calls(analyst, csv_path, n):
+    samples, verdicts = [], set()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            verdicts.add(analyst.analyze(DEFECT, REQUIREMENT, csv_path))
+        samples.append(time.perf_counter() - t0)
+    return samples, verdicts
+
+
+class RewriteDuringRun(CausalAnalyst):
+    """Rewrites the log after the code has run on the old version, before the result is stored."""
+    rows = 0
+
+    def _exec_inline(self, code, csv_path):
+        fact = super()._exec_inline(code, csv_path)
+        time.sleep(0.01)
+        write_log(csv_path, self.rows, seed=11)
+        return fact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pcc_rcache_")
+    csv_path = os.path.join(workdir, "logs.csv")
+    db_path = os.path.join(workdir, "results.sqlite")
+    write_log(csv_path, args.rows)
+    datasets = DatasetManager(cache_dir=os.path.join(workdir, "cache"))
+    datasets.get(csv_path)
+
+    plain, v_plain = timed_calls(CausalAnalyst(datasets=datasets), csv_path, args.requests)
+    cache = ResultCache(db_path=db_path)
+    cached, v_cached = timed_calls(CausalAnalyst(datasets=datasets, cache=cache), csv_path, args.requests)
+    print(f"no cache   : p50 {percentile(plain, 50) * 1000:8.2f}ms  p99 {percentile(plain, 99) * 1000:8.2f}ms")
+    print(f"with cache : p50 {percentile(cached, 50) * 1000:8.2f}ms  p99 {percentile(cached, 99) * 1000:8.2f}ms "
+          f"(first call {cached[0] * 1000:.1f}ms)")
+    print(f"stats      : {cache.stats}")
+    ok = v_plain == v_cached and cache.stats["result_hits"] == args.requests - 1
+
+    # Rewriting the log changes its fingerprint: the next call must recompute.
+    time.sleep(0.01)
+    write_log(csv_path, args.rows, seed=7)
+    misses = cache.stats["result_misses"]
+    _, v_new = timed_calls(CausalAnalyst(datasets=datasets, cache=cache), csv_path, 1)
+    recomputed = cache.stats["result_misses"] == misses + 1
+    print(f"log rewrite: recomputed={recomputed} verdict={next(iter(v_new))}")
+    cache.close()
+
+    restarted = ResultCache(db_path=db_path)
+    _, v_restart = timed_calls(CausalAnalyst(datasets=datasets, cache=restarted), csv_path, 1)
+    survived = restarted.stats["result_disk_hits"] == 1 and v_restart == v_new
+    print(f"restart    : served from SQLite={survived}")
+    restarted.close()
+
+    # A rewrite while the code runs: the result belongs to the old version and
+    # must not be served for the new one.
+    racing = ResultCache()
+    analyst = RewriteDuringRun(datasets=datasets, cache=racing)
+    analyst.rows = args.rows
+    timed_calls(analyst, csv_path, 1)
+    timed_calls(CausalAnalyst(datasets=datasets, cache=racing), csv_path, 1)
+    no_stale = racing.stats["result_hits"] == 0 and racing.stats["result_misses"] == 2
+    print(f"mid-run rewrite: old result not served for the new log={no_stale}")
+    return 0 if ok and recomputed and survived and no_stale else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Windowed compliance queries on a large log export (timestamp, latency_ms,
+status; --rows rows at --rate rows per second, with periodic latency
+incidents): rollup index build (rollup_index.py), windowed P99 / 5xx ratio
+from the rollups against a full pandas scan of the CSV, incremental refresh
+after appending rows, and CausalAnalyst.analyze(window=...) end to end.
+Checks row counts and 5xx ratios are exact and P99 is within ALPHA of the
+exact value (windows are whole minutes, so both paths see the same rows),
+plus edge cases: a last row without a trailing newline, a window of rows
+without latencies.
+Usage: python bench_rollup.py [--rows 100000000] [--queries 1000] [--scan-queries 3]
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_common import percentile
+from rollup_index import ALPHA, RollupIndex
+
+START = 1_700_000_000   # epoch seconds of the first row
+
+
+def write_log(path, rows, rate, seed, first_row=0, chunk=5_000_000):
+    """Appends rows [first_row, first_row + rows) of the synthetic log; a 30-minute incident every 6 hours."""
+    rng = np.random.default_rng(seed)
+    for lo in range(first_row, first_row + rows, chunk):
+        n = min(chunk, first_row + rows - lo)
+        ts = START + (np.arange(lo, lo + n) // rate)
+        slow = rng.random(n) < 0.1
+        latency = np.where(slow, rng.normal(1200, 120, n), rng.normal(400, 60, n))
+        latency[(ts - START) % 21600 < 1800] *= 3
+        status = np.where(slow, 503, 200)
+        status[rng.random(n) < 0.002] = 404
+        pd.DataFrame({"timestamp": ts, "latency_ms": np.maximum(latency, 1).astype(np.int64),
+                      "status": status}).to_csv(path, mode="a", header=(lo == 0), index=False)
+
+
+def scan_window(path, start, end, chunk_rows=5_000_000):
+    """Exact (rows, P99, 5xx ratio) of [start, end) by reading the whole CSV with pandas."""
+    parts, rows, errors = [], 0, 0
+    for df in pd.read_csv(path, chunksize=chunk_rows, usecols=["timestamp", "latency_ms", "status"]):
+        w = df[(df["timestamp"] >= start) & (df["timestamp"] < end)]
+        parts.append(w["latency_ms"].to_numpy())
+        rows += len(w)
+        errors += int((w["status"] >= 500).sum())
+    lat = np.concatenate(parts)
+    return rows, float(np.sort(lat)[int(0.99 * (len(lat) - 1))]) if len(lat) else math.nan, \
+        errors / rows if rows else 0.0
+
+
+def check_edges(workdir):
+    """
+    Unterminated last rows (complete, partial, later extended), latency-less
+    windows and empty status values.
+    """
+    path = os.path.join(workdir, "edges.csv")
+    with open(path, "w") as f:
+        f.write("timestamp,latency_ms,status\n0,100,200\n60,,200\n120,300,50")
+    index = RollupIndex(path, cache_dir=workdir)
+    ok = index.refresh() == 3 and index.query().rows == 3
+    q = index.query(60, 120)
+    ok &= q.rows == 1 and math.isnan(q.lat_min) and math.isnan(q.lat_max) and math.isnan(q.quantile(0.99))
+    with open(path, "a") as f:
+        f.write("3\n180,40")   # extends the last row, then starts a partial one
+    ok &= index.refresh() == 3 and index.query().status == {"200": 2, "503": 1}
+    with open(path, "a") as f:
+        f.write("0,200\n")
+    ok &= index.refresh() == 1 and index.query(180, 240).lat_max == 400
+    with open(path, "a") as f:
+        f.write("240,50,\n300,60,500\n")   # one block with an empty status
+    ok &= index.refresh() == 2 and index.codes == ["200", "503", "", "500"]
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--rate", type=int, default=200, help="rows per second of log time")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--scan-queries", type=int, default=3, help="windows also answered by a full pandas scan")
+    parser.add_argument("--window-minutes", type=int, default=60)
+    parser.add_argument("--append-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", help="working directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args(argv)
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="pcc_rollup_")
+    path = os.path.join(workdir, "logs.csv")
+    ok = True
+    try:
+        edges = check_edges(tempfile.mkdtemp(dir=workdir))
+        print(f"unterminated last rows, latency-less windows and empty statuses handled: {edges}")
+        ok &= edges
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            write_log(path, args.rows, args.rate, args.seed)
+            print(f"wrote {args.rows} rows ({os.path.getsize(path) / 2**30:.2f} GB) in {time.perf_counter() - t0:.1f}s")
+        index = RollupIndex(path, cache_dir=workdir)
+        t0 = time.perf_counter()
+        ingested = index.refresh()
+        build_s = time.perf_counter() - t0
+        print(f"rollup build: {ingested} rows in {build_s:.1f}s ({ingested / build_s / 1e6:.2f}M rows/s), "
+              f"{len(index.buckets)} buckets, {index.nbytes() / 2**20:.1f} MB "
+              f"({os.path.getsize(index.index_path) / 2**20:.1f} MB on disk)")
+
+        # Windows on whole minutes inside the log
+        rng = random.Random(args.seed)
+        first, last = index.span()
+        width = args.window_minutes * 60
+        windows = []
+        for _ in range(args.queries):
+            s = first + 60 * rng.randrange(max(1, (last - first - width) // 60))
+            windows.append((s, s + width))
+        rollup_t = []
+        for s, e in windows:
+            t0 = time.perf_counter()
+            q = index.query(s, e)
+            q.quantile(0.99), q.error_ratio()
+            rollup_t.append(time.perf_counter() - t0)
+        print(f"windowed P99 ({args.window_minutes} min) from rollups: p50 {percentile(rollup_t, 50) * 1e6:.0f}us  "
+              f"p99 {percentile(rollup_t, 99) * 1e6:.0f}us")
+
+        scan_t, worst = [], 0.0
+        for s, e in windows[:args.scan_queries]:
+            t0 = time.perf_counter()
+            rows, p99, err = scan_window(path, s, e)
+            scan_t.append(time.perf_counter() - t0)
+            q = index.query(s, e)
+            rel = abs(q.quantile(0.99) / p99 - 1)
+            worst = max(worst, rel)
+            ok &= q.rows == rows and abs(q.error_ratio() - err) < 1e-12 and rel <= ALPHA
+        if scan_t:
+            print(f"windowed P99 from a full pandas scan: mean {sum(scan_t) / len(scan_t):.1f}s per query "
+                  f"(x{sum(scan_t) / len(scan_t) / percentile(rollup_t, 50):,.0f}); "
+                  f"max P99 relative error {worst:.4%} (bound {ALPHA:.0%}), rows and 5xx ratio exact: {ok}")
+
+        # Incremental: rows appended after the build are ingested alone
+        total = args.rows
+        if args.append_rows:
+            write_log(path, args.append_rows, args.rate, args.seed + 1, first_row=total)
+            t0 = time.perf_counter()
+            appended = index.refresh()
+            refresh_s = time.perf_counter() - t0
+            total += args.append_rows
+            s = START + args.rows // args.rate + 60
+            e = START + total // args.rate - 60
+            s, e = s - s % 60, e - e % 60
+            q = index.query(s, e)
+            rows, p99, err = scan_window(path, s, e) if e > s else (0, math.nan, 0.0)
+            same = q.rows == rows and (not rows or abs(q.quantile(0.99) / p99 - 1) <= ALPHA)
+            ok &= appended == args.append_rows and same
+            print(f"refresh after appending {appended} rows: {refresh_s:.2f}s "
+                  f"(full build {build_s:.1f}s); appended window matches scan: {same}")
+
+        # End to end through the analyst (rollup store; refresh is a stat() when unchanged)
+        from pit_crew_core import CausalAnalyst
+        from rollup_index import RollupStore
+        analyst = CausalAnalyst(rollups=RollupStore(cache_dir=workdir))
+        analyst.analyze("defect", "P99 latency under 500ms", path, window=windows[0])
+        e2e_t = []
+        for w in windows[:200]:
+            t0 = time.perf_counter()
+            verdict = analyst.analyze("defect", "P99 latency under 500ms", path, window=w)
+            e2e_t.append(time.perf_counter() - t0)
+            ok &= verdict.startswith("Compliance")
+        print(f"CausalAnalyst.analyze(window=...): p50 {percentile(e2e_t, 50) * 1e3:.3f}ms  "
+              f"p99 {percentile(e2e_t, 99) * 1e3:.3f}ms  (e.g. {verdict})")
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Generated-code execution: in-process exec against the pre-warmed sandbox pool,
+with concurrent /analyze-style jobs (latency percentiles and jobs/sec), plus a
+runaway job to show the timeout kills only that worker.
+Usage: python bench_sandbox.py --rows 1000000 --jobs 200 --clients 8 --workers 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_analyze import write_log
+from bench_common import percentile
+from log_store import DatasetManager
+from pit_crew_core import CausalAnalyst
+from sandbox import SandboxPool
+
+CODE = "p99_latency = df['latency_ms'].quantile(0.99)\nprint(f\"P99 Latency: {p99_latency:.2f}ms\")\n"
+
+
+def run_jobs(fn, jobs, clients):
+    def timed(_):
+        t0 = time.perf_counter()
+        out = fn()
+        return time.perf_counter() - t0, out
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(clients) as ex:
+        results = list(ex.map(timed, range(jobs)))
+    wall = time.perf_counter() - t0
+    return [r[0] for r in results], {r[1] for r in results}, wall
+
+
+LIMIT_CODE = "import resource\nprint(resource.getrlimit(resource.RLIMIT_DATA)[0])\n"
+
+
+def check_failures(workdir):
+    """
+    A per-call memory limit must not outlive its job in an unlimited pool, and
+    a job that fails in the parent (here: unpicklable) must not stall the queue.
+    """
+    pool = SandboxPool(workers=1, timeout=10, memory_limit_mb=0, cwd=workdir)
+    before = pool.run(LIMIT_CODE).stdout.strip()
+    limited = pool.run(LIMIT_CODE, memory_mb=512).stdout.strip()
+    after = pool.run(LIMIT_CODE).stdout.strip()
+    bad = pool.submit(lambda: None)
+    follow = pool.submit("print('ok')")
+    bad_result, follow_result = bad.result(timeout=30), follow.result(timeout=30)
+    pool.shutdown()
+    ok = (after == before and limited == str(512 * 2**20)
+          and not bad_result.ok and follow_result.stdout.strip() == "ok")
+    print(f"failure paths : limit {before} -> {limited} -> {after}; "
+          f"bad job {bad_result.error!r}, next job ok={follow_result.ok}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pcc_sandbox_")
+    csv_path = os.path.join(workdir, "logs.csv")
+    write_log(csv_path, args.rows)
+    datasets = DatasetManager(cache_dir=os.path.join(workdir, "cache"))
+    datasets.get(csv_path)
+
+    inline = CausalAnalyst(datasets=datasets)
+    lat, outs, wall = run_jobs(lambda: inline._exec_inline(CODE, csv_path), args.jobs, args.clients)
+    print(f"inline exec   : p50 {percentile(lat, 50) * 1000:7.1f}ms  p99 {percentile(lat, 99) * 1000:7.1f}ms  "
+          f"{args.jobs / wall:7.1f} jobs/s")
+
+    t0 = time.perf_counter()
+    pool = SandboxPool(workers=args.workers, timeout=10, preload=[csv_path], cwd=workdir)
+    pool.run("pass")
+    print(f"pool warm-up  : {time.perf_counter() - t0:.2f}s ({args.workers} workers, pandas + dataset preloaded)")
+    lat, pool_outs, wall = run_jobs(lambda: pool.run(CODE, csv_path).stdout.strip(), args.jobs, args.clients)
+    print(f"sandbox pool  : p50 {percentile(lat, 50) * 1000:7.1f}ms  p99 {percentile(lat, 99) * 1000:7.1f}ms  "
+          f"{args.jobs / wall:7.1f} jobs/s")
+
+    t0 = time.perf_counter()
+    runaway = pool.submit("while True: pass", timeout=1.0)
+    ok = pool.run(CODE, csv_path)
+    print(f"runaway job   : {runaway.result().error}; concurrent job ok={ok.ok} "
+          f"after {time.perf_counter() - t0:.2f}s")
+    print(f"pool stats    : {pool.stats}")
+    pool.shutdown()
+
+    same = outs == pool_outs and len(outs) == 1
+    print(f"outputs match : {same} ({next(iter(outs))})")
+    failures_ok = check_failures(workdir)
+    return 0 if same and ok.ok and failures_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
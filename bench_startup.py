@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark for brain_server. Reports the import time of each module
+(python -X importtime, fresh interpreter per module) and, for a cold start
+(no SMT snapshot: train + write it) and a warm start (snapshot present), the
+time from process launch to the first /health response, to /ready and the
+latency of the first /trace.
+Usage: python bench_startup.py [--runs 3] [--sandbox-workers 2]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from load_test import SERVER, free_port
+
+MODULES = ["flask", "numpy", "scipy.sparse", "pandas", "requests", "tokenizer", "sparse_trainer", "log_store",
+           "streaming_metrics", "sandbox", "result_cache", "pit_crew_core", "brain_server"]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_ms(module, env):
+    """Cumulative import time (ms) of module, plus the heavy modules it pulled in."""
+    code = (f"import sys, {module}; "
+            "print(','.join(m for m in ('pandas', 'scipy', 'numpy') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, env=env,
+                         capture_output=True, text=True, check=True)
+    pattern = re.compile(rf"import time:\s+\d+ \|\s+(\d+) \|\s+{re.escape(module)}$")
+    us = max(int(m.group(1)) for m in map(pattern.match, out.stderr.splitlines()) if m)
+    return us / 1000.0, out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+
+
+def wait_for(url, deadline, ok=(200,)):
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code in ok:
+                return True
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def start_once(env):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 120
+        if not wait_for(url + "/health", deadline):
+            raise RuntimeError("server did not come up")
+        t_health = time.perf_counter() - t0
+        if not wait_for(url + "/ready", deadline):
+            raise RuntimeError("server did not become ready")
+        t_ready = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        r = requests.post(url + "/trace", json={"defect": "Critical latency timeout 504 error"}, timeout=60)
+        t_trace = time.perf_counter() - t1
+        return t_health, t_ready, t_trace, r.json()
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--sandbox-workers", default="2")
+    args = parser.parse_args(argv)
+
+    snapshot = os.path.join(tempfile.mkdtemp(prefix="pcc_startup_"), "smt_snapshot.pkl")
+    env = dict(os.environ, PCC_SMT_SNAPSHOT=snapshot, PCC_DEDUP_INDEX="", PCC_LOG_LEVEL="OFF",
+               PCC_SANDBOX_WORKERS=args.sandbox_workers)
+
+    print(f"{'module':<20}{'import ms':>10}  heavy modules loaded")
+    for module in MODULES:
+        if module == "brain_server" and os.path.exists(snapshot):
+            os.remove(snapshot)
+        if module == "brain_server":
+            ms, heavy = import_ms(module, env)
+            print(f"{'brain_server (cold)':<20}{ms:>10.1f}  {heavy}")
+        ms, heavy = import_ms(module, env)
+        label = "brain_server (warm)" if module == "brain_server" else module
+        print(f"{label:<20}{ms:>10.1f}  {heavy}")
+
+    print(f"\n{'start':<6}{'/health ms':>12}{'/ready ms':>11}{'1st /trace ms':>15}")
+    outputs = set()
+    for label in ("cold", "warm"):
+        for _ in range(args.runs):
+            if label == "cold" and os.path.exists(snapshot):
+                os.remove(snapshot)
+            t_health, t_ready, t_trace, body = start_once(env)
+            outputs.add(str(sorted(body.items())))
+            print(f"{label:<6}{t_health * 1e3:>12.1f}{t_ready * 1e3:>11.1f}{t_trace * 1e3:>15.1f}")
+    print(f"identical /trace responses: {len(outputs) == 1}")
+    return 0 if len(outputs) == 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Streaming log evaluation: accuracy of the t-digest quantiles against exact pandas
+results, and peak memory of the chunked evaluator on a large generated log.
+--check runs only the accuracy check (300k rows per distribution, explicit
+rank and relative value error bounds) and skips the large log.
+Usage: python bench_streaming.py --rows 50000000 [--check-rows 2000000] [--compare-pandas] [--check]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from streaming_metrics import TDigest
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+RANK_ERROR_BOUND = 0.002  # |rank(estimate) - q| allowed, as a fraction of rows
+VALUE_ERROR_BOUND = 0.01  # |estimate / exact pandas quantile - 1| allowed
+CHECK_ROWS = 300_000
+
+CHILD = r"""
+import json, resource, sys, time
+mode, path = sys.argv[1], sys.argv[2]
+t0 = time.perf_counter()
+if mode == "stream":
+    from streaming_metrics import summarize_log
+    s = summarize_log(path)
+    p99, err = s.latency.quantile(0.99), s.error_ratio()
+else:
+    import pandas as pd
+    df = pd.read_csv(path)
+    p99 = float(df["latency_ms"].quantile(0.99))
+    err = float(df["status"].astype(str).str.startswith("5").mean())
+print(json.dumps({"p99": p99, "error_ratio": err, "seconds": time.perf_counter() - t0,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}))
+"""
+
+
+def write_log(path, rows, chunk=2_000_000, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("timestamp,latency_ms,status\n")
+        for lo in range(0, rows, chunk):
+            n = min(chunk, rows - lo)
+            pd.DataFrame({
+                "timestamp": np.arange(lo, lo + n),
+                "latency_ms": rng.lognormal(6.0, 0.6, n).round(1),
+                "status": rng.choice([200, 200, 200, 201, 404, 500, 503], n),
+            }).to_csv(f, header=False, index=False)
+
+
+def check_accuracy(values):
+    """(worst rank error, worst relative value error) of the t-digest quantiles against pandas."""
+    digest = TDigest()
+    for lo in range(0, len(values), 250_000):
+        digest.update(values[lo:lo + 250_000])
+    ordered = np.sort(values)
+    worst_rank = worst_value = 0.0
+    for q in QUANTILES:
+        est = digest.quantile(q)
+        exact = float(pd.Series(values).quantile(q))
+        rank = abs(np.searchsorted(ordered, est) / len(ordered) - q)
+        value = abs(est / exact - 1)
+        worst_rank, worst_value = max(worst_rank, rank), max(worst_value, value)
+        print(f"   q={q:<6} exact {exact:10.2f}  t-digest {est:10.2f}  rank error {rank:.5f}  "
+              f"value error {value:.4%}")
+    return worst_rank, worst_value
+
+
+def check_distributions(rows, seed=1):
+    """
+    Lognormal latencies and a bimodal mix (10% slow requests); True when both
+    stay within the bounds. The value bound is checked on the lognormal only:
+    q=0.9 of the mix falls into the empty gap between the modes, where any
+    value between them has (almost) the right rank.
+    """
+    rng = np.random.default_rng(seed)
+    slow = rng.random(rows) < 0.1
+    samples = {
+        "lognormal": (rng.lognormal(6.0, 0.6, rows), VALUE_ERROR_BOUND),
+        "bimodal": (np.where(slow, rng.normal(1200, 120, rows), rng.normal(400, 60, rows)).clip(1), None),
+    }
+    ok = True
+    for name, (values, value_bound) in samples.items():
+        bounds = f"rank {RANK_ERROR_BOUND}" + (f", value {value_bound:.0%}" if value_bound else "")
+        print(f"{name} accuracy on {rows} rows (bounds: {bounds}):")
+        rank, value = check_accuracy(values)
+        ok &= rank <= RANK_ERROR_BOUND and (value_bound is None or value <= value_bound)
+    return ok
+
+
+def run_child(mode, path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", CHILD, mode, path], cwd=here,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--check-rows", type=int, default=2_000_000)
+    parser.add_argument("--compare-pandas", action="store_true",
+                        help="also load the full log with pandas (needs RAM proportional to the log)")
+    parser.add_argument("--check", action="store_true", help=f"only the accuracy check on {CHECK_ROWS} rows")
+    args = parser.parse_args(argv)
+
+    ok = check_distributions(CHECK_ROWS if args.check else args.check_rows)
+    print(f"quantiles within bounds: {ok}")
+    if args.check:
+        return 0 if ok else 1
+
+    path = os.path.join(tempfile.mkdtemp(prefix="pcc_stream_"), "big_log.csv")
+    t0 = time.perf_counter()
+    write_log(path, args.rows)
+    print(f"generated {args.rows} rows ({os.path.getsize(path) / 2**30:.2f}GB) in {time.perf_counter() - t0:.1f}s")
+
+    modes = ["stream"] + (["pandas"] if args.compare_pandas else [])
+    for mode in modes:
+        r = run_child(mode, path)
+        print(f"{mode:<7} p99 {r['p99']:9.2f}ms  5xx {r['error_ratio']:.4f}  "
+              f"{r['seconds']:7.1f}s  peak RSS {r['max_rss_mb']:8.1f}MB")
+    os.remove(path)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
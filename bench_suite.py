@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark suite on a generated corpus (generate_data): corpus and
+log generation, SMTTranslator train/translate, DefectTranslator
+train/translate, CausalAnalyst.analyze (first call, warm dataset, streaming,
+result cache) and /trace through the Flask test client with the brain running
+on the generated translator, requirements and log.
+Writes machine-readable results to --json; with --baseline (an earlier results
+file) every timing more than --tolerance slower is reported as a regression
+and the exit code is 1.
+Usage: python bench_suite.py [--pairs 20000] [--log-rows 1000000] [--queries 200]
+                             [--json bench_results.json] [--baseline old.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import percentile
+from generate_data import (generate_itrust_data, generate_log_rows, generate_samples, load_itrust_pairs,
+                           save_logs_csv, save_to_jsonl)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Suite:
+    """Collects one record per benchmark: {"name", "n", "seconds", ...}."""
+    def __init__(self):
+        self.results = []
+
+    def total(self, name, n, seconds, **extra):
+        """One timed run over n items."""
+        rec = {"name": name, "n": n, "seconds": seconds, "per_item_us": seconds / n * 1e6 if n else None,
+               "items_per_s": n / seconds if seconds else None, **extra}
+        self._add(rec)
+
+    def calls(self, name, samples, **extra):
+        """Per-call latencies (seconds); "seconds" is the mean."""
+        mean = sum(samples) / len(samples)
+        rec = {"name": name, "n": len(samples), "seconds": mean, "p50_ms": percentile(samples, 50) * 1e3,
+               "p99_ms": percentile(samples, 99) * 1e3, "items_per_s": 1.0 / mean if mean else None, **extra}
+        self._add(rec)
+
+    def _add(self, rec):
+        self.results.append(rec)
+        detail = (f"p50 {rec['p50_ms']:9.3f}ms  p99 {rec['p99_ms']:9.3f}ms" if "p50_ms" in rec
+                  else f"{rec['seconds']:9.3f}s total")
+        print(f"{rec['name']:<24}{rec['n']:>9}  {detail}  {rec['items_per_s'] or 0:>12.1f}/s", flush=True)
+
+
+def timed(fn, *args, **kwargs):
+    """(result, seconds) of one call; its progress prints are swallowed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        return out, time.perf_counter() - t0
+
+
+def per_call(fn, items):
+    samples = []
+    for it in items:
+        t0 = time.perf_counter()
+        fn(it)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                             timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """[(name, old seconds, new seconds)] for timings slower than baseline * (1 + tolerance)."""
+    old = {r["name"]: r for r in baseline["results"]}
+    return [(r["name"], old[r["name"]]["seconds"], r["seconds"]) for r in results
+            if r["name"] in old and old[r["name"]]["n"] == r["n"]
+            and r["seconds"] > old[r["name"]]["seconds"] * (1 + tolerance)]
+
+
+def run(args, suite, workdir):
+    corpus_path = os.path.join(workdir, "corpus.jsonl")
+    logs_path = os.path.join(workdir, "logs.csv")
+
+    # 1. Generator (streaming, incremental writes)
+    n, secs = timed(save_to_jsonl, generate_itrust_data(args.pairs, args.seed, args.components), corpus_path)
+    suite.total("generate.corpus", n, secs)
+    n, secs = timed(save_logs_csv, generate_log_rows(args.log_rows, args.seed), logs_path)
+    suite.total("generate.logs", n, secs, mb=os.path.getsize(logs_path) / 2**20)
+    pairs, secs = timed(load_itrust_pairs, corpus_path)
+    suite.total("corpus.load", len(pairs), secs)
+    held_out = list(generate_samples(args.queries, args.seed + 1, args.components))
+
+    # 2. Translators
+    from pit_crew_core import SMTTranslator, CausalAnalyst
+    from mmloso_translator import DefectTranslator
+    smt = SMTTranslator()
+    _, secs = timed(smt.train, pairs)
+    suite.total("smt.train", len(pairs), secs)
+    suite.calls("smt.translate", per_call(smt.translate, [s["defect"] for s in held_out]))
+
+    defect_pairs = pairs[:args.defect_pairs]
+    defect_model = DefectTranslator()
+    _, secs = timed(defect_model.train, defect_pairs, em_iter=args.em_iter)
+    suite.total("defect.train", len(defect_pairs), secs, em_iter=args.em_iter)
+    suite.calls("defect.translate", per_call(defect_model.translate, [s["requirement"] for s in held_out]))
+
+    # 3. Analyst on the generated log
+    from result_cache import ResultCache
+    defect, requirement = held_out[0]["defect"], held_out[0]["requirement"]
+    analyst = CausalAnalyst()
+    _, secs = timed(analyst.analyze, defect, requirement, logs_path)
+    suite.total("analyze.first", 1, secs, rows=args.log_rows)
+    suite.calls("analyze.warm", per_call(lambda s: analyst.analyze(s["defect"], s["requirement"], logs_path),
+                                         held_out[:args.analyses]))
+    streaming = CausalAnalyst(stream_threshold=0)
+    _, secs = timed(streaming.analyze, defect, requirement, logs_path)
+    suite.total("analyze.streaming", 1, secs, rows=args.log_rows)
+    cached = CausalAnalyst(datasets=analyst.datasets, cache=ResultCache())
+    cached.analyze(defect, requirement, logs_path)
+    suite.calls("analyze.cached", per_call(lambda s: cached.analyze(s["defect"], s["requirement"], logs_path),
+                                           held_out))
+
+    # 4. /trace through the Flask test client, in-process exec, on the
+    # generated translator, requirement set and log
+    os.environ.setdefault("PCC_SANDBOX_WORKERS", "0")
+    os.environ.setdefault("PCC_LOG_LEVEL", "OFF")
+    os.environ.setdefault("PCC_DEDUP", "0")
+    os.environ.setdefault("PCC_SMT_SNAPSHOT", "")
+    import brain_server
+
+    brain_server.translator = smt
+    brain_server.CSV_PATH = logs_path
+    reqs = {}
+    for s in generate_samples(args.pairs, args.seed, args.components):
+        if s["req_id"] not in reqs:
+            reqs[s["req_id"]] = {"id": s["req_id"], "text": s["requirement"], "context": s["context"],
+                                 "label": f"{s['req_id']}: {s['component']}"}
+    t0 = time.perf_counter()
+    for rec in reqs.values():
+        brain_server.requirements.upsert(rec)
+    suite.total("requirements.upsert", len(reqs), time.perf_counter() - t0)
+    client = brain_server.app.test_client()
+    client.post("/trace", json={"defect": "warm-up"})
+    suite.calls("trace", per_call(lambda s: client.post("/trace", json={"defect": s["defect"]}), held_out))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=20_000)
+    parser.add_argument("--defect-pairs", type=int, default=20_000, help="DefectTranslator training pairs")
+    parser.add_argument("--em-iter", type=int, default=3)
+    parser.add_argument("--log-rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--analyses", type=int, default=20, help="uncached analyze() calls")
+    parser.add_argument("--components", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="bench_results.json")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    args = parser.parse_args(argv)
+
+    suite = Suite()
+    print(f"{'benchmark':<24}{'n':>9}")
+    with tempfile.TemporaryDirectory(prefix="pcc_suite_") as workdir:
+        run(args, suite, workdir)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "args": vars(args)},
+        "results": suite.results,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(suite.results, json.load(f), args.tolerance)
+        report["regressions"] = [{"name": n, "baseline_seconds": a, "seconds": b} for n, a, b in regressions]
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.6f}s -> {new:.6f}s (x{new / old:.2f})")
+        print(f"{len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%})")
+        status = 1 if regressions else 0
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.json}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Titans memory store with 100k ownership facts: startup load, /assign lookup
+latency, journaled remember() throughput and compaction, for the JSON and
+SQLite backends. Checks ranked owners against a linear scan of the facts
+and that compact() + reload keeps every ranking.
+Usage: python bench_titans.py --facts 100000 --lookups 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_common import percentile
+from titans_store import TitansStore, format_fact, migrate_json_to_sqlite, normalize_key, parse_fact
+
+
+def make_facts(n, seed=0):
+    rng = random.Random(seed)
+    components = [f"Component_{i}" for i in range(max(1, n // 5))]
+    devs = [f"Dev {i}" for i in range(2000)]
+    facts = []
+    for _ in range(n):
+        facts.append(format_fact(rng.choice(components), rng.choice(devs), weight=rng.randint(1, 9),
+                                 exclusive=rng.random() < 0.02))
+    return components, facts
+
+
+def scan_best(facts, key):
+    nk, owners, order = normalize_key(key), {}, {}
+    for fact in facts:
+        parsed = parse_fact(fact)
+        if parsed and normalize_key(parsed[0]) == nk:
+            _, owner, weight, exclusive = parsed
+            prev = owners.get(owner)
+            owners[owner] = (weight, exclusive or bool(prev and prev[1]))
+            order.setdefault(owner, len(order))
+    if not owners:
+        return None
+    return min(owners, key=lambda o: (not owners[o][1], -owners[o][0], order[o]))
+
+
+def check_compact(workdir):
+    """Rankings survive compact() + reload: exclusive flags set by earlier facts, first-seen tie-breaks."""
+    path = os.path.join(workdir, "compact_check.json")
+    store = TitansStore(path, flush_interval=0)
+    store.remember("Login", "Jane", exclusive=True)
+    store.remember("Login", "Bob", weight=5)
+    store.remember("Login", "Jane", weight=2)
+    for dev in ("Carol", "Dave", "Erin"):
+        store.remember("Reports", dev, weight=3)
+    store.remember("Reports", "Carol", weight=3, exclusive=True)
+    store.remember("Reports", "Dave", weight=2)
+    store.remember("Reports", "Frank", weight=3)
+    before = {k: store.owners(k) for k in ("Login", "Reports")}
+    store.flush()
+    store.compact()
+    store.close()
+    reopened = TitansStore(path, flush_interval=0)
+    after = {k: reopened.owners(k) for k in before}
+    reopened.close()
+    return before == after == {"Login": ["Jane", "Bob"], "Reports": ["Carol", "Erin", "Frank", "Dave"]}
+
+
+def bench_store(store, components, lookups):
+    rng = random.Random(1)
+    keys = [rng.choice(components) for _ in range(lookups)]
+    samples = []
+    t_all = time.perf_counter()
+    for i, key in enumerate(keys):
+        if i % 100 == 0:
+            t0 = time.perf_counter()
+            store.best(key)
+            samples.append(time.perf_counter() - t0)
+        else:
+            store.best(key)
+    total = time.perf_counter() - t_all
+    return total / lookups, samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--facts", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--writes", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pcc_titans_")
+    json_path = os.path.join(workdir, "titans_memory_db.json")
+    components, facts = make_facts(args.facts)
+    with open(json_path, "w") as f:
+        json.dump({"short_term": [], "long_term": facts}, f)
+    print(f"{len(facts)} facts over {len(components)} components, {os.path.getsize(json_path) / 2**20:.1f}MB")
+
+    t0 = time.perf_counter()
+    store = TitansStore(json_path, flush_interval=0)
+    print(f"json   load        : {time.perf_counter() - t0:8.3f}s")
+    mean, samples = bench_store(store, components, args.lookups)
+    print(f"json   best()      : mean {mean * 1e6:6.2f}us  p99 {percentile(samples, 99) * 1e6:6.2f}us")
+
+    rng = random.Random(2)
+    ok = all(store.best(k) == scan_best(facts, k) for k in rng.sample(components, 50))
+
+    t0 = time.perf_counter()
+    for i in range(args.writes):
+        store.remember(rng.choice(components), f"Dev {rng.randrange(2000)}", weight=rng.randint(1, 9))
+    queued = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    store.flush()
+    flushed = time.perf_counter() - t0
+    print(f"json   remember()  : {args.writes / queued:10.0f}/s queued, journal flush {flushed * 1000:.1f}ms")
+    expected = {k: store.best(k) for k in rng.sample(components, 200)}
+    ranked = {k: store.owners(k) for k in expected}
+    t0 = time.perf_counter()
+    store.compact()
+    print(f"json   compact     : {time.perf_counter() - t0:8.3f}s ({len(store)} facts kept)")
+    store.close()
+    reopened = TitansStore(json_path, flush_interval=0)
+    ok &= all(reopened.best(k) == v for k, v in expected.items())
+    ok &= all(reopened.owners(k) == v for k, v in ranked.items())
+    reopened.close()
+    compact_ok = check_compact(workdir)
+    print(f"rankings kept by compact + reload: {compact_ok}")
+    ok &= compact_ok
+
+    db_path = os.path.join(workdir, "titans.db")
+    t0 = time.perf_counter()
+    migrate_json_to_sqlite(json_path, db_path)
+    print(f"sqlite migrate     : {time.perf_counter() - t0:8.3f}s")
+    t0 = time.perf_counter()
+    sq = TitansStore(db_path, flush_interval=0)
+    print(f"sqlite load        : {time.perf_counter() - t0:8.3f}s")
+    mean, samples = bench_store(sq, components, args.lookups)
+    print(f"sqlite best()      : mean {mean * 1e6:6.2f}us  p99 {percentile(samples, 99) * 1e6:6.2f}us")
+    ok &= all(sq.best(k) == v for k, v in expected.items())
+    sq.close()
+
+    print(f"ranked owners match: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
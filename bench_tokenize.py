@@ -0,0 +1,109 @@
+"""
+Tokenizer benchmark: the previous per-call re.sub normalization (reimplemented
+below as the reference) vs tokenizer.Tokenizer (precompiled character class).
+Reports tokens/sec for both translators' tokenizers, and the total time spent
+in tokenize() / sentences tokenized during DefectTranslator.train for each
+backend. Checks that both tokenizers give identical tokens.
+Usage: python bench_tokenize.py [--pairs 20000] [--dict-pairs 2000] [--em-iter 3]
+"""
+import argparse
+import contextlib
+import io
+import re
+import sys
+import time
+
+from bench_common import synthetic_pairs
+from mmloso_translator import DefectTranslator
+from pit_crew_core import SMTTranslator
+from tokenizer import DEFECT_TOKENIZER, SMT_TOKENIZER
+
+SMT_STOPS = SMTTranslator().stops
+ODD_TEXTS = [
+    "  Error in\tX.java:\n NPE　(code 500)  ", "“quoted” ‘single’ a|b/c\\d-e", "",
+    "MiXeD CaSe İstanbul ß", "[x]{y}!?;:,.", "tabs\t\tand\x1c\x1fseparators", 12345, None,
+]
+
+
+def legacy_defect_tokenize(s):
+    s = str(s).lower()
+    s = re.sub(r"([.,!?;:()\[\]{}\"'“”‘’|/\\\-])", r" \1 ", s)
+    return re.sub(r"\s+", " ", s).strip().split()
+
+
+def legacy_smt_normalize(text):
+    text = re.sub(r"([.,!?;:])", r" \1 ", str(text).lower())
+    return [w for w in text.split() if w not in SMT_STOPS]
+
+
+def smt_normalize(text):
+    return [w for w in SMT_TOKENIZER.tokenize(text) if w not in SMT_STOPS]
+
+
+def throughput(fn, texts, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = sum(len(fn(t)) for t in texts)
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+class Timed:
+    """Wraps a tokenize function, accumulating calls and seconds."""
+    def __init__(self, fn):
+        self.fn, self.calls, self.seconds = fn, 0, 0.0
+
+    def __call__(self, s):
+        t0 = time.perf_counter()
+        out = self.fn(s)
+        self.seconds += time.perf_counter() - t0
+        self.calls += 1
+        return out
+
+
+def train_tokenize_time(pairs, backend, em_iter, legacy):
+    """(seconds in model.tokenize, tokenize calls, sentences actually tokenized)."""
+    model = DefectTranslator()
+    if legacy:
+        model.tokenize = Timed(legacy_defect_tokenize)
+        model._tokenize_once = lambda n: contextlib.nullcontext()
+        inner = model.tokenize
+    else:
+        model.tokenize = Timed(DefectTranslator.tokenize.__get__(model))
+        inner = DEFECT_TOKENIZER.tokenize = Timed(DEFECT_TOKENIZER.tokenize)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.train(pairs, em_iter=em_iter, backend=backend)
+    finally:
+        DEFECT_TOKENIZER.__dict__.pop("tokenize", None)
+    return model.tokenize.seconds, model.tokenize.calls, inner.calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--dict-pairs", type=int, default=2000, help="corpus size for the dict backend")
+    parser.add_argument("--em-iter", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pairs = synthetic_pairs(args.pairs)
+    texts = [t for p in pairs for t in p]
+    same = all(legacy_defect_tokenize(t) == DEFECT_TOKENIZER.tokenize(t) for t in texts + ODD_TEXTS)
+    same &= all(legacy_smt_normalize(t) == smt_normalize(t) for t in texts + ODD_TEXTS)
+    print(f"{len(texts)} sentences, identical tokens: {same}")
+    for name, before, after in (("DefectTranslator", legacy_defect_tokenize, DEFECT_TOKENIZER.tokenize),
+                                ("SMTTranslator", legacy_smt_normalize, smt_normalize)):
+        b, a = throughput(before, texts), throughput(after, texts)
+        print(f"{name:<17} re.sub {b / 1e6:6.2f}M tok/s   precompiled {a / 1e6:6.2f}M tok/s  (x{a / b:.1f})")
+
+    print(f"\n{'train backend':<14}{'pairs':>7}{'':>3}{'tokenize s':>11}{'calls':>9}{'tokenized':>11}")
+    for backend, n in (("sparse", args.pairs), ("dict", args.dict_pairs)):
+        for label, legacy in (("before", True), ("after", False)):
+            secs, calls, done = train_tokenize_time(pairs[:n], backend, args.em_iter, legacy)
+            print(f"{backend + ' ' + label:<14}{n:>7}{'':>3}{secs:>11.3f}{calls:>9}{done:>11}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
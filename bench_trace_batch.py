@@ -0,0 +1,59 @@
+"""
+10k defects through /trace_batch (one NDJSON stream) against sequential /trace
+calls, in-process via the Flask test client (no tunnel, so the gap is a lower
+bound). Also checks each batch line matches the /trace response.
+Usage: python bench_trace_batch.py --defects 10000
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+from bench_common import ERRORS, NOUNS
+
+
+def make_defects(n, seed=0):
+    rng = random.Random(seed)
+    return [f"{rng.choice(ERRORS)} in {rng.choice(NOUNS)} after {rng.randint(100, 5000)}ms" for _ in range(n)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--defects", type=int, default=10_000)
+    args = parser.parse_args(argv)
+    defects = make_defects(args.defects)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import brain_server
+        client = brain_server.app.test_client()
+        client.post("/trace", json={"defect": "warm-up"})
+
+        t0 = time.perf_counter()
+        sequential = [client.post("/trace", json={"defect": d}).json for d in defects]
+        seq_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        first_line = None
+        lines = []
+        resp = client.post("/trace_batch", json=defects, buffered=False)
+        for chunk in resp.response:
+            if first_line is None:
+                first_line = time.perf_counter() - t0
+            lines.extend(json.loads(l) for l in chunk.decode("utf-8").splitlines() if l)
+        batch_s = time.perf_counter() - t0
+
+    by_index = {line.pop("index"): line for line in lines}
+    same = len(by_index) == len(defects) and all(
+        {k: v for k, v in by_index[i].items() if k != "id"} == sequential[i] for i in range(len(defects)))
+    print(f"sequential /trace : {seq_s:8.2f}s  ({len(defects) / seq_s:8.1f} defects/s)")
+    print(f"/trace_batch      : {batch_s:8.2f}s  ({len(defects) / batch_s:8.1f} defects/s), "
+          f"first line after {first_line * 1000:.1f}ms")
+    print(f"speedup {seq_s / batch_s:.1f}x, results identical: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Benchmark: dict-based vs sparse Dice training (time + peak memory).
+Usage: python bench_training.py --sizes 1000 10000 100000
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+import sparse_trainer
+from bench_common import synthetic_pairs, measure
+from pit_crew_core import SMTTranslator
+from mmloso_translator import DefectTranslator
+
+
+def smt_train(pairs, backend):
+    model = SMTTranslator()
+    model.train(pairs, backend=backend)
+    return model.lex_prob
+
+
+def defect_dice(pairs, backend):
+    model = DefectTranslator()
+    if backend == "dict":
+        return model._dice_init(pairs)
+    src_docs = [model.tokenize(s) for s, _ in pairs]
+    tgt_docs = [model.tokenize(t) for _, t in pairs]
+    return sparse_trainer.dice_lexicon(src_docs, tgt_docs, defaultdict(dict))
+
+
+def same_lexicon(a, b):
+    if set(k for k, v in a.items() if v) != set(k for k, v in b.items() if v):
+        return False
+    return all(dict(a[k]) == dict(b[k]) for k, v in a.items() if v)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'model':<18}{'pairs':>8}{'backend':>9}{'seconds':>10}{'peak MB':>10}  match")
+    for n in args.sizes:
+        pairs = synthetic_pairs(n)
+        for name, fn in (("SMTTranslator", smt_train), ("DefectTranslator", defect_dice)):
+            results = {}
+            for backend in ("dict", "sparse"):
+                lex, secs, peak = measure(fn, pairs, backend)
+                results[backend] = (lex, secs, peak)
+            match = same_lexicon(results["dict"][0], results["sparse"][0])
+            for backend, (_, secs, peak) in results.items():
+                print(f"{name:<18}{n:>8}{backend:>9}{secs:>10.3f}{peak / 2**20:>10.1f}  {match}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from pit_crew_core import SMTTranslator, CausalAnalyst, TitansManager
+from requirement_index import RequirementIndex
+from model_registry import InvalidProject, ModelRegistry, UnknownProject
+from sandbox import SandboxPool
+from result_cache import ResultCache
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+import asyncio
+import atexit
+import csv
+import hashlib
+import json
 import os
+import pickle
+import threading
+import time
 
 app = Flask(__name__)
+# PCC_LOG_LEVEL=WARNING (or OFF) silences the per-request lines
+log = instrumentation.configure_logging().getChild("brain")
+
+# "sync": original sequential handlers. "async": async views (needs asgiref,
+# i.e. pip install "flask[async]") where translate/analyze run in executors
+# and the Titans lookup overlaps the analysis.
+SERVE_MODE = os.getenv("BRAIN_SERVE_MODE", "sync")
 
 # --- INITIALIZATION ---
-print("🧠 Initializing Pit Crew Brain...")
+log.info("🧠 Initializing Pit Crew Brain...")
 train_data = [
     ("Error: Gateway Timeout 504", "System latency must be under 500ms"),
     ("TimeoutException after 5000ms", "Response time shall not exceed 500ms"),
@@ -14,75 +35,274 @@ train_data = [
     ("CSS Style mismatch error", "UI buttons must be blue")
 ]
 
-# 1. Translator
-translator = SMTTranslator()
-translator.train(train_data)
-print("✅ SMT Translator Ready")
+# 1. Translator: warm start from a snapshot trained on the same train_data,
+# training (and writing the snapshot) only as a fallback. PCC_SMT_SNAPSHOT=""
+# always trains.
+SMT_SNAPSHOT = os.getenv("PCC_SMT_SNAPSHOT", "smt_snapshot.pkl")
+
+def load_translator(pairs, snapshot_path):
+    corpus = hashlib.sha1(json.dumps(pairs).encode("utf-8")).hexdigest()
+    model = SMTTranslator()
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            if model.load(snapshot_path).get("corpus") == corpus:
+                log.info("✅ SMT Translator warm-started from %s", snapshot_path)
+                return model
+            log.info("SMT snapshot %s is for other training data, retraining", snapshot_path)
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError) as e:
+            log.warning("SMT snapshot %s unreadable (%s), retraining", snapshot_path, e)
+        model = SMTTranslator()
+    model.train(pairs)
+    if snapshot_path:
+        try:
+            model.save(snapshot_path, meta={"corpus": corpus})
+        except OSError as e:
+            log.warning("Could not write SMT snapshot %s: %s", snapshot_path, e)
+    log.info("✅ SMT Translator Ready")
+    return model
+
+translator = load_translator(train_data, SMT_SNAPSHOT)
+
+# 1b. Requirement Store (inverted index over requirement text + tags)
+requirements = RequirementIndex()
+for req in [
+    {"id": "REQ-101", "label": "Requirement-101: Max Latency < 500ms",
+     "text": "The system latency must be under 500ms.", "context": "Performance",
+     "tags": ["latency", "time", "500ms", "slow"]},
+    {"id": "REQ-102", "label": "Requirement-102: Data Integrity",
+     "text": "Database must enforce unique IDs.", "context": "Database",
+     "tags": ["sql", "database", "id"]},
+]:
+    requirements.upsert(req)
+log.info("✅ Requirement Store Ready (%d requirements)", len(requirements))
+
+# 1c. Per-project models: requests with a "project" field use that project's
+# translator and requirement set, loaded on demand from PCC_MODEL_DIR and kept
+# in an LRU within PCC_MODEL_BUDGET_MB. Requests without one use the models above.
+registry = ModelRegistry(os.getenv("PCC_MODEL_DIR", "models"),
+                         budget_bytes=int(float(os.getenv("PCC_MODEL_BUDGET_MB", "1024")) * 2**20))
 
 # 2. Analyst
-analyst = CausalAnalyst()
+# Generated code and verdicts are cached per (requirement, log version);
+# set PCC_RESULT_CACHE_DB to keep them across restarts
+analyst = CausalAnalyst(cache=ResultCache(db_path=os.getenv("PCC_RESULT_CACHE_DB")))
 # Note: In a real app, we would dynamically load CSVs. 
 # For this hackathon demo, we'll use the dummy_logs.csv we created.
 CSV_PATH = "dummy_logs.csv"
-print("✅ Causal Analyst Ready")
+# Additional named log exports for /trace_batch items ({"dataset": name});
+# items without a dataset use CSV_PATH
+DATASETS = {}
+# Defects with a "timestamp" are checked against the log rows within this
+# many seconds around it (from the log's rollup index, rollup_index.py)
+ANALYSIS_WINDOW_S = float(os.getenv("PCC_ANALYSIS_WINDOW_S", "3600"))
+
+def ensure_demo_logs(path):
+    """Writes the demo log export once if it is missing (startup, not per request)."""
+    if not os.path.exists(path):
+        # Plain csv module: same file as DataFrame.to_csv(index=False), without importing pandas
+        latency = [400] * 90 + [1200] * 10
+        status = ["200"] * 90 + ["503"] * 10
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["timestamp", "latency_ms", "status"])
+            writer.writerows(zip(range(100), latency, status))
+
+ensure_demo_logs(CSV_PATH)
+
+# Generated analysis code runs in pre-warmed sandbox workers (0 = in-process exec)
+SANDBOX_WORKERS = int(os.getenv("PCC_SANDBOX_WORKERS", "2"))
+if SANDBOX_WORKERS > 0:
+    analyst.executor = SandboxPool(
+        workers=SANDBOX_WORKERS,
+        timeout=float(os.getenv("PCC_SANDBOX_TIMEOUT", "10")),
+        memory_limit_mb=int(os.getenv("PCC_SANDBOX_MEMORY_MB", "2048")),
+        preload=[CSV_PATH],
+    )
+    atexit.register(analyst.executor.shutdown)
+log.info("✅ Causal Analyst Ready (sandbox workers: %d)", SANDBOX_WORKERS)
 
 # 3. Manager
 manager = TitansManager()
-print("✅ Titans Manager Ready")
+atexit.register(manager.store.close)
+log.info("✅ Titans Manager Ready")
+
+# 3b. Near-duplicate index: a defect that re-files an already traced one
+# reuses its requirement link and assignee. Loaded on first use (numpy);
+# PCC_DEDUP_INDEX="" keeps it in memory only, PCC_DEDUP=0 turns it off.
+DEDUP_ENABLED = os.getenv("PCC_DEDUP", "1") != "0"
+DEDUP_PATH = os.getenv("PCC_DEDUP_INDEX", "dedup_index.npz")
+_dedup = None
+_dedup_lock = threading.Lock()
+
+def dedup_index():
+    global _dedup
+    if _dedup is None:
+        with _dedup_lock:
+            if _dedup is None:
+                from dedup_index import DEFAULT_THRESHOLD, DedupIndex
+                index = DedupIndex(translator.normalize, path=DEDUP_PATH or None,
+                                   threshold=float(os.getenv("PCC_DEDUP_THRESHOLD", DEFAULT_THRESHOLD)))
+                atexit.register(index.close)
+                log.info("✅ Dedup Index Ready (%d tickets)", len(index))
+                _dedup = index
+    return _dedup
+
+# 4. Readiness: /health answers as soon as the app exists; /ready turns 200
+# once the first analysis would not pay for pandas, the log dataset or a
+# cold sandbox worker.
+warm = threading.Event()
+warmup_error = None
+
+def warm_up():
+    global warmup_error
+    try:
+        if DEDUP_ENABLED:
+            dedup_index()
+        if analyst.executor is not None:
+            result = analyst.executor.run("pass", CSV_PATH)
+            if not result.ok:
+                raise RuntimeError(result.error)
+        else:
+            analyst.datasets.get(CSV_PATH)
+        log.info("✅ Warm-up complete")
+    except Exception as e:
+        warmup_error = str(e)
+        log.warning("Warm-up failed: %s", e)
+    warm.set()
+
+threading.Thread(target=warm_up, name="brain-warmup", daemon=True).start()
 
 # --- ENDPOINTS ---
 
+def link_of(match):
+    """Requirement record (or None) -> (label, requirement text, context key)."""
+    if not match:
+        return "Unknown", "General Requirement", "General"
+    return match.get("label", match["id"]), match["text"], match.get("context", "General")
+
+def match_requirement(keywords, reqs=None):
+    """Requirement Linking (inverted index): best requirement record or None."""
+    with instrumentation.stage("requirement_link"):
+        return (requirements if reqs is None else reqs).best(keywords)
+
+def link_requirement(keywords, reqs=None):
+    return link_of(match_requirement(keywords, reqs))
+
+def project_of(data=None):
+    """The request's "project" (body field, else ?project=); None means the built-in models."""
+    project = (data or {}).get("project") if isinstance(data, dict) else None
+    return project or request.args.get("project") or None
+
+def project_models(project):
+    """(translator, requirements) serving a project. Callers keep the pair for the whole request."""
+    if project is None:
+        return translator, requirements
+    models = registry.get(project)
+    return models.translator, models.requirements
+
+@app.errorhandler(UnknownProject)
+def unknown_project(e):
+    return jsonify({"error": f"Unknown project {e.args[0]}"}), 404
+
+@app.errorhandler(InvalidProject)
+def invalid_project(e):
+    return jsonify({"error": str(e)}), 400
+
+class InvalidWindow(ValueError):
+    pass
+
+@app.errorhandler(InvalidWindow)
+def invalid_window(e):
+    return jsonify({"error": str(e)}), 400
+
+def window_of(data):
+    """
+    Log window to check for a request / batch item: "window": [start, end]
+    (or {"start", "end"}; epoch seconds or ISO times), else ANALYSIS_WINDOW_S
+    centred on "timestamp", else None (the whole log).
+    """
+    if data.get("window") is None and data.get("timestamp") is None:
+        return None
+    from rollup_index import to_seconds
+    try:
+        if data.get("window") is not None:
+            w = data["window"]
+            start, end = (w["start"], w["end"]) if isinstance(w, dict) else w
+            start, end = to_seconds(start), to_seconds(end)
+        else:
+            t = to_seconds(data["timestamp"])
+            start, end = t - ANALYSIS_WINDOW_S / 2, t + ANALYSIS_WINDOW_S / 2
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidWindow(f"Invalid window: {e}") from None
+    if end <= start:
+        raise InvalidWindow("Invalid window: end must be after start")
+    return start, end
+
+def dedup_lookup(defect):
+    """
+    (link, assignee) stored for a near-duplicate of defect, or None. The link
+    is rebuilt from the current requirement record; a duplicate of a ticket
+    whose requirement was deleted since is traced again.
+    """
+    if not DEDUP_ENABLED:
+        return None
+    index = dedup_index()
+    with instrumentation.stage("dedup_lookup"):
+        hit = index.best(defect)
+    payload = index.payload(hit[0]) if hit else None
+    if payload is None:
+        return None
+    match = requirements.get(payload["req_id"]) if payload["req_id"] else None
+    if payload["req_id"] and match is None:
+        return None
+    log.info("[0] Near-duplicate of %s (similarity %.2f)", index.keys[hit[0]] or f"#{hit[0]}", hit[1])
+    return link_of(match), payload["assignee"]
+
+def dedup_remember(defect, match, assignee, key=None):
+    if DEDUP_ENABLED:
+        dedup_index().add(defect, payload={"req_id": match["id"] if match else None, "assignee": assignee},
+                          key=key)
+
 @app.route('/trace', methods=['POST'])
 def trace():
     """
     The 'Golden Trigger' Endpoint.
     Orchestrates the full pipeline: Translate -> Analyze -> Assign.
+    A near-duplicate of a traced defect skips translation and assignment.
     """
-    print(f"\n🏎️  Race Started! Trace requested...")
+    log.info("\n🏎️  Race Started! Trace requested...")
     data = request.json
     defect = data.get('defect', '')
+    window = window_of(data)
+    project = project_of(data)
+    smt, reqs = project_models(project)
 
-    # 1. Translate
-    print(f"[1] SMT Translating defect: '{defect}'")
-    keywords = translator.translate(defect)
-    
-    linked_req_str = "Unknown"
-    req_text = "General Requirement"
-    context_key = "General"
-
-    # Heuristic Linking (same as /translate)
-    if any(k in ['latency', 'time', '500ms', 'slow'] for k in keywords):
-        linked_req_str = "Requirement-101: Max Latency < 500ms"
-        req_text = "The system latency must be under 500ms."
-        context_key = "Performance"
-    elif any(k in ['sql', 'database', 'id'] for k in keywords):
-        linked_req_str = "Requirement-102: Data Integrity"
-        req_text = "Database must enforce unique IDs."
-        context_key = "Database"
-    
-    print(f"    -> Match: {linked_req_str}")
-
-    # 2. Analyze
-    # Ensure CSV exists
-    import pandas as pd
-    if not os.path.exists(CSV_PATH):
-         logs = {
-            "timestamp": range(100),
-            "latency_ms": [400] * 90 + [1200] * 10,
-            "status": ["200"] * 90 + ["503"] * 10
-        }
-         pd.DataFrame(logs).to_csv(CSV_PATH, index=False)
-
-    print(f"[2] Analyst Verifying Compliance...")
-    verdict = analyst.analyze(defect, req_text, CSV_PATH)
-    print(f"    -> Verdict: {verdict}")
+    # 0. Near-duplicate of an already traced defect? (built-in models only)
+    duplicate = dedup_lookup(defect) if project is None else None
+    if duplicate:
+        (linked_req_str, req_text, context_key), assignee = duplicate
+    else:
+        # 1. Translate
+        log.info("[1] SMT Translating defect: '%s'", defect)
+        keywords = smt.translate(defect)
+        match = match_requirement(keywords, reqs)
+        linked_req_str, req_text, context_key = link_of(match)
+    log.info("    -> Match: %s", linked_req_str)
+
+    # 2. Analyze (logs are served from the analyst's columnar cache)
+    log.info("[2] Analyst Verifying Compliance...")
+    verdict = analyst.analyze(defect, req_text, CSV_PATH, window)
+    log.info("    -> Verdict: %s", verdict)
 
     # 3. Assign
-    print(f"[3] Manager Finding Expert...")
-    assignee = manager.assign(context_key)
-    print(f"    -> Assignee: {assignee}")
+    if not duplicate:
+        log.info("[3] Manager Finding Expert...")
+        assignee = manager.assign(context_key)
+        if project is None:
+            dedup_remember(defect, match, assignee, data.get('id'))
+    log.info("    -> Assignee: %s", assignee)
     
-    print("🏁 Lap Complete.\n")
+    log.info("🏁 Lap Complete.\n")
 
     return jsonify({
         "step_1_translation": linked_req_str,
@@ -90,6 +310,82 @@ def trace():
         "step_3_assignment": assignee
     })
 
+def parse_batch(req):
+    """
+    Accepts a JSON array, {"defects": [...]} or an NDJSON body. Items are
+    defect strings or objects with "defect" and optional "id" / "dataset" /
+    "project" (default: the body's "project" or ?project=).
+    """
+    body = req.get_data(as_text=True)
+    project = req.args.get("project") or None
+    if req.mimetype in ("application/x-ndjson", "application/jsonlines"):
+        items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        items = json.loads(body or "[]")
+        if isinstance(items, dict):
+            project, items = items.get("project", project), items.get("defects", [])
+    items = [{"defect": it} if isinstance(it, str) else dict(it) for it in items]
+    for it in items:
+        it.setdefault("project", project)
+    return items
+
+@app.route('/trace_batch', methods=['POST'])
+def trace_batch():
+    """
+    Bulk /trace. Translation runs for the whole batch first, analyses are
+    grouped per dataset (each log is loaded once), and one NDJSON line in
+    the /trace schema (plus "index" and "id") is streamed per defect.
+    Items may carry a "timestamp" / "window" as in /trace.
+    """
+    try:
+        items = parse_batch(request)
+        windows = [window_of(it) for it in items]
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+    log.info("\n🏎️  Batch Race Started! %d defects...", len(items))
+
+    # 1. Translate + link everything up front (one translate_batch per project)
+    links = [None] * len(items)
+    by_project = {}
+    for i, it in enumerate(items):
+        by_project.setdefault(it.get("project") or None, []).append(i)
+    for project, indices in by_project.items():
+        smt, reqs = project_models(project)
+        with instrumentation.stage("smt_translate_batch"):
+            keywords = smt.translate_batch([items[i].get("defect", "") for i in indices])
+        for i, k in zip(indices, keywords):
+            links[i] = link_requirement(k, reqs)
+
+    groups = {}
+    for i, it in enumerate(items):
+        groups.setdefault(it.get("dataset"), []).append(i)
+
+    def generate():
+        assignees = {}
+        for dataset, indices in groups.items():
+            csv_path = CSV_PATH if dataset is None else DATASETS.get(dataset)
+            for i in indices:
+                linked_req_str, req_text, context_key = links[i]
+                if csv_path is None:
+                    verdict = f"Analysis Failed: Unknown dataset {dataset}"
+                else:
+                    # 2. Analyze (one log per group; verdicts come from the result cache after the first)
+                    verdict = analyst.analyze(items[i].get("defect", ""), req_text, csv_path, windows[i])
+                # 3. Assign (one Titans lookup per context key per batch)
+                if context_key not in assignees:
+                    assignees[context_key] = manager.assign(context_key)
+                line = {
+                    "index": i,
+                    "id": items[i].get("id"),
+                    "step_1_translation": linked_req_str,
+                    "step_2_analysis": verdict,
+                    "step_3_assignment": assignees[context_key]
+                }
+                yield json.dumps(line) + "\n"
+        log.info("🏁 Batch Lap Complete (%d defects).\n", len(items))
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 @app.route('/translate', methods=['POST'])
 def translate():
     """
@@ -98,15 +394,13 @@ def translate():
     """
     data = request.json
     defect = data.get('defect', '')
+    smt, reqs = project_models(project_of(data))
     
-    keywords = translator.translate(defect)
+    keywords = smt.translate(defect)
     
-    # Simple Heuristic Linking
-    linked_req = None
-    if any(k in ['latency', 'time', '500ms', 'slow'] for k in keywords):
-        linked_req = "Requirement-101: Max Latency < 500ms"
-    elif any(k in ['sql', 'database', 'id'] for k in keywords):
-        linked_req = "Requirement-102: Data Integrity"
+    # Requirement Linking (inverted index)
+    match = match_requirement(keywords, reqs)
+    linked_req = match.get("label", match["id"]) if match else None
         
     return jsonify({
         "keywords": keywords,
@@ -116,24 +410,14 @@ def translate():
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """
-    Input: { "defect": "...", "requirement": "..." }
+    Input: { "defect": "...", "requirement": "...", optional "timestamp" or "window": [start, end] }
     Output: { "verdict": "Compliance Violation..." }
     """
     data = request.json
     defect = data.get('defect', '')
     req = data.get('requirement', '')
     
-    # Generate and Init dummy_logs.csv if not exists
-    import pandas as pd
-    if not os.path.exists(CSV_PATH):
-         logs = {
-            "timestamp": range(100),
-            "latency_ms": [400] * 90 + [1200] * 10,
-            "status": ["200"] * 90 + ["503"] * 10
-        }
-         pd.DataFrame(logs).to_csv(CSV_PATH, index=False)
-
-    verdict = analyst.analyze(defect, req, CSV_PATH)
+    verdict = analyst.analyze(defect, req, CSV_PATH, window_of(data))
     return jsonify({"verdict": verdict})
 
 @app.route('/assign', methods=['POST'])
@@ -148,11 +432,223 @@ def assign():
     assignee = manager.assign(context)
     return jsonify({"assignee": assignee})
 
+@app.route('/assign_batch', methods=['POST'])
+def assign_batch():
+    """
+    Input: { "defects": ["Error in ...", {"id": "BUG-1", "context": "Performance"}, ...],
+             "developers": [{"name": "Jane Doe", "load": 0.8, "capacity": 2}, ...],
+             "defect_load": 0.1 }
+    Output: { "assignments": [{"index", "id", "context", "assignee", "score"}, ...],
+              "unassigned": 0, "solve_ms": 1.2 }
+    Defects without a "context" are translated and linked first. Each
+    developer takes at most "capacity" defects (and none past load 1.0);
+    the batch is solved jointly for the best total score.
+    """
+    data = request.json or {}
+    try:
+        items = [{"defect": it} if isinstance(it, str) else dict(it) for it in data.get("defects", [])]
+        developers = data.get("developers")
+        if developers is not None:
+            developers = [{"name": str(d["name"]), "load": float(d.get("load", 0.0)),
+                           "capacity": None if d.get("capacity") is None else int(d["capacity"])}
+                          for d in developers]
+        defect_load = data.get("defect_load")
+        if defect_load is not None and float(defect_load) <= 0:
+            raise ValueError("defect_load must be positive")
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+
+    untraced = [i for i, it in enumerate(items) if not it.get("context")]
+    if untraced:
+        smt, reqs = project_models(project_of(data))
+        with instrumentation.stage("smt_translate_batch"):
+            keywords = smt.translate_batch([items[i].get("defect", "") for i in untraced])
+        for i, k in zip(untraced, keywords):
+            items[i]["context"] = link_requirement(k, reqs)[2]
+
+    t0 = time.perf_counter()
+    results = manager.assign_batch([it["context"] for it in items], developers,
+                                   None if defect_load is None else float(defect_load))
+    solve_ms = (time.perf_counter() - t0) * 1e3
+    assignments = [{"index": i, "id": it.get("id"), "context": it["context"], **rec}
+                   for i, (it, rec) in enumerate(zip(items, results))]
+    return jsonify({"assignments": assignments,
+                    "unassigned": sum(rec["assignee"] == "Unassigned" for rec in results),
+                    "solve_ms": round(solve_ms, 3)})
+
+@app.route('/requirements', methods=['POST'])
+def upsert_requirements():
+    """
+    Input: { "id": "REQ-103", "text": "...", "label": "...", "context": "...", "tags": [...] }
+           or { "requirements": [ {...}, ... ], "project": "ITRUST" }
+    Output: { "upserted": ["REQ-103"], "total": 3 }
+    A project's requirement set is written back to its snapshot.
+    """
+    data = request.json or {}
+    project = project_of(data)
+    records = data.get('requirements', [{k: v for k, v in data.items() if k != 'project'}])
+    if not isinstance(records, list):
+        return jsonify({"error": "'requirements' must be a list"}), 400
+    missing = [r for r in records if not isinstance(r, dict) or not r.get('id') or not r.get('text')]
+    if missing:
+        return jsonify({"error": "Each requirement needs 'id' and 'text'"}), 400
+    if project:
+        upserted, reqs = registry.update_requirements(project, lambda index: [index.upsert(r) for r in records])
+    else:
+        reqs = requirements
+        upserted = [reqs.upsert(r) for r in records]
+    return jsonify({"upserted": upserted, "total": len(reqs)})
+
+@app.route('/requirements/<req_id>', methods=['DELETE'])
+def delete_requirement(req_id):
+    project = project_of()
+    if project:
+        deleted, reqs = registry.update_requirements(project, lambda index: index.delete(req_id))
+    else:
+        reqs = requirements
+        deleted = reqs.delete(req_id)
+    if not deleted:
+        return jsonify({"error": f"Unknown requirement {req_id}"}), 404
+    return jsonify({"deleted": req_id, "total": len(reqs)})
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Published projects, resident models (version, estimated bytes) and load/evict/swap counts."""
+    return jsonify({"projects": registry.projects(), **registry.stats()})
+
+@app.route('/models/<project>', methods=['POST'])
+def publish_model(project):
+    """
+    Input: { "pairs": [["<requirement>", "<defect>"], ...], "requirements": [ {...}, ... ] }
+    Output: { "project": "ITRUST", "version": "v2" }
+    Trains a translator for the project and swaps it in; requests already
+    running finish on the previous version. Without "requirements" the
+    current version's set is kept.
+    """
+    data = request.json or {}
+    pairs = [tuple(p) for p in data.get('pairs', [])]
+    if not pairs or any(len(p) != 2 for p in pairs):
+        return jsonify({"error": "'pairs' must be a non-empty list of [requirement, defect]"}), 400
+    records = data.get('requirements')
+    if records is None:
+        records = list(registry.get(project).requirements.records.values()) if project in registry else []
+    if any(not isinstance(r, dict) or not r.get('id') or not r.get('text') for r in records):
+        return jsonify({"error": "Each requirement needs 'id' and 'text'"}), 400
+    model = SMTTranslator()
+    with instrumentation.stage("model_train"):
+        model.train(pairs)
+    version = registry.publish(project, model, records)
+    return jsonify({"project": project, "version": version})
+
+@app.route('/models/<project>/evict', methods=['POST'])
+def evict_model(project):
+    """Drops a project's models from memory (the snapshot stays on disk)."""
+    return jsonify({"project": project, "evicted": registry.evict(project)})
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "Brain is Online 🧠"})
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness (separate from liveness): 503 until warm-up has finished."""
+    if not warm.is_set():
+        return jsonify({"ready": False}), 503
+    body = {"ready": True}
+    if warmup_error:
+        body["warmup_error"] = warmup_error
+    return jsonify(body)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms and project model residency (Prometheus text format)."""
+    return Response(instrumentation.render_prometheus() + registry.render_prometheus(),
+                    mimetype="text/plain; version=0.0.4")
+
+# --- ASYNC SERVING MODE ---
+# CPU-bound stages go to a thread pool (analysis itself runs in the sandbox
+# processes), so a slow analysis never holds the event loop. The JSON
+# responses are identical to the sync handlers above.
+stage_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BRAIN_STAGE_WORKERS", "16")),
+                                thread_name_prefix="brain-stage")
+
+def run_stage(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(stage_pool, fn, *args)
+
+async def trace_async():
+    log.info("\n🏎️  Race Started! Trace requested (async)...")
+    data = request.json
+    defect = data.get('defect', '')
+    window = window_of(data)
+    project = project_of(data)
+    smt, reqs = await run_stage(project_models, project)
+
+    # 0. Near-duplicate of an already traced defect? (built-in models only)
+    duplicate = await run_stage(dedup_lookup, defect) if project is None else None
+    if duplicate:
+        (linked_req_str, req_text, context_key), assignee = duplicate
+        verdict = await run_stage(analyst.analyze, defect, req_text, CSV_PATH, window)
+    else:
+        # 1. Translate
+        keywords = await run_stage(smt.translate, defect)
+        match = match_requirement(keywords, reqs)
+        linked_req_str, req_text, context_key = link_of(match)
+
+        # 2 + 3. Analysis and Titans lookup overlap once the context key is known
+        verdict, assignee = await asyncio.gather(
+            run_stage(analyst.analyze, defect, req_text, CSV_PATH, window),
+            run_stage(manager.assign, context_key),
+        )
+        if project is None:
+            await run_stage(dedup_remember, defect, match, assignee, data.get('id'))
+    log.info("[1] Match: %s", linked_req_str)
+    log.info("[2] Verdict: %s\n[3] Assignee: %s\n🏁 Lap Complete.\n", verdict, assignee)
+
+    return jsonify({
+        "step_1_translation": linked_req_str,
+        "step_2_analysis": verdict,
+        "step_3_assignment": assignee
+    })
+
+async def translate_async():
+    data = request.json
+    smt, reqs = await run_stage(project_models, project_of(data))
+    keywords = await run_stage(smt.translate, data.get('defect', ''))
+    match = match_requirement(keywords, reqs)
+    linked_req = match.get("label", match["id"]) if match else None
+    return jsonify({"keywords": keywords, "linked_req": linked_req})
+
+async def analyze_async():
+    data = request.json
+    verdict = await run_stage(analyst.analyze, data.get('defect', ''), data.get('requirement', ''), CSV_PATH,
+                              window_of(data))
+    return jsonify({"verdict": verdict})
+
+if SERVE_MODE == "async":
+    from asgiref.wsgi import WsgiToAsgi
+    app.view_functions.update(trace=trace_async, translate=translate_async, analyze=analyze_async)
+    # ASGI entry point: BRAIN_SERVE_MODE=async uvicorn brain_server:asgi_app --port 5000
+    asgi_app = WsgiToAsgi(app)
+    log.info("✅ Async serving mode (translate/analyze in executors, assign overlaps analysis)")
+
+def serve(port=5000):
+    """
+    Async mode runs asgi_app under uvicorn when it is installed; otherwise the
+    threaded Werkzeug server. Never with the reloader: it imports this module
+    twice (two sandbox pools, warm-up threads and Titans journal writers).
+    BRAIN_DEBUG=1 turns on the interactive debugger (local use only).
+    """
+    if SERVE_MODE == "async":
+        try:
+            import uvicorn
+        except ImportError:
+            log.warning("uvicorn is not installed; async views run on the threaded development server")
+        else:
+            uvicorn.run(asgi_app, port=port, log_level="warning")
+            return
+    app.run(port=port, threaded=True, debug=os.getenv("BRAIN_DEBUG") == "1", use_reloader=False)
+
 if __name__ == '__main__':
-    print("\n🏎️  Pit Crew Brain is at the start line. Waiting for requests...")
+    log.info("\n🏎️  Pit Crew Brain is at the start line. Waiting for requests...")
     # Run on port 5000
-    app.run(port=5000, debug=True)
+    serve(5000)
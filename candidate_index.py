@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+# --- TOP-K TRANSLATION CANDIDATES ---
+# Built once (end of training / model load) so the beam decoder never sorts a
+# full translation distribution or calls math.log per request.
+
+
+class CandidateIndex:
+    """
+    Per-source-word top-K candidates stored as parallel arrays:
+    indptr (rows), tgt_ids (into targets) and logp (precomputed log t(tw|sw)).
+    Rows keep the decoder's ordering: probability descending, ties in
+    lexicon order.
+    """
+    def __init__(self, k, row_of, indptr, tgt_ids, logp, targets):
+        self.k = k
+        self.row_of = row_of          # source token -> row id
+        self.indptr = indptr
+        self.tgt_ids = tgt_ids
+        self.logp = logp
+        self.targets = targets        # target id -> token
+        # Python mirrors of the flat arrays: slicing lists is the cheap path
+        # for the per-sentence decoder.
+        self._indptr = indptr.tolist()
+        self._tokens = [targets[i] for i in tgt_ids.tolist()]
+        self._logp = logp.tolist()
+
+    def __len__(self):
+        return len(self._indptr) - 1
+
+    def candidates(self, sw):
+        """
+        Returns (target_tokens, log_probs) for sw, best first; empty if unknown.
+        """
+        r = self.row_of.get(sw)
+        if r is None:
+            return (), ()
+        lo, hi = self._indptr[r], self._indptr[r + 1]
+        return self._tokens[lo:hi], self._logp[lo:hi]
+
+    @classmethod
+    def from_lexicon(cls, lex_prob, k=5):
+        """
+        Builds the index from a nested {sw: {tw: prob}} lexicon.
+        """
+        row_of, targets, target_ids = {}, [], {}
+        lengths, tgt, logp = [], [], []
+        for sw, cands in lex_prob.items():
+            if not cands:
+                continue
+            top = sorted(cands.items(), key=lambda x: x[1], reverse=True)[:k]
+            row_of[sw] = len(lengths)
+            lengths.append(len(top))
+            for tw, prob in top:
+                tid = target_ids.get(tw)
+                if tid is None:
+                    tid = target_ids[tw] = len(targets)
+                    targets.append(tw)
+                tgt.append(tid)
+                logp.append(math.log(prob))
+        indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+        return cls(k, row_of, indptr, np.asarray(tgt, dtype=np.int32),
+                   np.asarray(logp, dtype=np.float64), targets)
+
+    @classmethod
+    def from_csr(cls, vocab, indptr, tgt, prob, k=5):
+        """
+        Builds the index from a probability-sorted CSR table (compact model):
+        the first k entries of every row are the top-k.
+        """
+        indptr = np.asarray(indptr)
+        lengths = np.minimum(np.diff(indptr), k)
+        rows = np.flatnonzero(lengths)
+        lengths = lengths[rows]
+        new_indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        # Position j of the flattened top-k lands at row_start + (j - new_row_start).
+        take = np.repeat(indptr[rows] - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+
+        row_of = {vocab.token(int(r)): i for i, r in enumerate(rows)}
+        uniq, local = np.unique(np.asarray(tgt)[take], return_inverse=True)
+        targets = [vocab.token(int(t)) for t in uniq]
+        logp = np.asarray([math.log(p) for p in np.asarray(prob)[take].tolist()], dtype=np.float64)
+        return cls(k, row_of, new_indptr, local.astype(np.int32), logp, targets)
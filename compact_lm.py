@@ -0,0 +1,325 @@
+import math
+
+import numpy as np
+
+from model_store import ID_BITS, MAX_VOCAB
+
+# --- COMPACT TRIGRAM LANGUAGE MODEL ---
+# Integer-keyed replacement for the (defaultdict(Counter), Counter) trigram
+# tables. Tokens are interned to ids, (p2, p1, w) is packed into one int64
+# (three 21-bit ids, same layout as model_store) and counts live in sorted
+# parallel arrays searched with np.searchsorted. Lookups never insert.
+#
+#   tri_keys / tri_counts     (p2, p1, w) -> count      (pruned by min_count)
+#   ctx_keys / ctx_totals     (p2, p1)    -> total count, backoff weight
+#   bi_keys / bi_counts       (p1, w)     -> count      (pruned by min_count)
+#   bi_totals / uni           per-id totals of p1 contexts / of predicted w
+#
+# smoothing="addk"    log((c + 0.1) / (total + 1000)), identical to
+#                     DefectTranslator._get_lm_score on the dict tables
+# smoothing="backoff" interpolated absolute discounting, trigram -> bigram ->
+#                     add-one unigram; pruned counts fall into the backoff weight
+#                     so every distribution still sums to one
+
+ADDK_K = 0.1
+ADDK_V = 1000
+DEFAULT_DISCOUNT = 0.75
+ROW_CACHE_SIZE = 8192   # contexts whose rows logprob() keeps as dicts (cleared when full)
+MASK = (1 << ID_BITS) - 1
+
+
+def _aggregate(keys, weights):
+    """Sorted unique keys with summed weights."""
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    uniq, inv = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inv, weights=weights, minlength=len(uniq))
+
+
+def _lookup(keys, values, query, default=0.0):
+    """Vectorized exact-match lookup in sorted keys."""
+    out = np.full(len(query), default, dtype=np.float64)
+    if len(keys):
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        hit = keys[pos] == query
+        out[hit] = values[pos[hit]]
+    return out
+
+
+def _group_sum(keys, weights, group_keys):
+    """Sum of weights per group (keys >> ID_BITS) aligned with sorted group_keys."""
+    out = np.zeros(len(group_keys))
+    if len(keys):
+        pos = np.searchsorted(group_keys, keys >> ID_BITS)
+        np.add.at(out, pos, weights)
+    return out
+
+
+class CompactTrigramLM:
+    """
+    Read-only trigram LM over sorted packed keys. Build with from_sentences()
+    or from_counts(); updated() returns a new model with more evidence.
+    """
+    def __init__(self, tokens, tri_keys, tri_counts, ctx_keys, ctx_totals, bi_keys, bi_counts,
+                 bi_totals, uni, min_count=1, smoothing="addk", discount=DEFAULT_DISCOUNT):
+        if smoothing not in ("addk", "backoff"):
+            raise ValueError(f"Unknown smoothing: {smoothing}")
+        self.tokens = list(tokens)
+        self.token_to_id = {t: i for i, t in enumerate(self.tokens)}
+        self.min_count = min_count
+        self.smoothing = smoothing
+        self.discount = discount
+
+        keep = tri_counts >= min_count
+        self.tri_keys = tri_keys[keep]
+        self.tri_counts = tri_counts[keep].astype(np.float32)
+        self.ctx_keys = ctx_keys
+        self.ctx_totals = ctx_totals.astype(np.float64)
+        keep = bi_counts >= min_count
+        self.bi_keys = bi_keys[keep]
+        self.bi_counts = bi_counts[keep].astype(np.float32)
+        self.bi_totals = bi_totals.astype(np.float64)
+        self.uni = uni.astype(np.float64)
+
+        # Backoff weight = probability mass not claimed by the kept (discounted) counts
+        d = discount
+        kept = _group_sum(self.tri_keys, np.maximum(self.tri_counts - d, 0.0), self.ctx_keys)
+        self.ctx_gamma = 1.0 - kept / np.maximum(self.ctx_totals, 1e-300)
+        kept = np.zeros(len(self.bi_totals))
+        if len(self.bi_keys):
+            np.add.at(kept, self.bi_keys >> ID_BITS, np.maximum(self.bi_counts - d, 0.0))
+        self.bi_gamma = 1.0 - kept / np.maximum(self.bi_totals, 1e-300)
+        self.uni_total = float(self.uni.sum())
+        self._rows = {}   # (p2, p1) tokens -> scalar lookup row, see _row()
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "_rows"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rows = {}
+
+    # --- CONSTRUCTION ---
+    @staticmethod
+    def _events(token_lists, token_to_id, tokens):
+        """Interns tokens and returns (p2, p1, w) id arrays over every trigram position."""
+        p2s, p1s, ws = [], [], []
+        for toks in token_lists:
+            ids = [0, 0]  # id 0 is always "<s>"
+            for t in toks:
+                i = token_to_id.get(t)
+                if i is None:
+                    i = token_to_id[t] = len(tokens)
+                    tokens.append(t)
+                ids.append(i)
+            ids.append(1)  # "</s>"
+            p2s.extend(ids[:-2])
+            p1s.extend(ids[1:-1])
+            ws.extend(ids[2:])
+        if len(tokens) >= MAX_VOCAB:
+            raise ValueError(f"Vocabulary too large for packed keys ({len(tokens)} >= {MAX_VOCAB})")
+        as_ids = lambda xs: np.asarray(xs, dtype=np.int64)
+        return as_ids(p2s), as_ids(p1s), as_ids(ws)
+
+    @classmethod
+    def _tables(cls, p2, p1, w, n_tokens, weight=1.0):
+        ones = np.full(len(w), weight)
+        ctx = (p2 << ID_BITS) | p1
+        tri = _aggregate((ctx << ID_BITS) | w, ones)
+        ctx_tab = _aggregate(ctx, ones)
+        bi = _aggregate((p1 << ID_BITS) | w, ones)
+        bi_totals = np.bincount(p1, weights=ones, minlength=n_tokens)
+        uni = np.bincount(w, weights=ones, minlength=n_tokens)
+        return tri, ctx_tab, bi, bi_totals, uni
+
+    @classmethod
+    def from_sentences(cls, token_lists, min_count=1, smoothing="addk", discount=DEFAULT_DISCOUNT):
+        """token_lists: tokenized target sentences (no <s> / </s> markers)."""
+        tokens = ["<s>", "</s>"]
+        token_to_id = {t: i for i, t in enumerate(tokens)}
+        p2, p1, w = cls._events(token_lists, token_to_id, tokens)
+        (tk, tc), (ck, ct), (bk, bc), bt, uni = cls._tables(p2, p1, w, len(tokens))
+        return cls(tokens, tk, tc, ck, ct, bk, bc, bt, uni, min_count, smoothing, discount)
+
+    @classmethod
+    def from_counts(cls, lm_data, min_count=1, smoothing="addk", discount=DEFAULT_DISCOUNT):
+        """Converts the (ngram, ctx_count) dict tables of DefectTranslator."""
+        ngram, ctx_count = lm_data
+        tokens = ["<s>", "</s>"]
+        ids = {t: i for i, t in enumerate(tokens)}
+        intern = lambda t: ids.setdefault(t, len(ids))
+        p2s, p1s, ws, cs = [], [], [], []
+        for (a, b), row in list(ngram.items()):
+            for t, c in row.items():
+                if c > 0:
+                    p2s.append(intern(a))
+                    p1s.append(intern(b))
+                    ws.append(intern(t))
+                    cs.append(c)
+        ctx_ids = [((intern(a) << ID_BITS) | intern(b), c) for (a, b), c in ctx_count.items() if c > 0]
+        tokens = sorted(ids, key=ids.get)
+        if len(tokens) >= MAX_VOCAB:
+            raise ValueError(f"Vocabulary too large for packed keys ({len(tokens)} >= {MAX_VOCAB})")
+        p2, p1, w = (np.asarray(x, dtype=np.int64) for x in (p2s, p1s, ws))
+        c = np.asarray(cs, dtype=np.float64)
+        tri = _aggregate((((p2 << ID_BITS) | p1) << ID_BITS) | w, c)
+        ctx = _aggregate(np.asarray([k for k, _ in ctx_ids], dtype=np.int64),
+                         np.asarray([v for _, v in ctx_ids], dtype=np.float64))
+        bi = _aggregate((p1 << ID_BITS) | w, c)
+        bi_totals = np.bincount(p1, weights=c, minlength=len(tokens))
+        uni = np.bincount(w, weights=c, minlength=len(tokens))
+        return cls(tokens, *tri, *ctx, *bi, bi_totals, uni, min_count, smoothing, discount)
+
+    def updated(self, token_lists, decay=1.0):
+        """
+        New model = decay * this model's counts + counts of token_lists.
+        Context totals are exact; n-grams already pruned stay pruned.
+        """
+        tokens = list(self.tokens)
+        token_to_id = dict(self.token_to_id)
+        p2, p1, w = self._events(token_lists, token_to_id, tokens)
+        (tk, tc), (ck, ct), (bk, bc), bt, uni = self._tables(p2, p1, w, len(tokens))
+        grow = lambda a: np.concatenate([a, np.zeros(len(tokens) - len(a))]) * decay
+        tri = _aggregate(np.concatenate([self.tri_keys, tk]), np.concatenate([self.tri_counts * decay, tc]))
+        ctx = _aggregate(np.concatenate([self.ctx_keys, ck]), np.concatenate([self.ctx_totals * decay, ct]))
+        bi = _aggregate(np.concatenate([self.bi_keys, bk]), np.concatenate([self.bi_counts * decay, bc]))
+        return type(self)(tokens, *tri, *ctx, *bi, grow(self.bi_totals) + bt, grow(self.uni) + uni,
+                          self.min_count, self.smoothing, self.discount)
+
+    # --- LOOKUPS (read-only) ---
+    def __len__(self):
+        return len(self.tri_keys)
+
+    def __bool__(self):
+        return True
+
+    @property
+    def nbytes(self):
+        arrays = (self.tri_keys, self.tri_counts, self.ctx_keys, self.ctx_totals, self.ctx_gamma,
+                  self.bi_keys, self.bi_counts, self.bi_totals, self.bi_gamma, self.uni)
+        return sum(a.nbytes for a in arrays)
+
+    def token_id(self, tok, default=-1):
+        return self.token_to_id.get(tok, default)
+
+    def encode(self, tokens):
+        get = self.token_to_id.get
+        return np.asarray([get(t, -1) for t in tokens], dtype=np.int64)
+
+    def count(self, ctx, w):
+        ids = [self.token_to_id.get(t, -1) for t in (*ctx, w)]
+        if min(ids) < 0:
+            return 0.0
+        key = (((ids[0] << ID_BITS) | ids[1]) << ID_BITS) | ids[2]
+        return float(_lookup(self.tri_keys, self.tri_counts, np.asarray([key]))[0])
+
+    def ctx_count(self, ctx):
+        a, b = (self.token_to_id.get(t, -1) for t in ctx)
+        if a < 0 or b < 0:
+            return 0.0
+        return float(_lookup(self.ctx_keys, self.ctx_totals, np.asarray([(a << ID_BITS) | b]))[0])
+
+    def probs_ids(self, p2, p1, w):
+        """
+        Vectorized probabilities for id arrays (-1 = unknown token).
+        For "addk" returns the (count, total) pair used by the add-k formula.
+        """
+        p2, p1, w = (np.asarray(x, dtype=np.int64) for x in (p2, p1, w))
+        ctx_ok = (p2 >= 0) & (p1 >= 0)
+        ctx = np.where(ctx_ok, (p2 << ID_BITS) | np.maximum(p1, 0), -1)
+        ok = ctx_ok & (w >= 0)
+        tri_c = np.where(ok, _lookup(self.tri_keys, self.tri_counts, (ctx << ID_BITS) | np.maximum(w, 0)), 0.0)
+        ctx_t = np.where(ctx_ok, _lookup(self.ctx_keys, self.ctx_totals, ctx), 0.0)
+        if self.smoothing == "addk":
+            return tri_c, ctx_t
+
+        d = self.discount
+        w0, p10 = np.maximum(w, 0), np.maximum(p1, 0)
+        v = len(self.tokens) + 1
+        p_uni = (np.where(w >= 0, self.uni[w0], 0.0) + 1.0) / (self.uni_total + v)
+        bi_t = np.where(p1 >= 0, self.bi_totals[p10], 0.0)
+        bi_c = np.where((p1 >= 0) & (w >= 0), _lookup(self.bi_keys, self.bi_counts, (p10 << ID_BITS) | w0), 0.0)
+        bi_g = np.where(p1 >= 0, self.bi_gamma[p10], 1.0)
+        safe = np.maximum(bi_t, 1e-300)
+        p_bi = np.where(bi_t > 0, np.maximum(bi_c - d, 0.0) / safe + bi_g * p_uni, p_uni)
+        ctx_g = np.where(ctx_t > 0, _lookup(self.ctx_keys, self.ctx_gamma, ctx, 1.0), 1.0)
+        safe = np.maximum(ctx_t, 1e-300)
+        return np.where(ctx_t > 0, np.maximum(tri_c - d, 0.0) / safe + ctx_g * p_bi, p_bi)
+
+    def logprob_ids(self, p2, p1, w):
+        """Vectorized log-scores; math.log per element keeps them identical to logprob()."""
+        if self.smoothing == "addk":
+            c, t = self.probs_ids(p2, p1, w)
+            return np.asarray([math.log((ci + ADDK_K) / (ti + ADDK_V)) for ci, ti in zip(c.tolist(), t.tolist())])
+        return np.asarray([math.log(p) for p in self.probs_ids(p2, p1, w).tolist()])
+
+    @staticmethod
+    def _find(keys, values, key, default=0.0):
+        i = int(keys.searchsorted(key))
+        return float(values[i]) if i < len(keys) and keys[i] == key else default
+
+    def _row(self, p2, p1):
+        """
+        Everything logprob() needs about context (p2, p1), read once from the
+        arrays: (successor counts by token, ctx total, ctx gamma, bigram counts
+        of p1 by token, p1 total, p1 gamma, p1 id). The decoder scores every
+        candidate of a hypothesis against the same context, so the rows of hot
+        contexts are reused; the cache is bounded and the arrays never change.
+        """
+        row = self._rows.get((p2, p1))
+        if row is not None:
+            return row
+        get = self.token_to_id.get
+        a, b = get(p2, -1), get(p1, -1)
+        tri, ctx_t, ctx_g, bi, bi_t, bi_g = {}, 0.0, 1.0, {}, 0.0, 1.0
+        if a >= 0 and b >= 0:
+            ctx = (a << ID_BITS) | b
+            ctx_t = self._find(self.ctx_keys, self.ctx_totals, ctx)
+            lo, hi = self.tri_keys.searchsorted([ctx << ID_BITS, (ctx + 1) << ID_BITS])
+            toks = self.tokens
+            tri = {toks[k & MASK]: c for k, c in zip(self.tri_keys[lo:hi].tolist(), self.tri_counts[lo:hi].tolist())}
+            if self.smoothing == "backoff" and ctx_t > 0:
+                ctx_g = self._find(self.ctx_keys, self.ctx_gamma, ctx, 1.0)
+        if self.smoothing == "backoff" and b >= 0:
+            bi_t = float(self.bi_totals[b])
+            bi_g = float(self.bi_gamma[b])
+            lo, hi = self.bi_keys.searchsorted([b << ID_BITS, (b + 1) << ID_BITS])
+            toks = self.tokens
+            bi = {toks[k & MASK]: c for k, c in zip(self.bi_keys[lo:hi].tolist(), self.bi_counts[lo:hi].tolist())}
+        row = (tri, ctx_t, ctx_g, bi, bi_t, bi_g)
+        if len(self._rows) >= ROW_CACHE_SIZE:
+            self._rows = {}
+        self._rows[(p2, p1)] = row
+        return row
+
+    def logprob(self, w, p2, p1):
+        """
+        log P(w | p2 p1) for tokens (argument order of _get_lm_score).
+        Scalar twin of logprob_ids: same operations in the same order.
+        """
+        tri, ctx_t, ctx_g, bi, bi_t, bi_g = self._row(p2, p1)
+        tri_c = tri.get(w, 0.0)
+        if self.smoothing == "addk":
+            return math.log((tri_c + ADDK_K) / (ctx_t + ADDK_V))
+
+        d = self.discount
+        i = self.token_to_id.get(w, -1)
+        p_uni = ((float(self.uni[i]) if i >= 0 else 0.0) + 1.0) / (self.uni_total + (len(self.tokens) + 1))
+        if bi_t > 0:
+            p = max(bi.get(w, 0.0) - d, 0.0) / bi_t + bi_g * p_uni
+        else:
+            p = p_uni
+        if ctx_t > 0:
+            p = max(tri_c - d, 0.0) / ctx_t + ctx_g * p
+        return math.log(p)
+
+    def to_counts(self):
+        """(ngram, ctx_count) dict tables (pruned counts), e.g. for model_store."""
+        from collections import Counter, defaultdict
+        ngram, ctx_count = defaultdict(Counter), Counter()
+        toks = self.tokens
+        for key, c in zip(self.tri_keys.tolist(), self.tri_counts.tolist()):
+            ngram[(toks[key >> (2 * ID_BITS)], toks[(key >> ID_BITS) & MASK])][toks[key & MASK]] = c
+        for key, c in zip(self.ctx_keys.tolist(), self.ctx_totals.tolist()):
+            ctx_count[(toks[key >> ID_BITS], toks[key & MASK])] = c
+        return ngram, ctx_count
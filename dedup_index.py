@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+
+# --- NEAR-DUPLICATE DEFECT INDEX ---
+# Finds already-triaged defects that are near-duplicates of an incoming one
+# (e.g. the "Error in PatientDAO.java: ..." variants that only differ in a
+# latency figure) so /trace can reuse their link and assignment.
+#
+# Texts are normalized with SMTTranslator.normalize and cut into word
+# shingles (crc32 hashes). A MinHash signature of bands * rows permutations is
+# split into bands, each hashed to one uint64 bucket key: two tickets with
+# Jaccard similarity J share a bucket with probability 1 - (1 - J**rows)**bands
+# (0.998 at J = 0.75 for 32 x 6). Candidates are then checked with their exact
+# shingle Jaccard, so every match is a true near-duplicate and recall is only
+# bounded by the banding.
+#
+# Bucket keys live in one sorted array (a query is one searchsorted); inserts
+# go to a pending dict that is merged into it every merge_every tickets. The
+# index is saved as one .npz snapshot plus an append-only journal of inserts,
+# folded back into the snapshot by compact(). Snapshot and journal entries
+# carry a generation: entries of an older generation are already in the
+# snapshot (a crash between saving it and removing the journal) and are not
+# replayed.
+
+FNV_PRIME = np.uint64(0x100000001B3)
+SHIFT = np.uint64(32)
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+DEFAULT_THRESHOLD = 0.75
+DEFAULT_COMPACT_EVERY = 50_000   # journal entries before compaction
+SIGNATURE_CHUNK = 1 << 16        # shingles hashed per numpy pass in add_many()
+
+log = logging.getLogger("pit_crew.dedup")
+
+
+class DedupIndex:
+    """
+    MinHash / banded-LSH index of defect texts with an optional payload per
+    ticket (e.g. its requirement link and assignee).
+    near() / best() cost one signature, bands bucket lookups and an exact
+    Jaccard check of the candidates; add() is O(1) amortized.
+    """
+    def __init__(self, normalize, path=None, bands=32, rows=6, shingle=2, threshold=DEFAULT_THRESHOLD,
+                 seed=1, max_bucket=256, merge_every=4096, compact_every=DEFAULT_COMPACT_EVERY):
+        self.normalize = normalize                  # text -> tokens (SMTTranslator.normalize)
+        self.path = path
+        self.journal_path = path + ".journal" if path else None
+        self.bands, self.rows, self.shingle, self.seed = bands, rows, shingle, seed
+        self.num_perm = bands * rows
+        self.threshold = threshold
+        self.max_bucket = max_bucket                # newest tickets kept per bucket hit
+        self.merge_every = merge_every
+        self.compact_every = compact_every
+        rng = np.random.RandomState(seed)
+        # Multiply-shift permutations: high 32 bits of a * x + b (mod 2**64), a odd
+        self._a = rng.randint(0, 1 << 64, size=(self.num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 1 << 64, size=(self.num_perm, 1), dtype=np.uint64)
+        self._salt = np.arange(1, bands + 1, dtype=np.uint64) * GOLDEN
+
+        self.bucket_keys = np.empty(0, dtype=np.uint64)   # sorted
+        self.bucket_docs = np.empty(0, dtype=np.int32)    # ticket ids, ascending within a key
+        self.indptr = np.zeros(1, dtype=np.int64)         # merged tickets' shingles (CSR)
+        self.shingle_hashes = np.empty(0, dtype=np.uint32)
+        self._pending = {}                                # bucket key -> [ticket ids] not merged yet
+        self._tail = []                                   # shingle arrays of unmerged tickets
+        self.keys = []                                    # ticket id -> caller key (e.g. defect id)
+        self.payload_of = []                              # ticket id -> payload id (-1: none)
+        self.payloads = []
+        self._payload_ids = {}
+        self._journal = None
+        self._journal_len = 0
+        self.generation = 0                               # snapshot generation, see save()
+        self._lock = threading.RLock()
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    # --- HASHING ---
+    def shingles(self, text):
+        """Sorted unique crc32 hashes of the word shingles of text."""
+        toks = self.normalize(text)
+        k = self.shingle
+        if len(toks) <= k:
+            grams = [" ".join(toks)] if toks else []
+        else:
+            grams = [" ".join(toks[i:i + k]) for i in range(len(toks) - k + 1)]
+        return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                                     dtype=np.uint32, count=len(grams)))
+
+    def signatures(self, hash_arrays):
+        """MinHash signatures (n, num_perm) of non-empty shingle hash arrays."""
+        out = np.empty((len(hash_arrays), self.num_perm), dtype=np.uint64)
+        lengths = np.fromiter(map(len, hash_arrays), dtype=np.int64, count=len(hash_arrays))
+        ends = np.cumsum(lengths)
+        flat = np.concatenate(hash_arrays).astype(np.uint64) if hash_arrays else np.empty(0, np.uint64)
+        d0 = 0
+        while d0 < len(hash_arrays):
+            start = ends[d0] - lengths[d0]
+            d1 = max(d0 + 1, int(np.searchsorted(ends, start + SIGNATURE_CHUNK, side="right")))
+            vals = (self._a * flat[start:ends[d1 - 1]] + self._b) >> SHIFT
+            offsets = ends[d0:d1] - lengths[d0:d1] - start
+            out[d0:d1] = np.minimum.reduceat(vals, offsets, axis=1).T
+            d0 = d1
+        return out
+
+    def band_keys(self, sigs):
+        """uint64 bucket key of every band: (n, num_perm) -> (n, bands)."""
+        sigs = sigs.reshape(len(sigs), self.bands, self.rows)
+        keys = np.broadcast_to(self._salt, sigs.shape[:2]).copy()
+        for r in range(self.rows):
+            keys = (keys ^ sigs[:, :, r]) * FNV_PRIME
+        return keys
+
+    # --- QUERIES ---
+    def near(self, text, threshold=None):
+        """[(ticket id, jaccard)] of indexed near-duplicates, most similar first."""
+        threshold = self.threshold if threshold is None else threshold
+        q = self.shingles(text)
+        if not len(q):
+            return []
+        keys = self.band_keys(self.signatures([q]))[0]
+        with self._lock:
+            cands = self._candidates(keys)
+            if not len(cands):
+                return []
+            sims = self._jaccard(q, cands)
+        keep = np.flatnonzero(sims >= threshold)
+        order = keep[np.lexsort((cands[keep], -sims[keep]))]
+        return [(int(d), float(s)) for d, s in zip(cands[order], sims[order])]
+
+    def best(self, text, threshold=None):
+        """(ticket id, jaccard) of the closest near-duplicate, or None."""
+        hits = self.near(text, threshold)
+        return hits[0] if hits else None
+
+    def payload(self, ticket):
+        pid = self.payload_of[ticket]
+        return self.payloads[pid] if pid >= 0 else None
+
+    def _candidates(self, keys):
+        lo = np.searchsorted(self.bucket_keys, keys, side="left")
+        hi = np.searchsorted(self.bucket_keys, keys, side="right")
+        parts = [self.bucket_docs[max(l, h - self.max_bucket):h] for l, h in zip(lo.tolist(), hi.tolist()) if h > l]
+        if self._pending:
+            for key in keys.tolist():
+                docs = self._pending.get(key)
+                if docs:
+                    parts.append(np.asarray(docs[-self.max_bucket:], dtype=np.int64))
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _jaccard(self, q, cands):
+        """Exact Jaccard of the shingle sets of q and every candidate ticket."""
+        merged = len(self.indptr) - 1
+        old, new = cands[cands < merged], cands[cands >= merged]
+        starts, lengths = self.indptr[old], self.indptr[old + 1] - self.indptr[old]
+        offsets = np.cumsum(lengths) - lengths
+        vals = self.shingle_hashes[np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())]
+        if len(new):
+            tail = [self._tail[d - merged] for d in new.tolist()]
+            vals = np.concatenate([vals] + tail)
+            lengths = np.concatenate([lengths, [len(t) for t in tail]])
+        pos = np.minimum(np.searchsorted(q, vals), len(q) - 1)
+        inter = np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=q[pos] == vals,
+                            minlength=len(lengths))
+        return inter / (lengths + len(q) - inter)
+
+    # --- WRITES ---
+    def add(self, text, payload=None, key=None, persist=True):
+        """Indexes one ticket; returns its ticket id. Persisted inserts are journaled."""
+        hashes = self.shingles(text)
+        sig = self.signatures([hashes]) if len(hashes) else None
+        with self._lock:
+            ticket = self._insert(hashes, sig, payload, key)
+            if persist and self.journal_path:
+                self._write_journal(hashes, payload, key)
+        return ticket
+
+    def add_many(self, texts, payloads=None, keys=None):
+        """Bulk add() (not journaled): signatures are hashed in numpy batches."""
+        hashes = [self.shingles(t) for t in texts]
+        payloads = payloads if payloads is not None else [None] * len(hashes)
+        keys = keys if keys is not None else [None] * len(hashes)
+        nonempty = [i for i, h in enumerate(hashes) if len(h)]
+        with self._lock:
+            self._merge()
+            first = len(self.keys)
+            bkeys = self.band_keys(self.signatures([hashes[i] for i in nonempty]))
+            docs = np.repeat(np.asarray(nonempty, dtype=np.int64) + first, self.bands)
+            self._add_buckets(bkeys.ravel(), docs)
+            lengths = np.fromiter(map(len, hashes), dtype=np.int64, count=len(hashes))
+            self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+            self.shingle_hashes = np.concatenate([self.shingle_hashes] + hashes)
+            for payload, key in zip(payloads, keys):
+                self.keys.append(key)
+                self.payload_of.append(self._intern(payload))
+        return list(range(first, first + len(hashes)))
+
+    def _insert(self, hashes, sig, payload, key):
+        ticket = len(self.keys)
+        if sig is not None:
+            for k in self.band_keys(sig)[0].tolist():
+                self._pending.setdefault(k, []).append(ticket)
+        self._tail.append(hashes)
+        self.keys.append(key)
+        self.payload_of.append(self._intern(payload))
+        if len(self._tail) >= self.merge_every:
+            self._merge()
+        return ticket
+
+    def _intern(self, payload):
+        if payload is None:
+            return -1
+        raw = json.dumps(payload, sort_keys=True)
+        pid = self._payload_ids.get(raw)
+        if pid is None:
+            pid = self._payload_ids[raw] = len(self.payloads)
+            self.payloads.append(payload)
+        return pid
+
+    def _merge(self):
+        """Folds pending bucket entries and tail shingles into the sorted arrays."""
+        if self._pending:
+            keys = np.fromiter((k for k, docs in self._pending.items() for _ in docs), dtype=np.uint64)
+            docs = np.fromiter((d for ds in self._pending.values() for d in ds), dtype=np.int64)
+            self._add_buckets(keys, docs)
+            self._pending = {}
+        if self._tail:
+            lengths = np.fromiter(map(len, self._tail), dtype=np.int64, count=len(self._tail))
+            self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+            self.shingle_hashes = np.concatenate([self.shingle_hashes] + self._tail)
+            self._tail = []
+
+    def _add_buckets(self, keys, docs):
+        # New tickets have the highest ids, so inserting them after equal keys
+        # keeps every bucket in ticket order.
+        order = np.lexsort((docs, keys))
+        keys, docs = keys[order], docs[order]
+        pos = np.searchsorted(self.bucket_keys, keys, side="right")
+        self.bucket_keys = np.insert(self.bucket_keys, pos, keys)
+        self.bucket_docs = np.insert(self.bucket_docs, pos, docs)
+
+    # --- PERSISTENCE ---
+    def _params(self):
+        return {"bands": self.bands, "rows": self.rows, "shingle": self.shingle, "seed": self.seed}
+
+    def load(self):
+        """Reads the snapshot and replays the journal."""
+        with self._lock:
+            if os.path.exists(self.path):
+                with np.load(self.path) as data:
+                    meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                    if meta["params"] != self._params():
+                        raise ValueError(f"{self.path} was built with {meta['params']}, not {self._params()}")
+                    self.bucket_keys, self.bucket_docs = data["bucket_keys"], data["bucket_docs"]
+                    self.indptr, self.shingle_hashes = data["indptr"], data["shingle_hashes"]
+                    self.payload_of = data["payload_of"].tolist()
+                self.keys = meta["keys"]
+                self.payloads = meta["payloads"]
+                self.generation = meta.get("generation", 0)
+                self._payload_ids = {json.dumps(p, sort_keys=True): i for i, p in enumerate(self.payloads)}
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._journal_len += 1
+                            if entry.get("gen", 0) != self.generation:
+                                continue   # folded into the snapshot already
+                            hashes = np.asarray(entry["shingles"], dtype=np.uint32)
+                            sig = self.signatures([hashes]) if len(hashes) else None
+                            self._insert(hashes, sig, entry["payload"], entry["key"])
+
+    def _write_journal(self, hashes, payload, key):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps({"shingles": hashes.tolist(), "payload": payload, "key": key,
+                                        "gen": self.generation}) + "\n")
+        self._journal.flush()
+        self._journal_len += 1
+        if self._journal_len >= self.compact_every:
+            self.compact()
+
+    def save(self, path=None):
+        """
+        Writes the whole index to one .npz file (atomic replace). Saving to
+        the index's own path starts a new generation: the journal written so
+        far is then part of the snapshot.
+        """
+        path = path or self.path
+        with self._lock:
+            self._merge()
+            own = path == self.path
+            generation = self.generation + 1 if own else self.generation
+            meta = {"params": self._params(), "keys": self.keys, "payloads": self.payloads, "generation": generation}
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "wb") as f:
+                np.savez(f, bucket_keys=self.bucket_keys, bucket_docs=self.bucket_docs, indptr=self.indptr,
+                         shingle_hashes=self.shingle_hashes,
+                         payload_of=np.asarray(self.payload_of, dtype=np.int32),
+                         meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8))
+            os.replace(tmp, path)
+            if own:
+                self.generation = generation
+
+    def compact(self):
+        """Folds the journal into the snapshot."""
+        with self._lock:
+            self.save()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_len = 0
+
+    def nbytes(self):
+        return (self.bucket_keys.nbytes + self.bucket_docs.nbytes + self.indptr.nbytes
+                + self.shingle_hashes.nbytes + 4 * len(self.payload_of))
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
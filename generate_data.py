@@ -1,73 +1,232 @@
-import json
+import argparse
 import csv
+import itertools
+import json
+import math
 import random
+import re
+from bisect import bisect
 
-# NOTE: This script mocks the conversion process for the hackathon. 
+# NOTE: This script mocks the conversion process for the hackathon.
 # In a real scenario, you would parse the raw SQL/XML files from the iTrust dataset.
 # Here, we generate a synthetic "Gold Standard" JSONL file based on the iTrust schema
 # to train/test your Rovo Agent immediately.
+#
+# Everything is a generator (constant memory at millions of pairs or log
+# rows) driven by one random.Random(seed). Components, error types, concerns
+# and the verb/noun vocabulary are drawn from Zipf distributions, so a few
+# components dominate and a long tail stays rare, as in a real tracker.
+
+SYSTEM_PROMPT = "You are The Pit Crew Chief, an AI that maps Defects to Requirements and diagnoses root causes."
+ITRUST_COMPONENTS = ["PatientDAO", "AuthService", "PrescriptionValidator", "LabProcedureBean"]
+COMPONENT_STEMS = ["Patient", "Auth", "Prescription", "LabProcedure", "Appointment", "Billing", "Diagnosis",
+                   "Immunization", "Insurance", "Message", "OfficeVisit", "Referral", "Report", "Session"]
+COMPONENT_KINDS = ["DAO", "Service", "Validator", "Bean", "Controller", "Action", "Loader", "Servlet"]
+ERROR_TYPES = ["NullPointerException", "SQLInjectionWarning", "PrivacyViolation", "TimeoutException",
+               "IllegalStateException", "IntegrityConstraintViolation", "AuthError", "GatewayTimeout",
+               "OutOfMemoryError", "ConcurrentModificationException"]
+VERBS = ["return", "load", "store", "verify", "validate", "render", "export", "encrypt", "authorize", "audit",
+         "schedule", "archive"]
+NOUNS = ["patient data", "record", "prescription", "session", "password", "profile", "report", "lab result",
+         "invoice", "appointment", "message", "image", "token", "referral"]
 
-def generate_itrust_data(num_samples=50):
+# (context, team, requirement, defect, root cause), most frequent first.
+# The first entry is the original iTrust security pair.
+CONCERNS = [
+    ("Security", "Security Team",
+     "The system shall ensure that only authenticated personnel can access the {component}. "
+     "All access attempts must be logged with a timestamp and user ID within 200ms.",
+     "Error in {component}.java: {error}. System failed to verify user role before returning patient data. "
+     "Latency observed: {latency}ms.",
+     "Implementation Logic. The code failed to enforce the 'authenticated personnel' constraint."),
+    ("Performance", "Performance Team",
+     "The {component} shall {verb} the {noun} within {limit}ms at the 99th percentile.",
+     "Error in {component}.java: {error}. Failed to {verb} {noun} for user {user}. Latency observed: {latency}ms.",
+     "Resource Contention. The {component} exceeded its {limit}ms latency budget."),
+    ("Database", "Data Team",
+     "The {component} must enforce unique IDs when it stores a {noun}.",
+     "Error in {component}.java: {error}. Duplicate {noun} ID stored for user {user}.",
+     "Missing Constraint. The {component} did not enforce unique {noun} IDs."),
+    ("Privacy", "Compliance Team",
+     "The {component} shall not {verb} a {noun} to roles without consent.",
+     "Error in {component}.java: {error}. The {noun} was shown to an unauthorized role for user {user}.",
+     "Access Control. The {component} skipped the consent check before it could {verb} the {noun}."),
+]
+LOG_COLUMNS = ["timestamp", "latency_ms", "status"]
+
+
+class Zipf:
     """
-    Generates synthetic Requirement-to-Defect pairs mimicking the iTrust medical dataset.
-    Format: JSONL for fine-tuning or RAG ingestion.
+    Draws items with P(rank r) proportional to 1 / r**s (first item most frequent).
+    """
+    def __init__(self, items, s, rng):
+        self.items = list(items)
+        self.cum = list(itertools.accumulate(1.0 / r ** s for r in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def __call__(self):
+        i = bisect(self.cum, self.rng.random() * self.cum[-1])
+        return self.items[min(i, len(self.items) - 1)]
+
+
+def component_names(n):
+    """n distinct component names: the iTrust ones, then stem + kind, then numbered."""
+    names = list(ITRUST_COMPONENTS)
+    seen = set(names)
+    combos = (f"{stem}{kind}" for stem in COMPONENT_STEMS for kind in COMPONENT_KINDS)
+    numbered = (f"{stem}{kind}{i}" for i in itertools.count(2)
+                for stem in COMPONENT_STEMS for kind in COMPONENT_KINDS)
+    for name in itertools.chain(combos, numbered):
+        if len(names) >= n:
+            break
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names[:n]
+
+
+def generate_samples(num_samples=50, seed=None, n_components=500, zipf_s=1.1):
+    """
+    Yields num_samples Requirement/Defect samples as dicts (req_id, bug_id,
+    context, component, requirement, defect, analysis). The same seed gives
+    the same stream; requirement ids are stable per requirement text.
     """
-    
-    data = []
-    
-    components = ["PatientDAO", "AuthService", "PrescriptionValidator", "LabProcedureBean"]
-    error_types = ["NullPointerException", "SQLInjectionWarning", "PrivacyViolation", "TimeoutException"]
-    
+    rng = random.Random(seed)
+    component = Zipf(component_names(n_components), zipf_s, rng)
+    error = Zipf(ERROR_TYPES, zipf_s, rng)
+    concern = Zipf(CONCERNS, zipf_s, rng)
+    verb, noun = Zipf(VERBS, zipf_s, rng), Zipf(NOUNS, zipf_s, rng)
+    req_ids = {}
+
     for i in range(num_samples):
+        context, team, req_tpl, defect_tpl, cause_tpl = concern()
+        fields = {"component": component(), "error": error(), "verb": verb(), "noun": noun(),
+                  "limit": rng.choice((200, 500, 1000)), "user": rng.randint(1, 50000),
+                  # Lognormal latencies centred near 800ms with a long tail
+                  "latency": int(min(60000, math.exp(rng.gauss(6.7, 0.6))))}
         # 1. Create a Requirement (The "High Resource" Language)
-        req_id = f"REQ-{random.randint(100, 999)}"
-        component = random.choice(components)
-        
-        requirement_text = (
-            f"The system shall ensure that only authenticated personnel can access the {component}. "
-            "All access attempts must be logged with a timestamp and user ID within 200ms."
-        )
-        
+        requirement_text = req_tpl.format(**fields)
+        req_id = req_ids.get(requirement_text)
+        if req_id is None:
+            req_id = req_ids[requirement_text] = f"REQ-{100 + len(req_ids)}"
+
         # 2. Create a Matched Defect (The "Low Resource" Language)
-        bug_id = f"BUG-{random.randint(4000, 9999)}"
-        error = random.choice(error_types)
-        
-        defect_text = (
-            f"Error in {component}.java: {error}. "
-            f"System failed to verify user role before returning patient data. "
-            f"Latency observed: {random.randint(300, 1500)}ms."
-        )
-        
+        bug_id = f"BUG-{4000 + i}"
+        defect_text = defect_tpl.format(**fields)
+
         # 3. Create the "Analysis" (The Chain of Thought)
         analysis = (
             f"Traceability: {bug_id} links to {req_id}.\n"
-            f"Root Cause: Implementation Logic. The code failed to enforce the 'authenticated personnel' constraint.\n"
-            f"Assignment: Recommended for Security Team."
+            f"Root Cause: {cause_tpl.format(**fields)}\n"
+            f"Assignment: Recommended for {team}."
         )
+        yield {"req_id": req_id, "bug_id": bug_id, "context": context, "component": fields["component"],
+               "requirement": requirement_text, "defect": defect_text, "analysis": analysis}
+
 
-        # Structure for Rovo / Chat Fine-Tuning
-        entry = {
-            "messages": [
-                {"role": "system", "content": "You are The Pit Crew Chief, an AI that maps Defects to Requirements and diagnoses root causes."},
-                {"role": "user", "content": f"Analyze this Defect: {defect_text}"},
-                {"role": "assistant", "content": f"Found Linked Requirement {req_id}: '{requirement_text}'\n\nAnalysis: {analysis}"}
-            ]
-        }
-        data.append(entry)
+def to_chat(sample):
+    """Structure for Rovo / Chat Fine-Tuning."""
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Analyze this Defect: {sample['defect']}"},
+            {"role": "assistant", "content": f"Found Linked Requirement {sample['req_id']}: "
+                                             f"'{sample['requirement']}'\n\nAnalysis: {sample['analysis']}"}
+        ]
+    }
+
+
+def generate_itrust_data(num_samples=50, seed=None, n_components=500, zipf_s=1.1):
+    """
+    Generates synthetic Requirement-to-Defect pairs mimicking the iTrust medical dataset.
+    Format: JSONL for fine-tuning or RAG ingestion (one chat entry per sample, streamed).
+    """
+    return map(to_chat, generate_samples(num_samples, seed, n_components, zipf_s))
+
+
+def generate_pairs(num_samples, seed=None, n_components=500, zipf_s=1.1):
+    """(Requirement_Text, Defect_Text) pairs, as load_itrust_pairs reads them back."""
+    for s in generate_samples(num_samples, seed, n_components, zipf_s):
+        yield s["requirement"], s["defect"]
+
+
+def generate_log_rows(num_rows, seed=None, slow_rate=0.1, base_latency=400, slow_latency=1200):
+    """
+    Yields (timestamp, latency_ms, status) rows shaped like dummy_logs.csv:
+    latencies scatter around base_latency, a slow_rate share of requests
+    around slow_latency with a 503.
+    """
+    rng = random.Random(seed)
+    for ts in range(num_rows):
+        if rng.random() < slow_rate:
+            yield ts, int(rng.gauss(slow_latency, slow_latency * 0.1)), "503"
+        else:
+            yield ts, max(1, int(rng.gauss(base_latency, base_latency * 0.15))), "200"
 
-    return data
 
 def save_to_jsonl(data, filename="itrust_rovo_training.jsonl"):
+    n = 0
     with open(filename, 'w') as f:
         for entry in data:
             f.write(json.dumps(entry) + "\n")
-    print(f"Successfully generated {len(data)} training samples in {filename}")
+            n += 1
+    print(f"Successfully generated {n} training samples in {filename}")
+    return n
+
+
+def save_logs_csv(rows, filename="synthetic_logs.csv"):
+    n = 0
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(LOG_COLUMNS)
+        for chunk in iter(lambda: list(itertools.islice(rows, 65536)), []):
+            writer.writerows(chunk)
+            n += len(chunk)
+    print(f"Successfully generated {n} log rows in {filename}")
+    return n
+
+
+def load_itrust_pairs(filename="itrust_rovo_training.jsonl"):
+    """
+    Reads the JSONL back into (Requirement_Text, Defect_Text) pairs.
+    """
+    pairs = []
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            msgs = json.loads(line)["messages"]
+            defect = msgs[1]["content"].split("Analyze this Defect: ", 1)[-1]
+            match = re.search(r"Found Linked Requirement [^:]+: '(.*?)'\n", msgs[2]["content"], re.S)
+            if match:
+                pairs.append((match.group(1), defect))
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic iTrust Requirement/Defect corpus and log generator.")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--components", type=int, default=500)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of components / vocabulary")
+    parser.add_argument("--out", default="itrust_rovo_training.jsonl")
+    parser.add_argument("--log-rows", type=int, default=0, help="also write this many log rows")
+    parser.add_argument("--logs-out", default="synthetic_logs.csv")
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
     # Generate the dataset
-    dataset = generate_itrust_data(50)
-    save_to_jsonl(dataset)
-    
+    save_to_jsonl(generate_itrust_data(args.samples, args.seed, args.components, args.zipf), args.out)
+    if args.log_rows:
+        save_logs_csv(generate_log_rows(args.log_rows, args.seed, args.slow_rate), args.logs_out)
+
     # Preview one entry
-    print("\nSample Data Preview:")
-    print(json.dumps(dataset[0], indent=2))
+    with open(args.out) as f:
+        first = f.readline()
+    if first:
+        print("\nSample Data Preview:")
+        print(json.dumps(json.loads(first), indent=2))
+
+
+if __name__ == "__main__":
+    main()
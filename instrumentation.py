@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+import time
+
+# --- LATENCY INSTRUMENTATION ---
+# Per-stage latency histograms for the brain pipeline (SMT translate,
+# requirement linking, code gen, CSV load, exec, assignment), rendered in the
+# Prometheus text format by /metrics.
+#
+# Histograms are HDR-style log-linear: values (integer nanoseconds from the
+# monotonic perf_counter_ns clock) below 2 * SUB are exact, above that every
+# power of two is split into SUB linear sub-buckets, so any recorded value is
+# known to within 1 / SUB (~3%) at every magnitude with a fixed bucket array.
+#
+# PCC_METRICS=0 turns the timers into no-ops; PCC_LOG_LEVEL sets the level of
+# the pit_crew.* loggers (OFF silences them).
+
+SUB_BITS = 5
+SUB = 1 << SUB_BITS
+MAX_BITS = 42                       # ~73 minutes in ns; longer values land in the last bucket
+N_BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB
+ENABLED = os.getenv("PCC_METRICS", "1") != "0"
+
+# Prometheus bucket bounds (seconds) and reported quantiles
+PROM_BOUNDS = [m * 10.0 ** e for e in range(-6, 2) for m in (1, 2.5, 5)]
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(ns):
+    if ns < 2 * SUB:
+        return max(ns, 0)
+    shift = ns.bit_length() - SUB_BITS - 1
+    return min((shift + 1) * SUB + (ns >> shift) - SUB, N_BUCKETS - 1)
+
+
+def bucket_bounds(i):
+    """[lower, upper) of bucket i in nanoseconds."""
+    if i < 2 * SUB:
+        return i, i + 1
+    shift = i // SUB - 1
+    top = SUB + i % SUB
+    return top << shift, (top + 1) << shift
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear histogram of durations (nanoseconds).
+    """
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def record(self, ns):
+        i = bucket_index(ns)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total_ns += ns
+            if ns > self.max_ns:
+                self.max_ns = ns
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.total_ns, self.max_ns
+
+    def quantile(self, q, counts=None, count=None):
+        """Upper bound (seconds) of the bucket holding the q-quantile."""
+        if counts is None:
+            counts, count, _, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = max(1, int(q * count + 0.5))
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return bucket_bounds(i)[1] / 1e9
+        return bucket_bounds(N_BUCKETS - 1)[1] / 1e9
+
+
+class _StageTimer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter_ns() - self.t0)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    """
+    Stage name -> LatencyHistogram, created on first use.
+    """
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(stage, LatencyHistogram())
+        return hist
+
+    def timer(self, stage):
+        """with registry.timer("exec"): ... records the block's wall time."""
+        if not self.enabled:
+            return NULL_TIMER
+        return _StageTimer(self.histogram(stage))
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).record(int(seconds * 1e9))
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def render(self, prefix="pcc_stage_latency"):
+        """Prometheus text exposition (histogram + quantile gauges per stage)."""
+        hist_lines, quant_lines = [], []
+        for name in sorted(self.histograms):
+            hist = self.histograms[name]
+            counts, count, total_ns, _ = hist.snapshot()
+            label = f'stage="{name}"'
+            cum, i = 0, 0
+            for bound in PROM_BOUNDS:
+                limit = bound * 1e9
+                while i < N_BUCKETS and bucket_bounds(i)[1] <= limit:
+                    cum += counts[i]
+                    i += 1
+                hist_lines.append(f'{prefix}_seconds_bucket{{{label},le="{bound:g}"}} {cum}')
+            hist_lines.append(f'{prefix}_seconds_bucket{{{label},le="+Inf"}} {count}')
+            hist_lines.append(f"{prefix}_seconds_sum{{{label}}} {total_ns / 1e9:.9f}")
+            hist_lines.append(f"{prefix}_seconds_count{{{label}}} {count}")
+            for q in QUANTILES:
+                quant_lines.append(f'{prefix}_quantile_seconds{{{label},quantile="{q:g}"}} '
+                                   f"{hist.quantile(q, counts, count):.9f}")
+        return "\n".join([
+            f"# HELP {prefix}_seconds Wall time of brain pipeline stages.",
+            f"# TYPE {prefix}_seconds histogram",
+            *hist_lines,
+            f"# HELP {prefix}_quantile_seconds Stage latency quantiles (HDR bucket upper bound).",
+            f"# TYPE {prefix}_quantile_seconds gauge",
+            *quant_lines,
+        ]) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def stage(name):
+    return REGISTRY.timer(name)
+
+
+def record(name, seconds):
+    REGISTRY.record(name, seconds)
+
+
+def render_prometheus():
+    return REGISTRY.render()
+
+
+def configure_logging(level=None):
+    """
+    Leveled logging for the pit_crew.* loggers (plain messages on stderr).
+    level / PCC_LOG_LEVEL: DEBUG, INFO (default), WARNING, ... or OFF.
+    """
+    level = (level or os.getenv("PCC_LOG_LEVEL", "INFO")).upper()
+    logger = logging.getLogger("pit_crew")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.CRITICAL + 1 if level in ("OFF", "NONE") else level)
+    return logger
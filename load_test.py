@@ -0,0 +1,100 @@
+"""
+Load test for /trace: throughput and latency percentiles at several client
+concurrency levels, for each serving mode (BRAIN_SERVE_MODE). Starts its own
+server per mode unless --url points at a running one.
+Usage: python load_test.py --modes sync async --clients 1 16 64 --requests 400
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from bench_common import ERRORS, percentile
+
+SERVER = "import brain_server, sys; brain_server.serve(int(sys.argv[1]))"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port):
+    env = dict(os.environ, BRAIN_SERVE_MODE=mode)
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=here, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/health", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"server ({mode}) did not come up")
+
+
+def run_level(url, clients, total):
+    per_client = max(1, total // clients)
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def client(cid):
+        session = requests.Session()
+        local = []
+        for i in range(per_client):
+            body = {"defect": f"{ERRORS[(cid + i) % len(ERRORS)]} after {1000 + i}ms"}
+            t0 = time.perf_counter()
+            r = session.post(url + "/trace", json=body, timeout=60)
+            local.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                failures.append(r.status_code)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return len(latencies) / wall, latencies, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    parser.add_argument("--url", help="test an already running server instead")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for mode in ([None] if args.url else args.modes):
+        proc, url = (None, args.url) if args.url else start_server(mode, free_port())
+        try:
+            requests.post(url + "/trace", json={"defect": "warm-up"}, timeout=60)
+            for clients in args.clients:
+                rps, lat, failures = run_level(url, clients, args.requests)
+                failed |= bool(failures)
+                print(f"{mode or url:<6} clients={clients:<3} {rps:8.1f} req/s  "
+                      f"p50 {percentile(lat, 50) * 1000:8.1f}ms  p99 {percentile(lat, 99) * 1000:8.1f}ms"
+                      f"  errors={len(failures)}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
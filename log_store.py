@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+# --- LOG DATASET MANAGER ---
+# CSV log exports are converted once into a columnar on-disk layout (one raw
+# binary column file per column + schema.json) and then opened with
+# numpy.memmap. Hot datasets stay in an LRU keyed by (path, mtime, size) with
+# a byte budget, and DataFrames are built over the memmaps without copying.
+# numpy / pandas are imported on first conversion or open, so importing this
+# module (e.g. for fingerprint) stays cheap.
+
+DEFAULT_CACHE_DIR = os.getenv("PCC_DATASET_CACHE", ".pcc_cache")
+DEFAULT_BUDGET_BYTES = int(os.getenv("PCC_DATASET_BUDGET_MB", "1024")) * 2**20
+CHUNK_ROWS = 1_000_000
+
+
+def fingerprint(csv_path):
+    """(abspath, mtime_ns, size): changes whenever the log file is rewritten."""
+    st = os.stat(csv_path)
+    return (os.path.abspath(csv_path), st.st_mtime_ns, st.st_size)
+
+
+def _column_file(name):
+    return hashlib.sha1(str(name).encode("utf-8")).hexdigest()[:16] + ".bin"
+
+
+def convert_csv(csv_path, out_dir, chunk_rows=CHUNK_ROWS):
+    """
+    Streams a CSV into the columnar layout. Numeric columns are written as
+    raw arrays; text columns as int32 category codes plus a category list.
+    Returns the schema dict.
+    """
+    overrides = {}
+    while True:
+        schema = _convert_pass(csv_path, out_dir, chunk_rows, overrides)
+        if schema is not None:
+            return schema
+        # A later chunk needed a wider dtype than the first one: redo with it.
+
+
+def _convert_pass(csv_path, out_dir, chunk_rows, overrides):
+    import numpy as np
+    import pandas as pd
+
+    # Per-process temp dir: sandbox workers may convert the same log concurrently.
+    tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns, files, categories = [], {}, {}
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            if not columns:
+                for name in chunk.columns:
+                    col = chunk[name]
+                    kind = "category" if not pd.api.types.is_numeric_dtype(col.dtype) else "numeric"
+                    dtype = np.dtype(np.int32) if kind == "category" else np.dtype(overrides.get(name, col.dtype))
+                    columns.append({"name": str(name), "kind": kind, "dtype": dtype.str, "file": _column_file(name)})
+                    files[name] = open(os.path.join(tmp_dir, columns[-1]["file"]), "wb")
+                    categories[name] = {}
+            for meta, name in zip(columns, chunk.columns):
+                col = chunk[name]
+                if meta["kind"] == "category":
+                    # Chunk-local codes remapped onto the dataset-wide category ids.
+                    cats = categories[name]
+                    local, uniques = pd.factorize(col)
+                    remap = np.asarray([cats.setdefault(str(u), len(cats)) for u in uniques] + [-1], dtype=np.int32)
+                    files[name].write(remap[local].tobytes())
+                    continue
+                target = np.dtype(meta["dtype"])
+                arr = col.to_numpy()
+                if not np.can_cast(arr.dtype, target, casting="safe"):
+                    overrides[name] = np.result_type(arr.dtype, target).str
+                    return None
+                files[name].write(arr.astype(target, copy=False).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    for meta, cats in zip(columns, categories.values()):
+        if meta["kind"] == "category":
+            meta["categories"] = list(cats)
+    schema = {"source": os.path.abspath(csv_path), "rows": rows, "columns": columns}
+    with open(os.path.join(tmp_dir, "schema.json"), "w") as f:
+        json.dump(schema, f)
+    try:
+        # Never removes a published out_dir: another process may be reading it
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        # Another process published the same dataset first; theirs is identical.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return schema
+
+
+def open_columnar(out_dir):
+    """
+    Opens a converted dataset as a DataFrame whose numeric columns are
+    read-only numpy.memmap views (no copy). Returns (df, mapped_bytes).
+    """
+    import numpy as np
+    import pandas as pd
+
+    with open(os.path.join(out_dir, "schema.json")) as f:
+        schema = json.load(f)
+    rows = schema["rows"]
+    data, nbytes = {}, 0
+    for meta in schema["columns"]:
+        path = os.path.join(out_dir, meta["file"])
+        dtype = np.dtype(meta["dtype"])
+        arr = np.memmap(path, dtype=dtype, mode="r", shape=(rows,)) if rows else np.zeros(0, dtype=dtype)
+        nbytes += arr.nbytes
+        if meta["kind"] == "category":
+            data[meta["name"]] = pd.Categorical.from_codes(arr, categories=meta["categories"])
+        else:
+            data[meta["name"]] = arr
+    return pd.DataFrame(data, copy=False), nbytes
+
+
+class DatasetManager:
+    """
+    LRU of hot log datasets. get(csv_path) converts the CSV on first use (or
+    when its mtime/size changed) and returns a memory-mapped DataFrame.
+    Treat the returned frame as read-only; take df.copy(deep=False) before
+    adding columns.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_budget=DEFAULT_BUDGET_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self._lru = OrderedDict()   # fingerprint -> (df, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()   # LRU + stats; never held while converting
+        self._flights = {}              # fingerprint -> Lock (one conversion per dataset)
+        self.stats = {"hits": 0, "misses": 0, "conversions": 0, "evictions": 0}
+
+    def _source_dir(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha1(path.encode("utf-8")).hexdigest()[:20])
+
+    def _dataset_dir(self, fp):
+        # <cache_dir>/<source digest>/<mtime_ns>-<size>: every version of one log in one place
+        path, mtime, size = fp
+        return os.path.join(self._source_dir(path), f"{mtime}-{size}")
+
+    def _remove_stale(self, fp):
+        """
+        Deletes conversions of older versions of fp's log, including ones this
+        process never loaded (evicted, or written before a restart). Conversions
+        in progress (.tmp dirs) and newer versions (another process may
+        have seen a later rewrite) are left alone.
+        """
+        source_dir, current = os.path.split(self._dataset_dir(fp))
+        try:
+            names = os.listdir(source_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            mtime, _, size = name.partition("-")
+            if name != current and mtime.isdigit() and size.isdigit() and int(mtime) <= fp[1]:
+                shutil.rmtree(os.path.join(source_dir, name), ignore_errors=True)
+
+    def _hit(self, fp):
+        """Cached frame for fp (counted as a hit) or None. Caller holds _lock."""
+        hit = self._lru.get(fp)
+        if hit is None:
+            return None
+        self._lru.move_to_end(fp)
+        self.stats["hits"] += 1
+        return hit[0]
+
+    def get(self, csv_path):
+        fp = fingerprint(csv_path)
+        with self._lock:
+            df = self._hit(fp)
+            if df is not None:
+                return df
+            self.stats["misses"] += 1
+            # Older versions of the same file are stale now (memory and disk).
+            for key in [k for k in self._lru if k[0] == fp[0]]:
+                self._drop(key)
+            flight = self._flights.setdefault(fp, threading.Lock())
+        self._remove_stale(fp)
+
+        # Single flight per dataset: other logs stay served while this one converts
+        with flight:
+            with self._lock:
+                df = self._hit(fp)
+                if df is not None:
+                    return df
+            try:
+                out_dir = self._dataset_dir(fp)
+                converted = False
+                if not os.path.exists(os.path.join(out_dir, "schema.json")):
+                    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+                    convert_csv(csv_path, out_dir)
+                    converted = True
+                df, nbytes = open_columnar(out_dir)
+                with self._lock:
+                    self.stats["conversions"] += converted
+                    self._lru[fp] = (df, nbytes)
+                    self._bytes += nbytes
+                    while self._bytes > self.memory_budget and len(self._lru) > 1:
+                        self._drop(next(iter(self._lru)))
+                        self.stats["evictions"] += 1
+            finally:
+                with self._lock:
+                    self._flights.pop(fp, None)
+            return df
+
+    def _drop(self, key):
+        _, nbytes = self._lru.pop(key)
+        self._bytes -= nbytes
+
+    def invalidate(self, csv_path=None):
+        with self._lock:
+            for key in list(self._lru):
+                if csv_path is None or key[0] == os.path.abspath(csv_path):
+                    self._drop(key)
+
+    def resident_bytes(self):
+        return self._bytes
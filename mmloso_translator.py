@@ -1,8 +1,15 @@
-import re
+import contextlib
 import math
 import pickle
 import os
+import time
 from collections import defaultdict, Counter
+import batch_decoder
+import model_store
+from candidate_index import CandidateIndex
+from compact_lm import CompactTrigramLM
+import sparse_trainer
+from tokenizer import DEFECT_TOKENIZER
 
 # --- CONFIGURATION ---
 # Stopwords common in Requirements (High Resource)
@@ -10,31 +17,132 @@ COMMON_STOPS = set([
     "the", "a", "an", "and", "or", "to", "of", "in", "on", "for", "is", "are", "was", "were",
     "shall", "must", "should", "will", "system", "user"
 ])
+_NO_COUNTS = Counter()  # Read-only stand-in for an unseen LM context
 
 class DefectTranslator:
-    def __init__(self):
+    def __init__(self, cand_k=5, lm_backend="compact", lm_min_count=1, lm_smoothing="addk"):
+        if lm_backend not in ("compact", "dict"):
+            raise ValueError(f"Unknown LM backend: {lm_backend}")
         self.lex_prob = {}       # Word Translation Probabilities
         self.lm_data = None      # Language Model Data
+        self.lm_backend = lm_backend      # "compact" (CompactTrigramLM) or "dict" (Counter tables)
+        self.lm_min_count = lm_min_count  # Trigrams seen fewer times are pruned (compact only)
+        self.lm_smoothing = lm_smoothing  # "addk" or "backoff" (compact only)
         self.len_ratio = 1.0     # Length Ratio (Req vs Defect)
+        self.cand_k = cand_k     # Translation candidates per source word (decoder)
+        self.cand_index = None   # Top-K Candidate Index (built after train/load)
+        self.train_stats = None  # sparse_trainer.IBM1Trainer statistics for update()
         
     # --- UTILITIES ---
     def normalize(self, s):
-        s = str(s).lower()
-        s = re.sub(r"([.,!?;:()\[\]{}\"'“”‘’|/\\\-])", r" \1 ", s) # Space out punct
-        return re.sub(r"\s+", " ", s).strip()
+        return " ".join(self.tokenize(s))
 
     def tokenize(self, s):
-        return self.normalize(s).split()
+        memo = self.__dict__.get("_tok_memo")  # set while training (see _tokenize_once)
+        return list(memo(s)) if memo is not None else DEFECT_TOKENIZER.tokenize(s)
+
+    @contextlib.contextmanager
+    def _tokenize_once(self, n_sentences):
+        """
+        Caches tokenize() for a training run, so the Dice / EM / LM passes
+        tokenize every corpus sentence once.
+        """
+        self._tok_memo = DEFECT_TOKENIZER.memoized(n_sentences)
+        try:
+            yield
+        finally:
+            self.__dict__.pop("_tok_memo", None)
 
     # --- TRAINING (IBM Model 1 + Diagonal Alignment) ---
-    def train(self, pairs, em_iter=5):
+    def train(self, pairs, em_iter=5, backend="sparse", chunk_size=2048, workers=1):
         """
         pairs: List of tuples [(Requirement_Text, Defect_Text)]
+        backend: "sparse" (vectorized Dice + batched EM) or "dict" (reference loops)
+        chunk_size: Sentence pairs per EM batch (caps peak memory of the sparse backend)
+        workers: Processes for the sharded E-step (sparse backend only)
         """
+        if backend not in ("sparse", "dict"):
+            raise ValueError(f"Unknown training backend: {backend}")
+        with self._tokenize_once(2 * len(pairs)):
+            self._train(pairs, em_iter, backend, chunk_size, workers)
+
+    def _train(self, pairs, em_iter, backend, chunk_size, workers):
         print(f"Training on {len(pairs)} pairs...")
+        self.em_stats = []
+
+        if backend == "dict":
+            # 1. Initialize with Dice Coefficient (Co-occurrence)
+            print("-> Step 1: Dice Initialization...")
+            t_given_s = self._dice_init(pairs)
+            # 2. EM Algorithm (Refining Probabilities)
+            print("-> Step 2: EM Training...")
+            self._em_dict(pairs, t_given_s, em_iter)
+        else:
+            print("-> Step 1: Dice Initialization...")
+            src_docs = [self.tokenize(s) for s, _ in pairs]
+            tgt_docs = [self.tokenize(t) for _, t in pairs]
+            trainer = sparse_trainer.IBM1Trainer(src_docs, tgt_docs, threshold=0.1, chunk_size=chunk_size)
+
+            print(f"-> Step 2: EM Training ({workers} worker(s))...")
+            e_step = sparse_trainer.ParallelEStep(trainer, workers) if workers > 1 and em_iter else None
+            try:
+                for i in range(em_iter):
+                    t0 = time.perf_counter()
+                    loglik = trainer.iterate(e_step)
+                    secs = time.perf_counter() - t0
+                    self.em_stats.append({"iteration": i + 1, "seconds": secs, "log_likelihood": loglik})
+                    shown = "n/a (Dice seeds)" if loglik is None else f"{loglik:.2f}"
+                    print(f"   EM iter {i + 1}/{em_iter}: {secs:.3f}s, log-likelihood {shown}")
+            finally:
+                if e_step is not None:
+                    e_step.close()
+            t_given_s = trainer.lexicon(defaultdict(dict))
+            # Keep the expected counts for update(), not the encoded corpus
+            trainer.chunks = []
+        self.train_stats = trainer if backend == "sparse" else None
+        self.lex_prob = t_given_s
+        
+        # 3. Train Language Model (Trigram) on Target (Defects)
+        print("-> Step 3: Language Model Training...")
+        tgt_sents = [t for _, t in pairs]
+        self.lm_data = self._train_trigram(tgt_sents)
+
+        # 4. Top-K candidate index for the decoder
+        self.build_candidate_index()
         
-        # 1. Initialize with Dice Coefficient (Co-occurrence)
-        print("-> Step 1: Dice Initialization...")
+        print("✅ Training Complete.")
+
+    def update(self, new_pairs, decay=1.0, em_iter=1):
+        """
+        Online training on newly closed tickets: stepwise EM over the new
+        pairs on top of the kept expected counts, plus trigram counts.
+        decay < 1 down-weights older evidence. The new lexicon, LM and
+        candidate index are published together (see snapshot()).
+        """
+        trainer = self.train_stats
+        if trainer is None:
+            raise RuntimeError("update() needs the statistics kept by train(backend='sparse')")
+        with self._tokenize_once(2 * len(new_pairs)):
+            return self._update(trainer, new_pairs, decay, em_iter)
+
+    def _update(self, trainer, new_pairs, decay, em_iter):
+        print(f"Updating on {len(new_pairs)} pairs (decay {decay})...")
+        src_docs = [self.tokenize(s) for s, _ in new_pairs]
+        tgt_docs = [self.tokenize(t) for _, t in new_pairs]
+        rows, loglik = trainer.update(src_docs, tgt_docs, decay=decay, em_iter=em_iter)
+
+        # Copy-on-write lexicon: untouched rows are shared with the live model
+        lex = defaultdict(dict, self.lex_prob)
+        for sw, row in trainer.lexicon_rows(rows).items():
+            if row:
+                lex[sw] = row
+            else:
+                lex.pop(sw, None)
+        lm = self._update_trigram(self.lm_data, [t for _, t in new_pairs], decay)
+        self._publish(lex, lm)
+        return loglik
+
+    def _dice_init(self, pairs):
         cooccur = defaultdict(int)
         src_counts = defaultdict(int)
         tgt_counts = defaultdict(int)
@@ -53,9 +161,9 @@ class DefectTranslator:
             dice = 2.0 * count / (src_counts[sw] + tgt_counts[tw])
             if dice > 0.1: # Threshold to keep model small
                 t_given_s[sw][tw] = dice
+        return t_given_s
 
-        # 2. EM Algorithm (Refining Probabilities)
-        print("-> Step 2: EM Training...")
+    def _em_dict(self, pairs, t_given_s, em_iter):
         for _ in range(em_iter):
             count = defaultdict(lambda: defaultdict(float))
             total_s = defaultdict(float)
@@ -79,17 +187,12 @@ class DefectTranslator:
                 denom = total_s[sw]
                 for tw, c in targets.items():
                     t_given_s[sw][tw] = c / denom
-        
-        self.lex_prob = t_given_s
-        
-        # 3. Train Language Model (Trigram) on Target (Defects)
-        print("-> Step 3: Language Model Training...")
-        tgt_sents = [t for _, t in pairs]
-        self.lm_data = self._train_trigram(tgt_sents)
-        
-        print("✅ Training Complete.")
+        return t_given_s
 
     def _train_trigram(self, sentences):
+        if getattr(self, "lm_backend", "dict") == "compact":
+            return CompactTrigramLM.from_sentences(
+                [self.tokenize(s) for s in sentences], min_count=self.lm_min_count, smoothing=self.lm_smoothing)
         ngram = defaultdict(Counter)
         ctx_count = Counter()
         for s in sentences:
@@ -100,6 +203,59 @@ class DefectTranslator:
                 ctx_count[ctx] += 1
         return (ngram, ctx_count)
 
+    def _update_trigram(self, lm_data, sentences, decay=1.0):
+        """
+        New (ngram, ctx_count) tables = decayed old counts + counts of the new
+        sentences. Touched contexts get fresh Counters; the old tables are not
+        modified. Add-k smoothing is not scale invariant, so decay < 1 has to
+        rescale every count (O(size)) rather than use a global scale.
+        """
+        if isinstance(lm_data, CompactTrigramLM):
+            return lm_data.updated([self.tokenize(s) for s in sentences], decay)
+        if not lm_data and getattr(self, "lm_backend", "dict") == "compact":
+            return self._train_trigram(sentences)
+        old_ngram, old_ctx = lm_data if lm_data else (defaultdict(Counter), Counter())
+        if decay != 1.0:
+            ngram = defaultdict(Counter, {ctx: Counter({w: c * decay for w, c in row.items()})
+                                          for ctx, row in list(old_ngram.items())})
+            ctx_count = Counter({ctx: c * decay for ctx, c in list(old_ctx.items())})
+        else:
+            ngram = defaultdict(Counter, old_ngram)
+            ctx_count = Counter(old_ctx)
+        new_ngram, new_ctx = self._train_trigram(sentences)
+        for ctx, row in new_ngram.items():
+            merged = Counter(ngram.get(ctx, ()))
+            merged.update(row)
+            ngram[ctx] = merged
+        ctx_count.update(new_ctx)
+        return (ngram, ctx_count)
+
+    def build_candidate_index(self, k=None):
+        self.cand_k = k or getattr(self, "cand_k", 5)
+        return self._publish(self.lex_prob, self.lm_data)[2]
+
+    def _publish(self, lex_prob, lm_data):
+        if isinstance(lex_prob, model_store.MappedLexicon):
+            index = CandidateIndex.from_csr(lex_prob.vocab, lex_prob.indptr, lex_prob.tgt, lex_prob.prob, self.cand_k)
+        else:
+            index = CandidateIndex.from_lexicon(lex_prob, self.cand_k)
+        snap = (lex_prob, lm_data, index)
+        # Single dict.update: the attributes switch together
+        self.__dict__.update(lex_prob=lex_prob, lm_data=lm_data, cand_index=index, _snapshot=snap)
+        return snap
+
+    def snapshot(self):
+        """
+        (lex_prob, lm_data, cand_index) as last published by train / update /
+        load. Decoders read one snapshot per call, so a concurrent update()
+        is seen either entirely or not at all.
+        """
+        snap = self.__dict__.get("_snapshot")
+        if (snap is None or snap[0] is not self.lex_prob or snap[1] is not self.lm_data
+                or snap[2] is not self.cand_index):
+            snap = self._publish(self.lex_prob, self.lm_data)
+        return snap
+
     # --- INFERENCE (Beam Search Decoder) ---
     def translate(self, source_text):
         """
@@ -108,21 +264,21 @@ class DefectTranslator:
         src_toks = self.tokenize(source_text)
         beam = [([], "<s>", "<s>", 0.0)] # (hyp, p2, p1, score)
         beam_width = 5
+        _, lm_data, index = self.snapshot()
         
         for sw in src_toks:
             if sw in COMMON_STOPS: continue # Skip stop words
             
-            candidates = self.lex_prob.get(sw, {})
-            # Get top 5 translations for this word
-            top_cands = sorted(candidates.items(), key=lambda x: x[1], reverse=True)[:5]
+            # Top-K translations for this word (log-probs precomputed)
+            cand_toks, cand_logp = index.candidates(sw)
             
             new_beam = []
             for hyp, p2, p1, score in beam:
-                for tw, prob in top_cands:
+                for tw, logp in zip(cand_toks, cand_logp):
                     # Language Model Score
-                    lm_prob = self._get_lm_score(tw, p2, p1)
+                    lm_prob = self._get_lm_score(tw, p2, p1, lm_data)
                     
-                    new_score = score + math.log(prob) + (0.5 * lm_prob)
+                    new_score = score + logp + (0.5 * lm_prob)
                     new_hyp = hyp + [tw]
                     new_beam.append((new_hyp, p1, tw, new_score))
             
@@ -135,22 +291,47 @@ class DefectTranslator:
         best_toks = beam[0][0]
         return " ".join(best_toks)
 
-    def _get_lm_score(self, w, p2, p1):
-        if not self.lm_data: return 0.0
-        ngram, ctx_count = self.lm_data
+    def translate_batch(self, texts, beam_width=5):
+        """
+        Translates many Requirements at once (flat beams + vectorized LM lookups).
+        Same best hypotheses as translate() for the same beam width.
+        """
+        return batch_decoder.decode_batch(self, texts, beam_width=beam_width, stops=COMMON_STOPS)
+
+    def _get_lm_score(self, w, p2, p1, lm_data=None):
+        lm_data = self.lm_data if lm_data is None else lm_data
+        if not lm_data: return 0.0
+        if isinstance(lm_data, CompactTrigramLM):
+            return lm_data.logprob(w, p2, p1)
+        ngram, ctx_count = lm_data
         ctx = (p2, p1)
-        count = ngram[ctx][w]
+        # .get: indexing the defaultdict would insert every unseen context
+        count = ngram.get(ctx, _NO_COUNTS)[w]
         total = ctx_count[ctx]
         return math.log((count + 0.1) / (total + 1000)) # Add-k smoothing
 
     # --- PERSISTENCE ---
     def save(self, path):
+        # Underscore attributes are derived caches (rebuilt on demand).
+        state = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
         with open(path, 'wb') as f:
-            pickle.dump(self.__dict__, f)
+            pickle.dump(state, f)
+
+    def save_compact(self, path):
+        """
+        Writes the memory-mappable model directory (see model_store.py).
+        """
+        return model_store.write_compact(self, path)
     
     def load(self, path):
-        with open(path, 'rb') as f:
-            self.__dict__ = pickle.load(f)
+        # Directories are compact (memory-mapped) models, files are pickles.
+        if os.path.isdir(path):
+            self.__dict__.update(model_store.load_compact(path))
+            self.train_stats = None  # compact models are read-only
+        else:
+            with open(path, 'rb') as f:
+                self.__dict__ = pickle.load(f)
+        self.build_candidate_index()
 
 # --- EXAMPLE USAGE ---
 if __name__ == "__main__":
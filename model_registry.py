@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import instrumentation
+from pit_crew_core import SMTTranslator
+from requirement_index import RequirementIndex
+
+# --- MULTI-TENANT MODEL REGISTRY ---
+# One SMT translator + requirement set per project (Jira project / tenant).
+# Snapshots live on disk, one directory per published version:
+#
+#   <root>/<project>/CURRENT           name of the live version ("v3")
+#   <root>/<project>/v3/smt.pkl        SMTTranslator.save() (+ smt.pkl.stats)
+#   <root>/<project>/v3/requirements.pkl
+#                                      the RequirementIndex as built (no re-indexing on load)
+#   <root>/<project>/v3/meta.json      estimated resident bytes, measured once at publish
+#
+# get() loads a project on first use and keeps it in an LRU bounded by a
+# memory budget (estimated resident bytes); idle projects are evicted and
+# reloaded from their snapshot on the next request. publish() writes a new
+# version, flips CURRENT with an atomic rename and swaps the resident entry
+# with one reference assignment; requirement edits (update_requirements)
+# are copy-on-write and swap the same way. Requests hold the ProjectModels
+# they got from get() until they finish, so a swap or an eviction never pulls
+# a model out from under an in-flight request.
+
+PROJECT_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+DEFAULT_BUDGET_BYTES = 1024 * 2**20
+KEEP_VERSIONS = 2   # the live version and the one before it
+
+log = logging.getLogger("pit_crew.registry")
+
+
+class UnknownProject(KeyError):
+    """No snapshot has been published for the project."""
+
+
+class InvalidProject(ValueError):
+    pass
+
+
+def check_project(project):
+    if not isinstance(project, str) or not PROJECT_RE.match(project):
+        raise InvalidProject(f"Invalid project id: {project!r}")
+    return project
+
+
+def approx_nbytes(obj, seen=None):
+    """Deep sys.getsizeof over dicts, lists, tuples, sets and strings (shared objects counted once)."""
+    seen = set() if seen is None else seen
+    total, stack = 0, [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return total
+
+
+class ProjectModels:
+    """The models serving one project version; never mutated (edits swap in a new ProjectModels)."""
+    __slots__ = ("project", "version", "translator", "requirements", "nbytes", "loaded_at")
+
+    def __init__(self, project, version, translator, requirements, nbytes=None):
+        self.project = project
+        self.version = version
+        self.translator = translator
+        self.requirements = requirements
+        self.nbytes = nbytes if nbytes is not None else self.measure()
+        self.loaded_at = time.time()
+
+    def measure(self):
+        seen = set()
+        req = self.requirements
+        return (approx_nbytes(self.translator.lex_prob, seen)
+                + approx_nbytes([req.records, req.postings, req.doc_terms, req.max_w, req._seq], seen))
+
+
+class ModelRegistry:
+    """
+    project id -> ProjectModels, loaded on demand from <root> and kept in an
+    LRU within budget_bytes.
+    """
+    def __init__(self, root="models", budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.resident = OrderedDict()   # project -> ProjectModels, least recently used first
+        self.counts = {}                # project -> {"loads", "evictions", "swaps", "hits"}
+        self._lock = threading.Lock()   # LRU + counters
+        self._project_locks = {}        # published project -> Lock (single-flight load / publish / edit)
+
+    # --- PATHS ---
+    def _dir(self, project, version=None):
+        base = os.path.join(self.root, check_project(project))
+        return base if version is None else os.path.join(base, version)
+
+    def current_version(self, project):
+        try:
+            with open(os.path.join(self._dir(project), "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def projects(self):
+        """Projects with a published snapshot."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(p for p in os.listdir(self.root)
+                      if PROJECT_RE.match(p) and os.path.exists(os.path.join(self.root, p, "CURRENT")))
+
+    def __contains__(self, project):
+        return project in self.resident or self.current_version(project) is not None
+
+    # --- LOOKUP ---
+    def _count(self, project, what, n=1):
+        c = self.counts.setdefault(project, {"loads": 0, "evictions": 0, "swaps": 0, "hits": 0})
+        c[what] += n
+
+    def _project_lock(self, project, publishing=False):
+        """
+        Single-flight lock of a project. Only projects with a CURRENT file (or
+        being published) get one, so unknown ids raise UnknownProject instead
+        of growing the lock table.
+        """
+        with self._lock:
+            lock = self._project_locks.get(project)
+        if lock is None:
+            if not publishing and self.current_version(project) is None:
+                raise UnknownProject(project)
+            with self._lock:
+                lock = self._project_locks.setdefault(project, threading.Lock())
+        return lock
+
+    def get(self, project):
+        """Models for project (loaded from its snapshot if not resident); raises UnknownProject."""
+        check_project(project)
+        with self._lock:
+            models = self.resident.get(project)
+            if models is not None:
+                self.resident.move_to_end(project)
+                self._count(project, "hits")
+                return models
+        with self._project_lock(project):
+            return self._get_locked(project)
+
+    def _get_locked(self, project):
+        """get() for a caller holding the project lock."""
+        # Another request may have loaded (or published) it meanwhile
+        with self._lock:
+            models = self.resident.get(project)
+            if models is not None:
+                self.resident.move_to_end(project)
+                self._count(project, "hits")
+                return models
+        version = self.current_version(project)
+        if version is None:
+            raise UnknownProject(project)
+        with instrumentation.stage("model_load"):
+            models = self._load(project, version)
+        log.info("[R] Loaded %s %s (%.1f MB)", project, version, models.nbytes / 2**20)
+        with self._lock:
+            self._count(project, "loads")
+            self._install(models)
+        return models
+
+    def _load(self, project, version):
+        path = self._dir(project, version)
+        translator = SMTTranslator()
+        translator.load(os.path.join(path, "smt.pkl"))
+        with open(os.path.join(path, "requirements.pkl"), "rb") as f:
+            requirements = pickle.load(f)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                nbytes = json.load(f)["nbytes"]
+        except (OSError, ValueError, KeyError):
+            nbytes = None
+        return ProjectModels(project, version, translator, requirements, nbytes)
+
+    def _install(self, models):
+        """Makes models the resident entry of its project, then evicts down to the budget. Caller holds _lock."""
+        self.resident[models.project] = models
+        self.resident.move_to_end(models.project)
+        total = sum(m.nbytes for m in self.resident.values())
+        while total > self.budget_bytes and len(self.resident) > 1:
+            victim, old = self.resident.popitem(last=False)
+            total -= old.nbytes
+            self._count(victim, "evictions")
+            log.info("[R] Evicted %s %s (%.1f MB)", victim, old.version, old.nbytes / 2**20)
+        if total > self.budget_bytes:
+            log.warning("[R] %s alone (%.1f MB) exceeds the model budget", models.project, total / 2**20)
+
+    def evict(self, project):
+        with self._lock:
+            if self.resident.pop(project, None) is None:
+                return False
+            self._count(project, "evictions")
+            return True
+
+    # --- PUBLISHING ---
+    def publish(self, project, translator, requirements, meta=None):
+        """
+        Writes translator + requirement records as the next version of project
+        and swaps it in. Requests already holding the previous version finish on it.
+        Returns the new version name.
+        """
+        index = requirements
+        if not isinstance(index, RequirementIndex):
+            index = RequirementIndex()
+            for rec in requirements:
+                index.upsert(rec)
+        with self._project_lock(project, publishing=True):
+            prev = self.current_version(project)
+            version = f"v{int(prev[1:]) + 1}" if prev else "v1"
+            path = self._dir(project, version)
+            os.makedirs(path, exist_ok=True)
+            translator.save(os.path.join(path, "smt.pkl"), meta=meta)
+            # The update() statistics are in the .stats sidecar now and reload
+            # lazily, so they do not stay resident (or escape measure()).
+            translator.train_stats = None
+            models = ProjectModels(project, version, translator, index)
+            _write_pickle(index, os.path.join(path, "requirements.pkl"))
+            _write_text(json.dumps({"nbytes": models.nbytes, "published_at": models.loaded_at}),
+                        os.path.join(path, "meta.json"))
+            # The version is live once CURRENT names it
+            _write_text(version, os.path.join(self._dir(project), "CURRENT"))
+            with self._lock:
+                self._count(project, "swaps")
+                self._install(models)
+            self._prune(project, keep=version)
+        log.info("[R] Published %s %s", project, version)
+        return version
+
+    def update_requirements(self, project, change):
+        """
+        Copy-on-write edit of a project's requirement set: change(index) runs
+        on a copy of the live index, the copy is written to the live version's
+        snapshot and swapped in with one reference assignment, so requests
+        keep the index they started with. A falsy result of change means
+        nothing changed (no write, no swap). Returns (result, live index).
+        """
+        check_project(project)
+        with self._project_lock(project):
+            models = self._get_locked(project)
+            index = models.requirements.copy()
+            result = change(index)
+            if not result:
+                return result, models.requirements
+            _write_pickle(index, os.path.join(self._dir(project, models.version), "requirements.pkl"))
+            updated = ProjectModels(project, models.version, models.translator, index, models.nbytes)
+            with self._lock:
+                if self.resident.get(project) is models:
+                    self.resident[project] = updated   # keeps its LRU position
+        return result, index
+
+    def _prune(self, project, keep):
+        base = self._dir(project)
+        versions = sorted((v for v in os.listdir(base) if re.fullmatch(r"v\d+", v)), key=lambda v: int(v[1:]))
+        for old in versions[:-KEEP_VERSIONS]:
+            if old != keep:
+                shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+
+    # --- STATS ---
+    def stats(self):
+        with self._lock:
+            resident = {p: {"version": m.version, "bytes": m.nbytes} for p, m in self.resident.items()}
+            counts = {p: dict(c) for p, c in self.counts.items()}
+        return {
+            "budget_bytes": self.budget_bytes,
+            "resident_bytes": sum(r["bytes"] for r in resident.values()),
+            "models": {p: {"resident": p in resident, **resident.get(p, {}), **counts.get(p, {})}
+                       for p in sorted(set(resident) | set(counts))},
+        }
+
+    def render_prometheus(self, prefix="pcc_model"):
+        """Resident bytes and load/evict/swap counters per project (Prometheus text format)."""
+        s = self.stats()
+        lines = [f"# HELP {prefix}_budget_bytes Memory budget of resident project models.",
+                 f"# TYPE {prefix}_budget_bytes gauge",
+                 f"{prefix}_budget_bytes {s['budget_bytes']}",
+                 f"# HELP {prefix}_resident_bytes Estimated memory of a resident project model.",
+                 f"# TYPE {prefix}_resident_bytes gauge"]
+        lines += [f'{prefix}_resident_bytes{{project="{p}"}} {m["bytes"]}'
+                  for p, m in s["models"].items() if m["resident"]]
+        for what in ("loads", "evictions", "swaps"):
+            lines += [f"# HELP {prefix}_{what}_total Project model {what}.",
+                      f"# TYPE {prefix}_{what}_total counter"]
+            lines += [f'{prefix}_{what}_total{{project="{p}"}} {m.get(what, 0)}' for p, m in s["models"].items()]
+        return "\n".join(lines) + "\n"
+
+
+def _write_text(text, path):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _write_pickle(obj, path):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
@@ -0,0 +1,336 @@
+import bisect
+import json
+import os
+import pickle
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+# --- COMPACT MODEL FORMAT ---
+# A DefectTranslator saved as a directory of flat .npy arrays that are opened
+# with numpy.memmap (np.load(mmap_mode="r")). Pages are file-backed, so several
+# brain workers loading the same model share one copy through the page cache.
+#
+#   meta.json                    format version, len_ratio, sizes
+#   vocab_blob / vocab_offsets   UTF-8 tokens, sorted bytewise (id = rank)
+#   lex_indptr / lex_tgt / lex_prob
+#                                CSR lexical table t(tgt|src), each row sorted by
+#                                probability (descending)
+#   lm_keys / lm_counts          trigram table, sorted packed (p2, p1, w) keys,
+#                                float32 counts (fractional after a decayed update)
+#   ctx_keys / ctx_counts        context table, sorted packed (p2, p1) keys,
+#                                float64 totals (older directories hold int64 counts)
+#   blm_*                        backoff models only: the CompactTrigramLM arrays in
+#                                its own token-id space, blm_tokens mapping those ids
+#                                to vocab ids (meta.json carries lm_smoothing,
+#                                lm_discount and lm_min_count)
+#
+# Context keys pack three 21-bit token ids into one int64, so they are exact
+# (collision-free) and can be binary-searched without a Python dict.
+
+FORMAT_VERSION = 1
+ID_BITS = 21
+MAX_VOCAB = 1 << ID_BITS
+
+
+def pack_ctx(p2, p1):
+    return (p2 << ID_BITS) | p1
+
+
+def pack_ngram(p2, p1, w):
+    return (((p2 << ID_BITS) | p1) << ID_BITS) | w
+
+
+class MappedVocab:
+    """
+    Token <-> id table over a memory-mapped, bytewise-sorted string blob.
+    Lookups are binary searches (memoized); nothing is materialized at load.
+    """
+    def __init__(self, blob, offsets):
+        self.blob = memoryview(blob)
+        self.offsets = offsets
+        self.lookup = lru_cache(maxsize=1 << 16)(self._lookup)
+        self.token = lru_cache(maxsize=1 << 16)(self._token)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def _token(self, i):
+        return self[i].decode("utf-8")
+
+    def _lookup(self, tok):
+        key = tok.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        if i < len(self) and self[i] == key:
+            return i
+        return -1
+
+
+class MappedLexicon:
+    """
+    Read-only stand-in for the nested lex_prob dict: lex.get(sw, {}) returns
+    {tw: prob} for one source word, decoded lazily from the CSR arrays.
+    """
+    def __init__(self, vocab, indptr, tgt, prob, row_cache=4096):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.tgt = tgt
+        self.prob = prob
+        self._row = lru_cache(maxsize=row_cache)(self._decode_row)
+
+    def _decode_row(self, sw):
+        i = self.vocab.lookup(sw)
+        if i < 0:
+            return None
+        lo, hi = int(self.indptr[i]), int(self.indptr[i + 1])
+        if lo == hi:
+            return None
+        token = self.vocab.token
+        return {token(t): p for t, p in zip(self.tgt[lo:hi].tolist(), self.prob[lo:hi].tolist())}
+
+    def get(self, sw, default=None):
+        row = self._row(sw)
+        return default if row is None else row
+
+    def __getitem__(self, sw):
+        row = self._row(sw)
+        if row is None:
+            raise KeyError(sw)
+        return row
+
+    def __contains__(self, sw):
+        return self._row(sw) is not None
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.indptr)))
+
+
+class _CountView:
+    """Read-only count lookup (missing -> 0) over sorted packed keys."""
+    def __init__(self, keys, counts):
+        self.keys = keys
+        self.counts = counts
+
+    def count(self, key):
+        if key < 0:
+            return 0
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and int(self.keys[i]) == key:
+            return self.counts[i].item()
+        return 0
+
+
+class _NgramRow:
+    def __init__(self, lm, ctx):
+        self.lm = lm
+        self.ctx = ctx
+
+    def __getitem__(self, w):
+        return self.lm.ngram_count(self.ctx, w)
+
+
+class _NgramView:
+    def __init__(self, lm):
+        self.lm = lm
+
+    def __getitem__(self, ctx):
+        return _NgramRow(self.lm, ctx)
+
+    def get(self, ctx, default=None):
+        return _NgramRow(self.lm, ctx)
+
+
+class _CtxView:
+    def __init__(self, lm):
+        self.lm = lm
+
+    def __getitem__(self, ctx):
+        return self.lm.ctx_count(ctx)
+
+
+class MappedTrigramLM:
+    """
+    Memory-mapped trigram counts. Unpacks like the (ngram, ctx_count) tuple
+    used by DefectTranslator._get_lm_score, but lookups never insert keys.
+    """
+    def __init__(self, vocab, lm_keys, lm_counts, ctx_keys, ctx_counts):
+        self.vocab = vocab
+        self.ngrams = _CountView(lm_keys, lm_counts)
+        self.contexts = _CountView(ctx_keys, ctx_counts)
+
+    def __iter__(self):
+        return iter((_NgramView(self), _CtxView(self)))
+
+    def __bool__(self):
+        return True
+
+    def _ctx_key(self, ctx):
+        p2, p1 = (self.vocab.lookup(t) for t in ctx)
+        return -1 if p2 < 0 or p1 < 0 else pack_ctx(p2, p1)
+
+    def ngram_count(self, ctx, w):
+        ck = self._ctx_key(ctx)
+        wid = self.vocab.lookup(w)
+        if ck < 0 or wid < 0:
+            return 0
+        return self.ngrams.count((ck << ID_BITS) | wid)
+
+    def ctx_count(self, ctx):
+        return self.contexts.count(self._ctx_key(ctx))
+
+
+# --- WRITER ---
+def _vocab_tokens(lex_prob, lm_data, extra=()):
+    toks = set(extra)
+    for sw, row in lex_prob.items():
+        toks.add(sw)
+        toks.update(row)
+    if lm_data:
+        ngram, ctx_count = lm_data
+        for ctx, row in ngram.items():
+            toks.update(ctx)
+            toks.update(row)
+    return sorted(t.encode("utf-8") for t in toks)
+
+
+def write_compact(model, path):
+    """
+    Writes a trained DefectTranslator (plain dict lexicon + Counter or
+    CompactTrigramLM) as a compact model directory. A backoff LM also keeps
+    its own arrays (blm_*), so the reloaded model scores identically.
+    """
+    lex_prob, lm_data = model.lex_prob, model.lm_data
+    backoff = getattr(lm_data, "smoothing", "addk") == "backoff"
+    compact_lm = lm_data if backoff else None
+    if hasattr(lm_data, "to_counts"):
+        lm_data = lm_data.to_counts()  # CompactTrigramLM (the format stores raw counts)
+    encoded = _vocab_tokens(lex_prob, lm_data, compact_lm.tokens if backoff else ())
+    if len(encoded) >= MAX_VOCAB:
+        raise ValueError(f"Vocabulary too large for the compact format ({len(encoded)} >= {MAX_VOCAB})")
+    ids = {b.decode("utf-8"): i for i, b in enumerate(encoded)}
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {}
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    arrays["vocab_offsets"] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    arrays["vocab_blob"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    # Lexical table: one CSR row per source id, sorted by probability (stable).
+    counts = np.zeros(len(encoded) + 1, dtype=np.int64)
+    rows = {}
+    for sw, row in lex_prob.items():
+        if row:
+            ordered = sorted(row.items(), key=lambda x: x[1], reverse=True)
+            rows[ids[sw]] = ordered
+            counts[ids[sw] + 1] = len(ordered)
+    indptr = np.cumsum(counts)
+    tgt = np.zeros(indptr[-1], dtype=np.int32)
+    prob = np.zeros(indptr[-1], dtype=np.float64)
+    for sid, ordered in rows.items():
+        lo = indptr[sid]
+        tgt[lo:lo + len(ordered)] = [ids[tw] for tw, _ in ordered]
+        prob[lo:lo + len(ordered)] = [p for _, p in ordered]
+    arrays.update(lex_indptr=indptr, lex_tgt=tgt, lex_prob=prob)
+
+    # Trigram table
+    lm_keys, lm_counts, ctx_keys, ctx_counts = [], [], [], []
+    if lm_data:
+        ngram, ctx_count = lm_data
+        for (p2, p1), row in ngram.items():
+            ck = pack_ctx(ids[p2], ids[p1])
+            for w, c in row.items():
+                if c > 0:
+                    lm_keys.append((ck << ID_BITS) | ids[w])
+                    lm_counts.append(c)
+        for (p2, p1), c in ctx_count.items():
+            if c > 0:
+                ctx_keys.append(pack_ctx(ids[p2], ids[p1]))
+                ctx_counts.append(c)
+    # Same count dtypes as CompactTrigramLM, so a decayed model keeps its fractional counts
+    for name, keys, vals, dtype in (("lm", lm_keys, lm_counts, np.float32), ("ctx", ctx_keys, ctx_counts, np.float64)):
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        arrays[f"{name}_keys"] = keys[order]
+        arrays[f"{name}_counts"] = np.asarray(vals, dtype=dtype)[order]
+    if backoff:
+        arrays["blm_tokens"] = np.array([ids[t] for t in compact_lm.tokens], dtype=np.int32)
+        for name in ("tri_keys", "tri_counts", "ctx_keys", "ctx_totals", "bi_keys", "bi_counts", "bi_totals", "uni"):
+            arrays[f"blm_{name}"] = getattr(compact_lm, name)
+
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), arr)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "id_bits": ID_BITS,
+        "len_ratio": getattr(model, "len_ratio", 1.0),
+        "has_lm": bool(lm_data),
+        "vocab_size": len(encoded),
+        "lex_entries": int(indptr[-1]),
+        "ngrams": len(lm_keys),
+        "lm_smoothing": "backoff" if backoff else "addk",
+        "lm_discount": compact_lm.discount if backoff else None,
+        "lm_min_count": getattr(model, "lm_min_count", 1),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# --- READER ---
+def load_compact(path):
+    """
+    Opens a compact model directory. Returns the attribute dict for a
+    DefectTranslator (lex_prob / lm_data backed by read-only memmaps).
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model version: {meta.get('format_version')}")
+
+    def arr(name):
+        # Plain ndarray views over the memmap: same shared pages, cheaper slicing.
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+
+    vocab = MappedVocab(arr("vocab_blob"), arr("vocab_offsets"))
+    lex = MappedLexicon(vocab, arr("lex_indptr"), arr("lex_tgt"), arr("lex_prob"))
+    lm = None
+    smoothing = meta.get("lm_smoothing", "addk")
+    if meta["has_lm"] and smoothing == "backoff":
+        from compact_lm import CompactTrigramLM
+
+        # Backoff needs the bigram/unigram tables and gammas, so score with the
+        # CompactTrigramLM itself (its arrays stay memmapped, the pruning copies
+        # are made once here).
+        tokens = [vocab.token(int(i)) for i in arr("blm_tokens")]
+        lm = CompactTrigramLM(
+            tokens, *(arr(f"blm_{name}") for name in
+                      ("tri_keys", "tri_counts", "ctx_keys", "ctx_totals", "bi_keys", "bi_counts", "bi_totals", "uni")),
+            min_count=meta["lm_min_count"], smoothing="backoff", discount=meta["lm_discount"])
+    elif meta["has_lm"]:
+        lm = MappedTrigramLM(vocab, arr("lm_keys"), arr("lm_counts"), arr("ctx_keys"), arr("ctx_counts"))
+    return {"lex_prob": lex, "lm_data": lm, "len_ratio": meta["len_ratio"], "vocab": vocab,
+            "lm_smoothing": smoothing, "lm_min_count": meta.get("lm_min_count", 1)}
+
+
+def convert_pickle(pickle_path, out_dir):
+    """
+    Converts a model written by DefectTranslator.save (pickled __dict__).
+    """
+    from mmloso_translator import DefectTranslator
+
+    model = DefectTranslator()
+    with open(pickle_path, "rb") as f:
+        model.__dict__.update(pickle.load(f))
+    return write_compact(model, out_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python model_store.py <model.pkl> <compact_model_dir>")
+        sys.exit(2)
+    info = convert_pickle(sys.argv[1], sys.argv[2])
+    print(f"Converted {sys.argv[1]} -> {sys.argv[2]}: {info}")
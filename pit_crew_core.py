@@ -1,17 +1,27 @@
 import re
 import math
 import json
-import pandas as pd
-import requests
+import logging
 import io
-import contextlib
+import pickle
+import shutil
 from collections import defaultdict, Counter
+# pandas, numpy/scipy (sparse_trainer) and streaming_metrics are imported on
+# first use, so a warm-started brain does not load them before it can serve.
+from log_store import DatasetManager
+from titans_store import TitansStore
+from tokenizer import SMT_TOKENIZER
+import instrumentation
 
 # --- CONFIGURATION ---
 # Set your OpenAI Key here or in environment variables
 import os
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TITANS_URL = "http://localhost:3000"  # Assuming mcp-titan is running
+TITANS_DB_PATH = os.getenv("PCC_TITANS_DB", "titans_memory_db.json")
+STREAM_THRESHOLD_BYTES = int(os.getenv("PCC_STREAM_THRESHOLD_MB", "2048")) * 2**20
+
+log = logging.getLogger("pit_crew.core")
 
 # --- MODULE A: THE TRANSLATOR (SMT) ---
 class SMTTranslator:
@@ -22,17 +32,34 @@ class SMTTranslator:
     def __init__(self):
         self.lex_prob = defaultdict(lambda: defaultdict(float))
         self.stops = {"the", "a", "is", "of", "to", "in", "for", "system"}
+        self.train_stats = None  # sparse_trainer.DiceStats kept by train() for update()
 
     def normalize(self, text):
-        text = re.sub(r"([.,!?;:])", r" \1 ", str(text).lower())
-        return [w for w in text.split() if w not in self.stops]
+        stops = self.stops
+        return [w for w in SMT_TOKENIZER.tokenize(text) if w not in stops]
 
-    def train(self, pairs):
+    def train(self, pairs, backend="sparse"):
         """
         pairs: List of (Requirement_Text, Defect_Text)
+        backend: "sparse" (vectorized co-occurrence) or "dict" (reference loops)
         """
-        print(f"[A] Training SMT on {len(pairs)} pairs...")
+        log.info("[A] Training SMT on %d pairs...", len(pairs))
         # Simple Co-occurrence training (Dice Coefficient for hackathon speed)
+        if backend == "sparse":
+            import sparse_trainer
+            src_docs = [self.normalize(src) for src, _ in pairs]
+            tgt_docs = [self.normalize(tgt) for _, tgt in pairs]
+            # Same values as sparse_trainer.dice_lexicon; the counts are kept for update()
+            self.train_stats = sparse_trainer.DiceStats(threshold=0.1)
+            self.train_stats.add(src_docs, tgt_docs)
+            dice = self.train_stats.dice()
+            sparse_trainer.to_lexicon(dice, self.train_stats.src_vocab, self.train_stats.tgt_vocab,
+                                      self.lex_prob, keep=dice.data > 0.1)
+            return
+        if backend != "dict":
+            raise ValueError(f"Unknown training backend: {backend}")
+        self.train_stats = None
+
         cooccur = defaultdict(int)
         src_counts = defaultdict(int)
         tgt_counts = defaultdict(int)
@@ -52,30 +79,186 @@ class SMTTranslator:
             if prob > 0.1: # Threshold
                 self.lex_prob[sw][tw] = prob
 
+    def update(self, new_pairs, decay=1.0):
+        """
+        Folds newly closed (Requirement_Text, Defect_Text) pairs into the
+        lexicon without retraining. decay < 1 down-weights older evidence.
+        With decay=1 the result equals train() on the concatenated corpus.
+        """
+        if self.train_stats is None and self.__dict__.get("_stats_path"):
+            with open(self._stats_path, "rb") as f:
+                self.train_stats = pickle.load(f)
+        if self.train_stats is None:
+            raise RuntimeError("update() needs the statistics kept by train(backend='sparse')")
+        log.info("[A] Updating SMT with %d pairs (decay %s)...", len(new_pairs), decay)
+        src_docs = [self.normalize(src) for src, _ in new_pairs]
+        tgt_docs = [self.normalize(tgt) for _, tgt in new_pairs]
+        rows = self.train_stats.add(src_docs, tgt_docs, decay)
+
+        # Copy-on-write: untouched rows are shared, touched rows are new dicts,
+        # and the table is published with one reference swap.
+        lex = defaultdict(lambda: defaultdict(float), self.lex_prob)
+        for sw, row in self.train_stats.lexicon_rows(rows, factory=lambda: defaultdict(float)).items():
+            if row:
+                lex[sw] = row
+            else:
+                lex.pop(sw, None)
+        self.lex_prob = lex
+        return len(rows)
+
     def translate(self, text):
-        toks = self.normalize(text)
-        guesses = Counter()
-        
-        for w in toks:
-            translations = self.lex_prob.get(w, {})
-            for t_word, prob in translations.items():
-                guesses[t_word] += prob
-        
-        # Return top 3 keywords
-        return [w for w, p in guesses.most_common(3)]
+        with instrumentation.stage("smt_translate"):
+            toks = self.normalize(text)
+            guesses = Counter()
+            lex = self.lex_prob  # one snapshot per call (update() swaps the table)
+
+            for w in toks:
+                translations = lex.get(w, {})
+                for t_word, prob in translations.items():
+                    guesses[t_word] += prob
+
+            # Return top 3 keywords
+            return [w for w, p in guesses.most_common(3)]
+
+    def translate_batch(self, texts):
+        """
+        translate() for many defects. Texts with the same normalized tokens
+        are translated once; results are in input order and identical to
+        calling translate() per text.
+        """
+        memo = {}
+        out = []
+        lex = self.lex_prob
+        for text in texts:
+            toks = tuple(self.normalize(text))
+            if toks not in memo:
+                guesses = Counter()
+                for w in toks:
+                    for t_word, prob in lex.get(w, {}).items():
+                        guesses[t_word] += prob
+                memo[toks] = [w for w, p in guesses.most_common(3)]
+            out.append(list(memo[toks]))
+        return out
+
+    # --- PERSISTENCE (warm start) ---
+    def save(self, path, meta=None):
+        """
+        Writes the lexicon (plain dicts) and meta to path. The update()
+        statistics go to path + ".stats" and are only read by update().
+        """
+        state = {"lex_prob": {sw: dict(row) for sw, row in self.lex_prob.items() if row},
+                 "stops": sorted(self.stops), "meta": meta or {}}
+        stats_path = path + ".stats"
+        stats_src = self.__dict__.get("_stats_path")
+        if self.train_stats is not None:
+            _dump_atomic(self.train_stats, stats_path)
+        elif stats_src and os.path.exists(stats_src):
+            # Not loaded yet (see update()): carry the sidecar over unread
+            if stats_src != stats_path:
+                tmp = f"{stats_path}.tmp{os.getpid()}"
+                shutil.copyfile(stats_src, tmp)
+                os.replace(tmp, stats_path)
+        elif os.path.exists(stats_path):
+            os.remove(stats_path)
+        if os.path.exists(stats_path):
+            self._stats_path = stats_path  # train_stats may now be dropped and reloaded by update()
+        _dump_atomic(state, path)
+
+    def load(self, path):
+        """Loads a snapshot written by save(); returns its meta dict."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        lex = defaultdict(lambda: defaultdict(float))
+        for sw, row in state["lex_prob"].items():
+            lex[sw] = defaultdict(float, row)
+        self.lex_prob = lex
+        self.stops = set(state["stops"])
+        self.train_stats = None
+        stats_path = path + ".stats"
+        self._stats_path = stats_path if os.path.exists(stats_path) else None
+        return state["meta"]
+
+
+def _dump_atomic(obj, path):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
 
 # --- MODULE B: THE ANALYST (Causal RAG via Python) ---
 class CausalAnalyst:
     """
     Generates and Executes Python Code to find facts.
     """
-    def __init__(self):
-        pass
+    def __init__(self, datasets=None, stream_threshold=STREAM_THRESHOLD_BYTES, executor=None, exec_timeout=None,
+                 cache=None, rollups=None):
+        # Columnar, memory-mapped log cache shared across requests
+        self.datasets = datasets if datasets is not None else DatasetManager()
+        # Logs larger than this are evaluated chunk by chunk (bounded memory)
+        self.stream_threshold = stream_threshold
+        # Optional sandbox.SandboxPool: generated code runs in pre-warmed,
+        # time- and memory-limited worker processes instead of in-process exec
+        self.executor = executor
+        self.exec_timeout = exec_timeout
+        # Optional result_cache.ResultCache: generated code per requirement and
+        # (fact, verdict) per code + log version
+        self.cache = cache
+        # rollup_index.RollupStore for windowed checks (created on first use)
+        self.rollups = rollups
 
-    def analyze(self, defect_context, requirement_text, csv_path):
-        print(f"[B] Analyzing Defect using Causal RAG...")
-        
-        # 1. Ask LLM to write code
+    def analyze(self, defect_context, requirement_text, csv_path, window=None):
+        """window: optional (start, end) around the defect; answered from the log's rollup index."""
+        if window is not None:
+            return self.analyze_window(defect_context, requirement_text, csv_path, *window)
+        if os.path.exists(csv_path) and os.path.getsize(csv_path) > self.stream_threshold:
+            return self.analyze_streaming(defect_context, requirement_text, csv_path)
+        log.info("[B] Analyzing Defect using Causal RAG...")
+
+        # 1. Ask LLM to write code (level-1 cache: same requirement + context -> same code)
+        with instrumentation.stage("code_gen"):
+            generated_code = self.cache.get_code(requirement_text, defect_context) if self.cache else None
+            cached_code = generated_code is not None
+            if not cached_code:
+                generated_code = self.generate_code(defect_context, requirement_text, csv_path)
+                if self.cache is not None:
+                    self.cache.put_code(requirement_text, defect_context, generated_code)
+        if cached_code:
+            log.info("    -> Reusing cached code")
+
+        # 2. Execute Code
+        try:
+            # Level-2 cache: same code on the same version of the log -> same fact
+            fp = self.cache.version(csv_path) if self.cache else None
+            hit = self.cache.get_result(generated_code, fp) if self.cache else None
+            if hit is not None:
+                log.info("    -> Cached Result: %s", hit[0])
+                return hit[1]
+            if self.executor is not None:
+                result = self.executor.run(generated_code, csv_path, timeout=self.exec_timeout)
+                # The worker opens the log itself; split its wall time into load + exec
+                instrumentation.record("csv_load", result.load_seconds)
+                instrumentation.record("exec", result.seconds - result.load_seconds)
+                if not result.ok:
+                    return f"Analysis Failed: {result.error}"
+                fact = result.stdout.strip()
+            else:
+                fact = self._exec_inline(generated_code, csv_path)
+            log.info("    -> Execution Result: %s", fact)
+            
+            # 3. Consultant Logic (Comparison)
+            # Simple logic for demo: Extract number and compare
+            metric = float(re.search(r"(\d+\.\d+)", fact).group(1))
+            limit = 500 # extracted from Req text
+            verdict = self._verdict(metric, limit)
+            if self.cache is not None:
+                self.cache.put_result(generated_code, fp, fact, verdict)
+            return verdict
+
+        except Exception as e:
+            return f"Analysis Failed: {str(e)}"
+
+    def generate_code(self, defect_context, requirement_text, csv_path):
+        """Asks the LLM for pandas code answering the requirement (mocked here)."""
         system_prompt = (
             "You are a Data Analyst. Write Python pandas code to analyze the provided CSV file. "
             "Calculate metrics relevant to the Requirement. "
@@ -86,50 +269,136 @@ class CausalAnalyst:
         
         # Simulate LLM Code Gen (Mocking OpenAI call for stability in local test)
         # In real app: call_openai(system_prompt, user_prompt)
-        print("    -> LLM Generating Code...")
+        log.info("    -> LLM Generating Code...")
         generated_code = f"""
 # AI Generated Code
 p99_latency = df['latency_ms'].quantile(0.99)
 print(f"P99 Latency: {{p99_latency:.2f}}ms")
 """
-        print(f"    -> Generated:\n{generated_code}")
+        log.debug("    -> Generated:\n%s", generated_code)
+        return generated_code
 
-        # 2. Execute Code
+    def _exec_inline(self, code, csv_path):
+        """
+        In-process fallback. Output is captured through a print bound into
+        the exec globals, so concurrent requests never swap sys.stdout.
+        """
+        import pandas as pd
+        # Shallow copy: generated code may add columns, never touches the cached frame
+        with instrumentation.stage("csv_load"):
+            df = self.datasets.get(csv_path).copy(deep=False)
+        output_capture = io.StringIO()
+
+        def captured_print(*args, **kwargs):
+            kwargs.setdefault("file", output_capture)
+            print(*args, **kwargs)
+
+        with instrumentation.stage("exec"):
+            exec(code, {'df': df, 'pd': pd, 'print': captured_print})
+        return output_capture.getvalue().strip()
+
+    def analyze_streaming(self, defect_context, requirement_text, csv_path, chunk_rows=None):
+        """
+        Same verdict as analyze(), computed from mergeable sketches over
+        chunks of the log (t-digest P99, status counts) in bounded memory.
+        """
+        log.info("[B] Analyzing Defect using streaming sketches...")
+        from streaming_metrics import DEFAULT_CHUNK_ROWS, summarize_log
+        chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+        sketch_key = f"# streaming t-digest P99, chunk_rows={chunk_rows}"
         try:
-            df = pd.read_csv(csv_path)
-            output_capture = io.StringIO()
-            with contextlib.redirect_stdout(output_capture):
-                exec(generated_code, {'df': df, 'pd': pd})
-            
-            fact = output_capture.getvalue().strip()
-            print(f"    -> Execution Result: {fact}")
-            
-            # 3. Consultant Logic (Comparison)
-            # Simple logic for demo: Extract number and compare
-            metric = float(re.search(r"(\d+\.\d+)", fact).group(1))
+            fp = self.cache.version(csv_path) if self.cache else None
+            hit = self.cache.get_result(sketch_key, fp) if self.cache else None
+            if hit is not None:
+                log.info("    -> Cached Result: %s", hit[0])
+                return hit[1]
+            summary = summarize_log(csv_path, chunk_rows)
+            metric = float(f"{summary.latency.quantile(0.99):.2f}")
+            fact = f"Streamed {summary.rows} rows: P99 Latency: {metric:.2f}ms, 5xx ratio {summary.error_ratio():.2%}"
+            log.info("    -> %s", fact)
             limit = 500 # extracted from Req text
-            if metric > limit:
-                return f"Compliance Violation: Observed {metric}ms > Limit {limit}ms"
-            return "Compliance OK"
+            verdict = self._verdict(metric, limit)
+            if self.cache is not None:
+                self.cache.put_result(sketch_key, fp, fact, verdict)
+            return verdict
+        except Exception as e:
+            return f"Analysis Failed: {str(e)}"
 
+    def analyze_window(self, defect_context, requirement_text, csv_path, start, end):
+        """
+        Verdict for the log rows in [start, end) (epoch seconds or ISO times),
+        merged from the per-minute rollups of the log (rollup_index.py): no
+        generated code and no raw rows read, apart from ingesting rows
+        appended since the last check.
+        """
+        log.info("[B] Analyzing Defect window %s .. %s from log rollups...", start, end)
+        try:
+            if self.rollups is None:
+                from rollup_index import RollupStore
+                self.rollups = RollupStore()
+            with instrumentation.stage("rollup_refresh"):
+                index = self.rollups.get(csv_path)
+            with instrumentation.stage("rollup_query"):
+                summary = index.query(start, end)
+            if not summary.lat_count:
+                return f"Analysis Failed: No log rows between {start} and {end}"
+            metric = float(f"{summary.quantile(0.99):.2f}")
+            fact = (f"Window of {summary.rows} rows: P99 Latency: {metric:.2f}ms, "
+                    f"5xx ratio {summary.error_ratio():.2%}")
+            log.info("    -> %s", fact)
+            limit = 500 # extracted from Req text
+            return self._verdict(metric, limit)
         except Exception as e:
             return f"Analysis Failed: {str(e)}"
 
+    def _verdict(self, metric, limit):
+        if metric > limit:
+            return f"Compliance Violation: Observed {metric}ms > Limit {limit}ms"
+        return "Compliance OK"
+
 # --- MODULE C: THE MANAGER (Titans Memory) ---
 class TitansManager:
     """
     Connects to the henryhawke/mcp-titan server
     """
+    # Built-in owners; facts in the memory store take precedence
+    DEFAULT_OWNERS = {
+        "Performance": "Jane Doe (High Affinity for Latency bugs)",
+        "UI": "John Smith (Owner of Frontend)",
+        "Security": "Mike Ross (Security Lead)"
+    }
+
+    def __init__(self, store=None):
+        # In a real run, recall hits the local API: http://localhost:3000/recall
+        # Here the memory is the indexed local store (titans_memory_db.json)
+        self.store = store if store is not None else TitansStore(TITANS_DB_PATH)
+        for context_key, owner in self.DEFAULT_OWNERS.items():
+            if context_key not in self.store:
+                self.store.remember(context_key, owner, persist=False)
+
     def assign(self, context_key):
-        print(f"[C] Querying Titans Memory for '{context_key}'...")
-        # In a real run, this hits the local API: http://localhost:3000/recall
-        # Here we mock the behavior of "Learning"
-        
-        # Simulating a stored pattern
-        memory_db = {
-            "Performance": "Jane Doe (High Affinity for Latency bugs)",
-            "UI": "John Smith (Owner of Frontend)",
-            "Security": "Mike Ross (Security Lead)"
-        }
-        
-        return memory_db.get(context_key, "Unassigned")
+        log.info("[C] Querying Titans Memory for '%s'...", context_key)
+        with instrumentation.stage("assignment"):
+            return self.store.best(context_key, "Unassigned")
+
+    def assign_batch(self, context_keys, developers=None, defect_load=None):
+        """
+        Workload-aware assignment of a whole batch (see assignment.py).
+        developers: [{"name", "load", "capacity"}]; defaults to every owner
+        in the memory store at load 0. Out-of-capacity defects get "Unassigned".
+        """
+        import assignment
+        if developers is None:
+            developers = [{"name": name} for name in self.store.developers()]
+        if defect_load is None:
+            defect_load = assignment.DEFAULT_DEFECT_LOAD
+        log.info("[C] Batch assignment: %d defects x %d developers", len(context_keys), len(developers))
+        with instrumentation.stage("assignment_batch"):
+            out = assignment.assign_batch(self.store, context_keys, developers, defect_load)
+        for rec in out:
+            rec["assignee"] = rec["assignee"] or "Unassigned"
+        return out
+
+    def learn(self, context_key, owner, weight=1.0, exclusive=False):
+        """Stores an ownership fact (journaled write-behind)."""
+        return self.store.remember(context_key, owner, weight=weight, exclusive=exclusive)
@@ -0,0 +1,186 @@
+import heapq
+import math
+import re
+import threading
+
+# --- REQUIREMENT STORE (Inverted Index) ---
+# Links SMT keywords to requirement ids without scanning every requirement.
+# Postings map token -> {req_id: weight}; a query is scored term-at-a-time in
+# decreasing order of each term's score upper bound, and once the remaining
+# upper bounds cannot lift a new requirement into the top-k we stop admitting
+# candidates (max-score style pruning). Results are exact. One lock covers
+# mutation and search (search also refreshes stale upper bounds), so
+# requests can upsert / delete while others query.
+
+TOKEN_RE = re.compile(r"\w+")
+DEFAULT_STOPS = frozenset([
+    "the", "a", "an", "and", "or", "to", "of", "in", "on", "for", "is", "are", "was", "were", "be",
+    "shall", "must", "should", "will", "not", "system", "user", "with", "by", "all", "that", "only",
+])
+
+
+class RequirementIndex:
+    """
+    Incremental inverted index over requirement records
+    ({"id", "text", optional "title", "tags", "context", "label", ...}).
+    """
+    def __init__(self, stops=DEFAULT_STOPS):
+        self.stops = stops
+        self.records = {}     # req_id -> record
+        self.postings = {}    # token -> {req_id: weight}
+        self.doc_terms = {}   # req_id -> [tokens] (for update/delete)
+        self.max_w = {}       # token -> max posting weight (upper bound)
+        self._stale = set()   # tokens whose max_w must be recomputed
+        self._seq = {}        # req_id -> insertion sequence (tie-break)
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        with self._lock:
+            return {k: v for k, v in self.__dict__.items() if k != "_lock"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def copy(self):
+        """Independent index with the same records (copy-on-write updates)."""
+        other = RequirementIndex.__new__(RequirementIndex)
+        with self._lock:
+            other.__dict__.update(self.__dict__)
+            other.records = dict(self.records)
+            other.postings = {t: dict(plist) for t, plist in self.postings.items()}
+            other.doc_terms = dict(self.doc_terms)
+            other.max_w = dict(self.max_w)
+            other._stale = set(self._stale)
+            other._seq = dict(self._seq)
+        other._lock = threading.Lock()
+        return other
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, req_id):
+        return req_id in self.records
+
+    def tokenize(self, text):
+        return [t for t in TOKEN_RE.findall(str(text).lower()) if t not in self.stops]
+
+    def _terms(self, record):
+        toks = self.tokenize(record.get("title", "")) + self.tokenize(record.get("text", ""))
+        for tag in record.get("tags", ()):
+            toks.extend(self.tokenize(tag))
+        tf = {}
+        for t in toks:
+            tf[t] = tf.get(t, 0) + 1
+        norm = math.sqrt(len(tf)) or 1.0
+        return {t: (1.0 + math.log(c)) / norm for t, c in tf.items()}
+
+    # --- MUTATION ---
+    def upsert(self, record):
+        """
+        Adds a requirement or replaces the one with the same id.
+        """
+        req_id = record["id"]
+        weights = self._terms(record)
+        with self._lock:
+            if req_id in self.records:
+                self._remove_postings(req_id)
+            else:
+                self._seq[req_id] = self._next_seq
+                self._next_seq += 1
+            self.records[req_id] = dict(record)
+            for t, w in weights.items():
+                self.postings.setdefault(t, {})[req_id] = w
+                if w > self.max_w.get(t, 0.0):
+                    self.max_w[t] = w
+            self.doc_terms[req_id] = list(weights)
+        return req_id
+
+    def delete(self, req_id):
+        with self._lock:
+            if req_id not in self.records:
+                return False
+            self._remove_postings(req_id)
+            del self.records[req_id]
+            del self._seq[req_id]
+        return True
+
+    def _remove_postings(self, req_id):
+        for t in self.doc_terms.pop(req_id, ()):
+            plist = self.postings.get(t)
+            if plist is None:
+                continue
+            w = plist.pop(req_id, 0.0)
+            if not plist:
+                del self.postings[t]
+                self.max_w.pop(t, None)
+                self._stale.discard(t)
+            elif w >= self.max_w.get(t, 0.0):
+                self._stale.add(t)
+
+    def get(self, req_id):
+        return self.records.get(req_id)
+
+    # --- QUERY ---
+    def _upper_bound(self, t, idf):
+        if t in self._stale:
+            self.max_w[t] = max(self.postings[t].values())
+            self._stale.discard(t)
+        return idf * self.max_w[t]
+
+    def search(self, keywords, k=5):
+        """
+        Ranks requirements for a bag of keywords.
+        Returns [(req_id, score)] best first (ties: oldest requirement first).
+        """
+        toks = list(dict.fromkeys(tok for kw in keywords for tok in self.tokenize(kw)))
+        with self._lock:
+            return self._search(toks, k)
+
+    def _search(self, toks, k):
+        n_docs = len(self.records)
+        terms = []
+        for t in toks:
+            plist = self.postings.get(t)
+            if plist:
+                idf = math.log(1.0 + n_docs / len(plist))
+                terms.append((self._upper_bound(t, idf), idf, plist))
+        if not terms or k <= 0:
+            return []
+        terms.sort(key=lambda x: x[0], reverse=True)
+
+        acc = {}
+        remaining = sum(ub for ub, _, _ in terms)
+        admitting = True
+        for ub, idf, plist in terms:
+            if admitting and len(acc) >= k:
+                theta = heapq.nlargest(k, acc.values())[-1]
+                if remaining <= theta:
+                    # No unseen requirement can reach the top-k any more.
+                    admitting = False
+                    acc = {d: s for d, s in acc.items() if s + remaining >= theta}
+            if admitting:
+                for d, w in plist.items():
+                    acc[d] = acc.get(d, 0.0) + idf * w
+            elif len(acc) < len(plist):
+                for d in acc:
+                    w = plist.get(d)
+                    if w is not None:
+                        acc[d] += idf * w
+            else:
+                for d, w in plist.items():
+                    if d in acc:
+                        acc[d] += idf * w
+            remaining -= ub
+
+        seq = self._seq
+        top = heapq.nsmallest(k, acc.items(), key=lambda x: (-x[1], seq[x[0]]))
+        return [(d, s) for d, s in top]
+
+    def best(self, keywords):
+        """
+        Best matching requirement record for the keywords, or None.
+        """
+        hits = self.search(keywords, k=1)
+        return self.records.get(hits[0][0]) if hits else None
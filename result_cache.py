@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from log_store import fingerprint
+
+# --- ANALYSIS RESULT CACHE ---
+# Two content-addressed levels in front of CausalAnalyst:
+#   code   : normalized (requirement text, defect context) -> generated code
+#   result : sha256(code) + dataset fingerprint (path, mtime, size) -> (fact, verdict)
+# Each level is an in-memory LRU with TTL, optionally backed by a SQLite file
+# that survives restarts. A rewritten log changes its fingerprint, so stale
+# results are never served; invalidate() also purges them eagerly.
+
+DEFAULT_TTL = float(os.getenv("PCC_RESULT_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    level   TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    source  TEXT,
+    expires REAL NOT NULL,
+    PRIMARY KEY (level, key)
+)
+"""
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def code_key(requirement_text, defect_context):
+    raw = f"{normalize_text(requirement_text)}\x1f{normalize_text(defect_context)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def result_key(code, fp):
+    path, mtime_ns, size = fp
+    raw = f"{hashlib.sha256(code.encode('utf-8')).hexdigest()}|{path}|{mtime_ns}|{size}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe two-level cache. Values are JSON-serializable.
+    db_path=None keeps everything in memory.
+    """
+    LEVELS = ("code", "result")
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mem = {level: OrderedDict() for level in self.LEVELS}  # key -> (value, source, expires)
+        self._lock = threading.Lock()
+        self.stats = {f"{level}_{what}": 0 for level in self.LEVELS for what in ("hits", "misses", "disk_hits")}
+        self.stats["invalidations"] = 0
+        self._versions = {}   # abspath -> last fingerprint seen
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(SCHEMA)
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_source ON cache (source)")
+            self._db.commit()
+
+    # --- GENERIC TIERS ---
+    def _get(self, level, key):
+        now = time.time()
+        with self._lock:
+            mem = self._mem[level]
+            hit = mem.get(key)
+            if hit is not None and hit[2] > now:
+                mem.move_to_end(key)
+                self.stats[f"{level}_hits"] += 1
+                return hit[0]
+            if hit is not None:
+                del mem[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, source, expires FROM cache WHERE level = ? AND key = ?",
+                                       (level, key)).fetchone()
+                if row is not None and row[2] > now:
+                    value = json.loads(row[0])
+                    self._remember(level, key, value, row[1], row[2])
+                    self.stats[f"{level}_hits"] += 1
+                    self.stats[f"{level}_disk_hits"] += 1
+                    return value
+            self.stats[f"{level}_misses"] += 1
+            return None
+
+    def _put(self, level, key, value, source=None):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(level, key, value, source, expires)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                                 (level, key, json.dumps(value), source, expires))
+                self._db.commit()
+
+    def _remember(self, level, key, value, source, expires):
+        mem = self._mem[level]
+        mem[key] = (value, source, expires)
+        mem.move_to_end(key)
+        while len(mem) > self.max_entries:
+            mem.popitem(last=False)
+
+    # --- LEVEL 1: generated code ---
+    def get_code(self, requirement_text, defect_context):
+        return self._get("code", code_key(requirement_text, defect_context))
+
+    def put_code(self, requirement_text, defect_context, code):
+        self._put("code", code_key(requirement_text, defect_context), code)
+
+    # --- LEVEL 2: facts + verdicts ---
+    # Callers take version(csv_path) once, before running the code, and pass
+    # it to both calls: a log rewritten mid-run then cannot get the old
+    # version's result stored under the new fingerprint.
+    def get_result(self, code, fp):
+        """(fact, verdict) for this code on log version fp, or None."""
+        hit = self._get("result", result_key(code, fp))
+        return tuple(hit) if hit is not None else None
+
+    def put_result(self, code, fp, fact, verdict):
+        self._put("result", result_key(code, fp), [fact, verdict], source=fp[0])
+
+    def version(self, csv_path):
+        """Fingerprint of csv_path; results of an older version are purged eagerly."""
+        fp = fingerprint(csv_path)
+        seen = self._versions.get(fp[0])
+        if seen != fp:
+            if seen is not None:
+                self.invalidate(fp[0])
+            self._versions[fp[0]] = fp
+        return fp
+
+    # --- MAINTENANCE ---
+    def invalidate(self, csv_path=None):
+        """
+        Drops cached results for one log file (all of them when csv_path is
+        None). Generated code does not depend on the data and is kept.
+        """
+        source = os.path.abspath(csv_path) if csv_path else None
+        with self._lock:
+            mem = self._mem["result"]
+            for key in [k for k, v in mem.items() if source is None or v[1] == source]:
+                del mem[key]
+            if self._db is not None:
+                if source is None:
+                    self._db.execute("DELETE FROM cache WHERE level = 'result'")
+                else:
+                    self._db.execute("DELETE FROM cache WHERE level = 'result' AND source = ?", (source,))
+                self._db.commit()
+            self.stats["invalidations"] += 1
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for mem in self._mem.values():
+                for key in [k for k, v in mem.items() if v[2] <= now]:
+                    del mem[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
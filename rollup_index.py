@@ -0,0 +1,439 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from log_store import DEFAULT_CACHE_DIR
+
+# --- TIME-BUCKETED LOG ROLLUPS ---
+# Pre-aggregated summaries of a log export (timestamp, latency_ms, status) so
+# that windowed compliance checks ("P99 latency / 5xx ratio between t0 and
+# t1") merge O(window / bucket) summaries instead of scanning raw rows.
+#
+# Per time bucket (60s by default) we keep rows, exact latency min / max /
+# sum, a count per status code, and a latency histogram over fixed
+# logarithmic bins (DDSketch style): bin i holds (GAMMA**(i-1), GAMMA**i], so
+# any quantile read from merged bins is within ALPHA relative error, and
+# merging two summaries is adding their counts. Histograms are stored sparse
+# (CSR: bucket -> (bin, count) entries).
+#
+# The index lives in one .npz next to the dataset cache and remembers how many
+# bytes of the CSV it has consumed. refresh() parses only the bytes appended
+# since (complete lines, plus a complete last row without a trailing newline),
+# builds the rollup of those rows and merges it into the buckets from the
+# first one they touch; a rewritten or truncated log, or one whose
+# unterminated last line was later extended, is rebuilt from scratch.
+
+ALPHA = 0.01                                   # relative accuracy of quantiles
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOG_GAMMA = math.log(GAMMA)
+MAX_LATENCY = 1e7                              # ms; larger values share the last bin
+N_BINS = int(math.ceil(math.log(MAX_LATENCY) / LOG_GAMMA)) + 1
+DEFAULT_BUCKET_SECONDS = 60
+READ_BLOCK_BYTES = 64 * 2**20
+CHECK_BYTES = 4096                             # prefix / tail fingerprint of the consumed bytes
+FORMAT_VERSION = 2   # 2: status codes always read as text
+
+log = logging.getLogger("pit_crew.rollup")
+
+
+def latency_bins(values):
+    """Histogram bin of each latency (ms): 0 for <= 1ms, else ceil(log_gamma(v))."""
+    v = np.maximum(np.asarray(values, dtype=np.float64), 1.0)
+    return np.minimum(np.ceil(np.log(v) / LOG_GAMMA), N_BINS - 1).astype(np.int64)
+
+
+def bin_values(bins):
+    """Representative latency of each bin (relative error <= ALPHA for its members)."""
+    bins = np.asarray(bins)
+    return np.where(bins == 0, 1.0, 2.0 * GAMMA ** bins / (GAMMA + 1.0))
+
+
+def to_seconds(value):
+    """Epoch seconds from a number or an ISO-8601 string (naive times are UTC)."""
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def timestamp_seconds(col):
+    """Timestamp column -> float seconds (numeric as-is, text parsed as datetimes; NaN if invalid)."""
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(dtype=np.float64, na_value=np.nan)
+    ts = pd.to_datetime(col, utc=True, errors="coerce")
+    return (ts - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class WindowSummary:
+    """Merged rollup of a time window: latency histogram, exact min / max, status counts."""
+    def __init__(self, rows, hist, lat_count, lat_sum, lat_min, lat_max, status):
+        self.rows = rows
+        self.hist = hist
+        self.lat_count = lat_count
+        self.lat_sum = lat_sum
+        self.lat_min = lat_min
+        self.lat_max = lat_max
+        self.status = status          # {code: count}
+
+    def quantile(self, q):
+        if not self.lat_count:
+            return math.nan
+        if q <= 0 or q >= 1:
+            return self.lat_min if q <= 0 else self.lat_max
+        rank = q * (self.lat_count - 1)
+        i = int(np.searchsorted(np.cumsum(self.hist), rank, side="right"))
+        # The exact extremes bound the bin estimate
+        return float(min(max(bin_values(i), self.lat_min), self.lat_max))
+
+    def mean(self):
+        return self.lat_sum / self.lat_count if self.lat_count else math.nan
+
+    def error_ratio(self, prefix="5"):
+        """Share of rows whose status starts with prefix (5xx by default)."""
+        total = sum(self.status.values())
+        if not total:
+            return 0.0
+        return sum(n for code, n in self.status.items() if code.startswith(prefix)) / total
+
+
+class Buckets:
+    """
+    Immutable columnar rollup: one row per non-empty bucket (sorted ids) plus
+    CSR histogram entries. Status columns follow the index's code list.
+    """
+    FIELDS = ("ids", "rows", "lat_count", "lat_sum", "lat_min", "lat_max", "status", "indptr", "bins", "counts")
+
+    def __init__(self, ids, rows, lat_count, lat_sum, lat_min, lat_max, status, indptr, bins, counts):
+        self.ids, self.rows, self.lat_count, self.lat_sum = ids, rows, lat_count, lat_sum
+        self.lat_min, self.lat_max, self.status = lat_min, lat_max, status
+        self.indptr, self.bins, self.counts = indptr, bins, counts
+
+    @classmethod
+    def empty(cls, n_codes=0):
+        z = np.zeros(0)
+        return cls(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64), z, z, z,
+                   np.zeros((0, n_codes), np.int64), np.zeros(1, np.int64), np.zeros(0, np.uint16),
+                   np.zeros(0, np.uint32))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in self.FIELDS)
+
+    def with_codes(self, n_codes):
+        """Same buckets with the status matrix widened to n_codes columns."""
+        if self.status.shape[1] == n_codes:
+            return self
+        status = np.zeros((len(self), n_codes), np.int64)
+        status[:, :self.status.shape[1]] = self.status
+        return Buckets(*(status if f == "status" else getattr(self, f) for f in self.FIELDS))
+
+    def slice(self, i, j):
+        lo, hi = self.indptr[i], self.indptr[j]
+        return Buckets(self.ids[i:j], self.rows[i:j], self.lat_count[i:j], self.lat_sum[i:j], self.lat_min[i:j],
+                       self.lat_max[i:j], self.status[i:j], self.indptr[i:j + 1] - lo, self.bins[lo:hi],
+                       self.counts[lo:hi])
+
+    @classmethod
+    def from_rows(cls, bucket, latency, code, n_codes):
+        """Rollup of raw rows: bucket id, latency (NaN = none) and status code index per row."""
+        if len(bucket) and (np.diff(bucket) < 0).any():
+            order = np.argsort(bucket, kind="stable")
+            bucket, latency, code = bucket[order], latency[order], code[order]
+        if not len(bucket):
+            return cls.empty(n_codes)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(bucket)) + 1])
+        ids = bucket[starts]
+        pos = np.repeat(np.arange(len(ids)), np.diff(np.concatenate([starts, [len(bucket)]])))
+        rows = np.bincount(pos, minlength=len(ids))
+        status = np.bincount(pos * n_codes + code, minlength=len(ids) * n_codes).reshape(len(ids), n_codes)
+
+        ok = ~np.isnan(latency)
+        lat_count = np.bincount(pos[ok], minlength=len(ids))
+        lat_sum = np.bincount(pos[ok], weights=latency[ok], minlength=len(ids))
+        if ok.all():
+            lat_min = np.minimum.reduceat(latency, starts)
+            lat_max = np.maximum.reduceat(latency, starts)
+        else:
+            lat_min = np.full(len(ids), np.inf)
+            lat_max = np.full(len(ids), -np.inf)
+            np.minimum.at(lat_min, pos[ok], latency[ok])
+            np.maximum.at(lat_max, pos[ok], latency[ok])
+        return cls._from_entries(ids, rows, lat_count, lat_sum, lat_min, lat_max, status,
+                                 pos[ok] * N_BINS + latency_bins(latency[ok]), None)
+
+    @classmethod
+    def _from_entries(cls, ids, rows, lat_count, lat_sum, lat_min, lat_max, status, keys, weights):
+        """Builds the CSR histogram from (bucket position * N_BINS + bin) keys, optionally weighted."""
+        span = len(ids) * N_BINS
+        if span <= 8 * max(len(keys), 1):
+            dense = np.bincount(keys, weights=weights, minlength=span)
+            keys = np.flatnonzero(dense)
+            counts = dense[keys]
+        else:
+            keys, inv = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inv.reshape(-1), weights=weights, minlength=len(keys))
+        indptr = np.searchsorted(keys // N_BINS, np.arange(len(ids) + 1))
+        return cls(ids, rows, lat_count, lat_sum, lat_min, lat_max, status, indptr.astype(np.int64),
+                   (keys % N_BINS).astype(np.uint16), np.rint(counts).astype(np.uint32))
+
+    def merge(self, other):
+        """Bucket-wise sum of two rollups (same status code list)."""
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        # Buckets before the first one other touches are shared untouched
+        cut = int(np.searchsorted(self.ids, other.ids[0]))
+        head, a, b = self.slice(0, cut), self.slice(cut, len(self)), other
+        ids = np.union1d(a.ids, b.ids)
+        pa, pb = np.searchsorted(ids, a.ids), np.searchsorted(ids, b.ids)
+
+        def add(x, y, dtype):
+            out = np.zeros((len(ids),) + x.shape[1:], dtype)
+            np.add.at(out, pa, x)
+            np.add.at(out, pb, y)
+            return out
+
+        lat_min = np.full(len(ids), np.inf)
+        lat_max = np.full(len(ids), -np.inf)
+        lat_min[pa], lat_max[pa] = a.lat_min, a.lat_max
+        lat_min[pb] = np.minimum(lat_min[pb], b.lat_min)
+        lat_max[pb] = np.maximum(lat_max[pb], b.lat_max)
+        keys = np.concatenate([np.repeat(pa, np.diff(a.indptr)) * N_BINS + a.bins,
+                               np.repeat(pb, np.diff(b.indptr)) * N_BINS + b.bins])
+        weights = np.concatenate([a.counts, b.counts]).astype(np.float64)
+        tail = Buckets._from_entries(ids, add(a.rows, b.rows, np.int64), add(a.lat_count, b.lat_count, np.int64),
+                                     add(a.lat_sum, b.lat_sum, np.float64), lat_min, lat_max,
+                                     add(a.status, b.status, np.int64), keys, weights)
+        if not len(head):
+            return tail
+        return Buckets(*(np.concatenate([getattr(head, f), getattr(tail, f)]) for f in self.FIELDS[:7]),
+                       np.concatenate([head.indptr, tail.indptr[1:] + head.indptr[-1]]),
+                       np.concatenate([head.bins, tail.bins]), np.concatenate([head.counts, tail.counts]))
+
+
+class RollupIndex:
+    """
+    Rollup of one CSV log. refresh() ingests appended rows; query(start, end)
+    merges the buckets overlapping [start, end) (epoch seconds or ISO strings).
+    Windows are widened to whole buckets.
+    """
+    def __init__(self, csv_path, index_path=None, bucket_seconds=DEFAULT_BUCKET_SECONDS,
+                 cache_dir=DEFAULT_CACHE_DIR, block_bytes=READ_BLOCK_BYTES,
+                 columns=("timestamp", "latency_ms", "status")):
+        self.csv_path = csv_path
+        if index_path is None:
+            digest = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:20]
+            index_path = os.path.join(cache_dir, "rollup", f"{digest}.npz")
+        self.index_path = index_path
+        self.bucket_seconds = bucket_seconds
+        self.block_bytes = block_bytes
+        self.ts_col, self.latency_col, self.status_col = columns
+        self.codes = []               # status code strings (column order of Buckets.status)
+        self.header = None            # CSV column names
+        self.offset = 0               # bytes of the CSV consumed (line boundary or EOF)
+        self.open_line = False        # the consumed bytes end in a line without a newline
+        self.checks = None            # (sha1 of the first, sha1 of the last CHECK_BYTES consumed)
+        self.skipped = 0              # rows without a usable timestamp
+        self.buckets = Buckets.empty()
+        self._lock = threading.Lock()
+        self.load()
+
+    # --- PERSISTENCE ---
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return False
+        with np.load(self.index_path) as data:
+            meta = json.loads(str(data["meta"]))
+            if (meta.get("version") != FORMAT_VERSION or meta["bucket_seconds"] != self.bucket_seconds
+                    or meta["alpha"] != ALPHA):
+                return False
+            self.buckets = Buckets(*(data[f] for f in Buckets.FIELDS))
+        self.codes, self.header, self.offset = meta["codes"], meta["header"], meta["offset"]
+        self.checks, self.skipped = tuple(meta["checks"]) if meta["checks"] else None, meta["skipped"]
+        self.open_line = meta.get("open_line", False)
+        return True
+
+    def save(self):
+        meta = {"version": FORMAT_VERSION, "source": os.path.abspath(self.csv_path),
+                "bucket_seconds": self.bucket_seconds, "alpha": ALPHA, "codes": self.codes, "header": self.header,
+                "offset": self.offset, "checks": self.checks, "skipped": self.skipped, "open_line": self.open_line}
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp = f"{self.index_path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, meta=np.array(json.dumps(meta)),
+                 **{f: getattr(self.buckets, f) for f in Buckets.FIELDS})
+        os.replace(tmp, self.index_path)
+
+    def nbytes(self):
+        return self.buckets.nbytes()
+
+    # --- INGESTION ---
+    def _fingerprint(self, f, offset):
+        f.seek(0)
+        head = hashlib.sha1(f.read(min(CHECK_BYTES, offset))).hexdigest()
+        f.seek(max(0, offset - CHECK_BYTES))
+        tail = hashlib.sha1(f.read(min(CHECK_BYTES, offset))).hexdigest()
+        return head, tail
+
+    def refresh(self):
+        """
+        Ingests rows appended since the last refresh (a rewritten log is
+        re-ingested from the start) and persists the index. Returns the number
+        of rows ingested.
+        """
+        with self._lock:
+            size = os.path.getsize(self.csv_path)
+            if size == self.offset and self.checks is not None:
+                return 0
+            with open(self.csv_path, "rb") as f:
+                if (self.checks is None or size < self.offset or self._fingerprint(f, self.offset) != self.checks
+                        or self.open_line and not self._starts_new_line(f)):
+                    if self.checks is not None:
+                        log.info("[R] %s was rewritten, rebuilding its rollup", self.csv_path)
+                    self._reset(f)
+                rows = self._ingest(f, size)
+                self.checks = self._fingerprint(f, self.offset)
+            self.save()
+            return rows
+
+    def _starts_new_line(self, f):
+        """Appended bytes after an unterminated last line must start a new line, not extend the row."""
+        f.seek(self.offset)
+        return f.read(1) in (b"\n", b"\r")
+
+    def _complete_row(self, line):
+        """An unterminated line is ingested only once it has every column (a writer may be mid-row)."""
+        return len(next(csv.reader([line.decode("utf-8", "replace")]), [])) >= len(self.header)
+
+    def _reset(self, f):
+        f.seek(0)
+        line = f.readline()
+        self.header = pd.read_csv(io.BytesIO(line), nrows=0).columns.tolist() if line.strip() else []
+        self.offset = len(line)
+        self.open_line = bool(line) and not line.endswith(b"\n")
+        self.codes, self.skipped = [], 0
+        self.buckets = Buckets.empty()
+        for col in (self.ts_col, self.latency_col):
+            if col not in self.header:
+                raise ValueError(f"{self.csv_path} has no '{col}' column")
+
+    def _ingest(self, f, size):
+        f.seek(self.offset)
+        usecols = [c for c in (self.ts_col, self.latency_col, self.status_col) if c in self.header]
+        rows, carry = 0, b""
+        buckets = self.buckets
+        while self.offset + len(carry) < size:
+            block = carry + f.read(min(self.block_bytes, size - self.offset - len(carry)))
+            end = block.rfind(b"\n") + 1
+            if self.offset + len(block) == size and end < len(block) and self._complete_row(block[end:]):
+                end = len(block)   # last line without a trailing newline (see _starts_new_line)
+            if end == 0:
+                break   # incomplete last line; picked up by a later refresh
+            carry = block[end:]
+            if block[:end].strip():
+                # Status as text: type inference per block would turn a block with an
+                # empty status into floats ("500.0", "nan")
+                chunk = pd.read_csv(io.BytesIO(block[:end]), header=None, names=self.header, usecols=usecols,
+                                    dtype={self.status_col: str})
+                delta = self._rollup(chunk)   # may add status codes
+                buckets = buckets.with_codes(len(self.codes)).merge(delta)
+                rows += len(chunk)
+            self.offset += end
+            self.open_line = not block[:end].endswith(b"\n")
+        self.buckets = buckets.with_codes(len(self.codes))
+        return rows
+
+    def _rollup(self, chunk):
+        ts = timestamp_seconds(chunk[self.ts_col])
+        keep = ~np.isnan(ts)
+        self.skipped += int((~keep).sum())
+        bucket = np.floor(ts[keep] / self.bucket_seconds).astype(np.int64)
+        latency = chunk[self.latency_col].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+        if self.status_col in chunk:
+            idx, uniq = pd.factorize(chunk[self.status_col].fillna(""), use_na_sentinel=False)
+            known = {c: i for i, c in enumerate(self.codes)}
+            for u in map(str, uniq):
+                if u not in known:
+                    known[u] = len(self.codes)
+                    self.codes.append(u)
+            code = np.array([known[str(u)] for u in uniq], dtype=np.int64)[idx][keep]
+        else:
+            code = np.zeros(int(keep.sum()), np.int64)
+            if not self.codes:
+                self.codes.append("")
+        return Buckets.from_rows(bucket, latency, code, len(self.codes))
+
+    # --- QUERIES ---
+    def query(self, start=None, end=None):
+        """WindowSummary of the buckets overlapping [start, end) (None = unbounded)."""
+        b = self.buckets   # one snapshot per query (refresh() swaps the reference)
+        i = 0 if start is None else int(np.searchsorted(b.ids, math.floor(to_seconds(start) / self.bucket_seconds)))
+        j = len(b) if end is None else int(np.searchsorted(b.ids, math.ceil(to_seconds(end) / self.bucket_seconds)))
+        lo, hi = b.indptr[i], b.indptr[j]
+        hist = np.bincount(b.bins[lo:hi], weights=b.counts[lo:hi], minlength=N_BINS)
+        status = b.status[i:j].sum(axis=0)
+        lat_count = int(b.lat_count[i:j].sum())
+        # Buckets with rows but no latencies hold +/-inf extremes; no latency at all is NaN
+        return WindowSummary(int(b.rows[i:j].sum()), hist, lat_count, float(b.lat_sum[i:j].sum()),
+                             float(b.lat_min[i:j].min()) if lat_count else math.nan,
+                             float(b.lat_max[i:j].max()) if lat_count else math.nan,
+                             {c: int(n) for c, n in zip(self.codes, status) if n})
+
+    def span(self):
+        """(first, last) bucket start in epoch seconds, or None when empty."""
+        if not len(self.buckets):
+            return None
+        return int(self.buckets.ids[0]) * self.bucket_seconds, int(self.buckets.ids[-1]) * self.bucket_seconds
+
+
+class RollupStore:
+    """csv path -> RollupIndex, refreshed when the file changed since the last get()."""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        self.cache_dir = cache_dir
+        self.bucket_seconds = bucket_seconds
+        self._indexes = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def get(self, csv_path):
+        key = os.path.abspath(csv_path)
+        st = os.stat(csv_path)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = RollupIndex(csv_path, cache_dir=self.cache_dir,
+                                                         bucket_seconds=self.bucket_seconds)
+        if self._seen.get(key) != (st.st_mtime_ns, st.st_size):
+            index.refresh()
+            self._seen[key] = (st.st_mtime_ns, st.st_size)
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds / updates the rollup index of a log export.")
+    parser.add_argument("csv")
+    parser.add_argument("--bucket-seconds", type=int, default=DEFAULT_BUCKET_SECONDS)
+    parser.add_argument("--index", help="index file (default: under the dataset cache)")
+    args = parser.parse_args(argv)
+    index = RollupIndex(args.csv, index_path=args.index, bucket_seconds=args.bucket_seconds)
+    rows = index.refresh()
+    print(f"Ingested {rows} new rows from {args.csv}: {len(index.buckets)} buckets, "
+          f"{index.nbytes() / 2**20:.1f} MB -> {index.index_path}")
+
+
+if __name__ == "__main__":
+    main()
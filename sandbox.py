@@ -0,0 +1,269 @@
+import io
+import os
+import pickle
+import queue
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+# --- SANDBOXED EXECUTION SERVICE ---
+# LLM-generated analysis code runs in a pool of pre-warmed worker processes
+# (pandas imported, hot log datasets already mapped) instead of a bare exec
+# inside the Flask request thread. Every job gets a wall-clock timeout, an
+# heap (data segment) limit and its own stdout capture; a worker is killed on
+# timeout and recycled after max_jobs jobs.
+#
+# Workers are plain `python sandbox.py --worker` subprocesses talking
+# length-prefixed pickles over stdin/stdout, so they never re-import the
+# server module and never fork a threaded process.
+
+HEADER = struct.Struct("!Q")
+
+
+class SandboxResult:
+    def __init__(self, ok, stdout="", error=None, seconds=0.0, load_seconds=0.0):
+        self.ok = ok
+        self.stdout = stdout
+        self.error = error
+        self.seconds = seconds
+        self.load_seconds = load_seconds  # part of seconds spent opening the log in the worker
+
+    def __repr__(self):
+        return f"SandboxResult(ok={self.ok}, stdout={self.stdout!r}, error={self.error!r})"
+
+
+def _send(stream, obj):
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def _read_exact(fd, n, deadline):
+    chunks, remaining = [], n
+    while remaining:
+        wait = None if deadline is None else deadline - time.monotonic()
+        if wait is not None and wait <= 0:
+            raise TimeoutError
+        ready, _, _ = select.select([fd], [], [], wait)
+        if not ready:
+            raise TimeoutError
+        data = os.read(fd, remaining)
+        if not data:
+            raise EOFError("sandbox worker exited")
+        chunks.append(data)
+        remaining -= len(data)
+    return b"".join(chunks)
+
+
+def _recv(fd, deadline=None):
+    (size,) = HEADER.unpack(_read_exact(fd, HEADER.size, deadline))
+    return pickle.loads(_read_exact(fd, size, deadline))
+
+
+class _Worker:
+    """Parent-side handle for one worker subprocess."""
+    def __init__(self, pool):
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--memory-mb", str(pool.memory_limit_mb)]
+        for path in pool.preload:
+            cmd += ["--preload", path]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     cwd=pool.cwd, env=env)
+        self.jobs = 0
+
+    def run(self, job, timeout):
+        _send(self.proc.stdin, job)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        reply = _recv(self.proc.stdout.fileno(), deadline)
+        self.jobs += 1
+        return reply
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class SandboxPool:
+    """
+    Pool of pre-warmed analysis workers.
+    submit() returns a concurrent.futures.Future[SandboxResult]; run() waits.
+    """
+    def __init__(self, workers=2, max_jobs=200, timeout=10.0, memory_limit_mb=2048, preload=(), cwd=None):
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.preload = [os.path.abspath(p) for p in preload]
+        self.cwd = cwd or os.getcwd()
+        self.stats = {"jobs": 0, "timeouts": 0, "errors": 0, "recycled": 0}
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._serve, name=f"sandbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, code, csv_path=None, timeout=None, memory_mb=None):
+        if self._closed:
+            raise RuntimeError("SandboxPool is shut down")
+        fut = Future()
+        job = {"code": code, "csv_path": os.path.abspath(csv_path) if csv_path else None, "memory_mb": memory_mb}
+        self._jobs.put((job, self.timeout if timeout is None else timeout, fut))
+        return fut
+
+    def run(self, code, csv_path=None, timeout=None, memory_mb=None):
+        return self.submit(code, csv_path, timeout, memory_mb).result()
+
+    def _spawn(self, old=None):
+        # Replaces a worker; a failed spawn leaves None and the next job retries.
+        if old is not None:
+            old.kill()
+        try:
+            return _Worker(self)
+        except Exception:
+            return None
+
+    def _serve(self):
+        # Every dequeued job resolves its future, whatever fails: the thread
+        # only exits on the shutdown sentinel.
+        worker = self._spawn()
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            job, timeout, fut = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            t0 = time.monotonic()
+            try:
+                if worker is None:
+                    worker = _Worker(self)
+                reply = worker.run(job, timeout)
+                result = SandboxResult(reply["ok"], reply.get("stdout", ""), reply.get("error"),
+                                       time.monotonic() - t0, reply.get("load_seconds", 0.0))
+            except TimeoutError:
+                self.stats["timeouts"] += 1
+                result = SandboxResult(False, error=f"Timed out after {timeout}s", seconds=time.monotonic() - t0)
+                worker = self._spawn(worker)
+            except Exception as e:
+                result = SandboxResult(False, error=f"Worker crashed: {type(e).__name__}: {e}",
+                                       seconds=time.monotonic() - t0)
+                worker = self._spawn(worker)
+            self.stats["jobs"] += 1
+            if not result.ok:
+                self.stats["errors"] += 1
+            if worker is not None and worker.jobs >= self.max_jobs:
+                self.stats["recycled"] += 1
+                worker = self._spawn(worker)
+            fut.set_result(result)
+        if worker is not None:
+            worker.kill()
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for t in self._threads:
+            t.join(timeout=5)
+
+
+# --- WORKER SIDE ---
+def _set_memory_limit(mb):
+    # RLIMIT_DATA (heap + private anonymous mappings) rather than RLIMIT_AS:
+    # the read-only memmaps of columnar logs are file-backed and must not
+    # count against the budget, however large the log is.
+    import resource
+    if not mb:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    limit = mb * 2**20
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+
+def _run_job(job, datasets, env, timings):
+    out = io.StringIO()
+
+    def captured_print(*args, **kwargs):
+        kwargs.setdefault("file", out)
+        print(*args, **kwargs)
+
+    g = dict(env, print=captured_print)
+    if job.get("csv_path"):
+        t0 = time.monotonic()
+        g["df"] = datasets.get(job["csv_path"]).copy(deep=False)
+        timings["load_seconds"] = time.monotonic() - t0
+    exec(job["code"], g)
+    return out.getvalue()
+
+
+def worker_main(memory_mb, preload):
+    # Protocol channel = the real stdout; anything else printed goes to stderr.
+    proto_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    sys.stdout = sys.stderr
+    proto_in = sys.stdin.buffer.fileno()
+
+    import resource
+
+    import numpy as np
+    import pandas as pd
+    from log_store import DatasetManager
+
+    _set_memory_limit(memory_mb)
+    datasets = DatasetManager()
+    for path in preload:
+        try:
+            datasets.get(path)
+        except Exception as e:
+            print(f"[sandbox] preload of {path} failed: {e}", file=sys.stderr)
+    env = {"pd": pd, "np": np, "__builtins__": __builtins__}
+
+    while True:
+        try:
+            job = _recv(proto_in)
+        except EOFError:
+            return
+        t0 = time.monotonic()
+        timings = {}
+        per_call = job.get("memory_mb")
+        saved_limit = resource.getrlimit(resource.RLIMIT_DATA)
+        try:
+            if per_call:
+                _set_memory_limit(min(per_call, memory_mb) if memory_mb else per_call)
+            reply = {"ok": True, "stdout": _run_job(job, datasets, env, timings)}
+        except MemoryError:
+            reply = {"ok": False, "error": "Memory limit exceeded"}
+        except BaseException as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            if per_call:
+                # Back to the limits from before this job, including "unlimited"
+                resource.setrlimit(resource.RLIMIT_DATA, saved_limit)
+        reply["seconds"] = time.monotonic() - t0
+        reply.update(timings)
+        _send(proto_out, reply)
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        import argparse
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--worker", action="store_true")
+        parser.add_argument("--memory-mb", type=int, default=0)
+        parser.add_argument("--preload", action="append", default=[])
+        args = parser.parse_args()
+        worker_main(args.memory_mb, args.preload)
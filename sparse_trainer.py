@@ -0,0 +1,446 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+
+from tokenizer import Vocab
+
+# --- VECTORIZED TRAINING BACKEND ---
+# Maps tokens to integer ids and computes the co-occurrence statistics used by
+# SMTTranslator / DefectTranslator as sparse matrix products instead of nested
+# Python loops over (sw, tw) tuples.
+
+
+def incidence_matrix(docs, vocab):
+    """
+    docs: List of token sequences.
+    Returns a binary CSR matrix (n_docs x |vocab|) marking which tokens
+    occur in each document (document frequency, not term frequency).
+    """
+    indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+    ids = []
+    for i, toks in enumerate(docs):
+        row = {vocab.add(t) for t in toks}
+        ids.extend(row)
+        indptr[i + 1] = len(ids)
+    indices = np.asarray(ids, dtype=np.int32)
+    data = np.ones(len(indices), dtype=np.int32)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(docs), len(vocab)))
+
+
+def cooccurrence(src_docs, tgt_docs):
+    """
+    Document-frequency and co-occurrence counts for a parallel corpus.
+    Returns (src_vocab, tgt_vocab, src_df, tgt_df, co) where co is a CSR
+    matrix with co[s, t] = number of pairs containing both s and t.
+    """
+    src_vocab, tgt_vocab = Vocab(), Vocab()
+    S = incidence_matrix(src_docs, src_vocab)
+    T = incidence_matrix(tgt_docs, tgt_vocab)
+
+    src_df = np.asarray(S.sum(axis=0)).ravel()
+    tgt_df = np.asarray(T.sum(axis=0)).ravel()
+    co = (S.T @ T).tocsr()
+    co.sort_indices()
+    return src_vocab, tgt_vocab, src_df, tgt_df, co
+
+
+def dice_matrix(src_df, tgt_df, co):
+    """
+    Dice coefficient 2*c(s,t) / (c(s) + c(t)) for every non-zero entry of co,
+    returned as a CSR matrix with the same sparsity pattern.
+    """
+    rows = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+    denom = src_df[rows] + tgt_df[co.indices]
+    dice = (2.0 * co.data) / denom
+    return sp.csr_matrix((dice, co.indices.copy(), co.indptr.copy()), shape=co.shape)
+
+
+def to_lexicon(mat, src_vocab, tgt_vocab, lexicon, keep=None):
+    """
+    Copies the (optionally masked) entries of a CSR matrix into a nested
+    dict-like lexicon: lexicon[src_token][tgt_token] = value.
+    """
+    src_toks = src_vocab.id_to_token
+    tgt_toks = tgt_vocab.id_to_token
+    indptr = mat.indptr
+    cols = mat.indices
+    vals = mat.data
+    if keep is None:
+        keep = np.ones(len(vals), dtype=bool)
+
+    for r in range(mat.shape[0]):
+        lo, hi = indptr[r], indptr[r + 1]
+        if lo == hi:
+            continue
+        m = keep[lo:hi]
+        if not m.any():
+            continue
+        row = lexicon[src_toks[r]]
+        for c, v in zip(cols[lo:hi][m].tolist(), vals[lo:hi][m].tolist()):
+            row[tgt_toks[c]] = v
+    return lexicon
+
+
+def dice_lexicon(src_docs, tgt_docs, lexicon, threshold=0.1):
+    """
+    Bulk Dice initialization: fills lexicon[sw][tw] for every pair whose
+    Dice coefficient exceeds threshold. Same values as the dict-based loop.
+    """
+    src_vocab, tgt_vocab, src_df, tgt_df, co = cooccurrence(src_docs, tgt_docs)
+    dice = dice_matrix(src_df, tgt_df, co)
+    return to_lexicon(dice, src_vocab, tgt_vocab, lexicon, keep=dice.data > threshold)
+
+
+# --- INCREMENTAL STATISTICS ---
+# Online updates keep the sufficient statistics instead of the corpus. Decay
+# of old evidence uses a global scale: stored values are true values / scale,
+# so decaying everything is `scale *= decay` (O(1)) and new evidence is added
+# with weight 1 / scale. Dice and t = c / total are ratios, hence independent
+# of the scale.
+RESCALE_BELOW = 1e-150
+
+
+def _grow(arr, n):
+    if len(arr) >= n:
+        return arr
+    return np.concatenate([arr, np.zeros(n - len(arr), dtype=arr.dtype)])
+
+
+def _row_dicts(mat, row_ids, src_vocab, tgt_vocab, keep=None, factory=dict):
+    """{src_token: {tgt_token: value}} for the given CSR rows (empty rows included)."""
+    src_toks, tgt_toks = src_vocab.id_to_token, tgt_vocab.id_to_token
+    out = {}
+    for r in np.asarray(row_ids, dtype=np.int64).tolist():
+        lo, hi = mat.indptr[r], mat.indptr[r + 1]
+        m = slice(lo, hi) if keep is None else np.flatnonzero(keep[lo:hi]) + lo
+        row = factory()
+        for c, v in zip(mat.indices[m].tolist(), mat.data[m].tolist()):
+            row[tgt_toks[c]] = v
+        out[src_toks[r]] = row
+    return out
+
+
+class DiceStats:
+    """
+    Sufficient statistics of the Dice lexicon (document frequencies and
+    co-occurrence counts) that can absorb new pairs, with optional decay.
+    """
+    def __init__(self, threshold=0.1):
+        self.threshold = threshold
+        self.src_vocab, self.tgt_vocab = Vocab(), Vocab()
+        self.src_df = np.zeros(0)
+        self.tgt_df = np.zeros(0)
+        self.co = sp.csr_matrix((0, 0))
+        self.scale = 1.0
+
+    def add(self, src_docs, tgt_docs, decay=1.0):
+        """
+        Folds new pairs in (after decaying the old evidence by decay).
+        Returns the source row ids whose Dice values may have changed.
+        """
+        self.scale *= decay
+        if self.scale < RESCALE_BELOW:
+            self.src_df, self.tgt_df, self.co = self.src_df * self.scale, self.tgt_df * self.scale, self.co * self.scale
+            self.scale = 1.0
+        S = incidence_matrix(src_docs, self.src_vocab)
+        T = incidence_matrix(tgt_docs, self.tgt_vocab)
+        shape = (len(self.src_vocab), len(self.tgt_vocab))
+        w = 1.0 / self.scale
+
+        s_new = np.asarray(S.sum(axis=0)).ravel()
+        t_new = np.asarray(T.sum(axis=0)).ravel()
+        self.src_df = _grow(self.src_df, shape[0]) + w * s_new
+        self.tgt_df = _grow(self.tgt_df, shape[1]) + w * t_new
+        co = self.co.astype(np.float64)
+        co.resize(shape)
+        self.co = (co + w * (S.T @ T)).tocsr()
+        self.co.sort_indices()
+
+        # Changed: rows seen in the new pairs, and every row sharing a changed column.
+        touched_cols = np.zeros(shape[1], dtype=bool)
+        touched_cols[t_new > 0] = True
+        rows = np.repeat(np.arange(shape[0]), np.diff(self.co.indptr))
+        return np.union1d(np.flatnonzero(s_new), rows[touched_cols[self.co.indices]])
+
+    def dice(self):
+        return dice_matrix(self.src_df, self.tgt_df, self.co)
+
+    def lexicon_rows(self, row_ids, factory=dict):
+        """Dice rows above threshold as {src_token: {tgt_token: dice}}."""
+        mat = self.dice()
+        return _row_dicts(mat, row_ids, self.src_vocab, self.tgt_vocab, keep=mat.data > self.threshold,
+                          factory=factory)
+
+
+# --- IBM MODEL 1 EM ENGINE ---
+NULL = "<NULL>"
+EPS_PROB = 1e-6  # t(f|e) for pairs that are not (yet) in the table
+
+
+def pad_ids(rows, width=None):
+    """
+    Packs a list of id lists into a (n, width) int32 array padded with -1.
+    """
+    width = width if width is not None else max((len(r) for r in rows), default=0)
+    out = np.full((len(rows), max(width, 1)), -1, dtype=np.int32)
+    for i, r in enumerate(rows):
+        out[i, :len(r)] = r
+    return out
+
+
+def expected_counts(src_pad, tgt_pad, pkeys, n_tgt, t, counts):
+    """
+    Batched E-step over one chunk of padded sentence pairs.
+    t holds t(f|e) aligned with the sorted pattern keys (e * n_tgt + f);
+    expected counts are accumulated into counts (same alignment).
+    Returns the chunk log-likelihood sum_f log(1/(l+1) * sum_e t(f|e)).
+    """
+    s_valid = src_pad >= 0
+    t_valid = tgt_pad >= 0
+    valid = s_valid[:, :, None] & t_valid[:, None, :]
+    keys = src_pad.astype(np.int64)[:, :, None] * n_tgt + tgt_pad[:, None, :]
+    idx = np.searchsorted(pkeys, keys[valid])
+
+    vals = np.zeros(valid.shape, dtype=np.float64)
+    vals[valid] = t[idx]
+    z = vals.sum(axis=1)  # (chunk, tgt_len): normalization per target word
+    safe_z = np.where(t_valid, z, 1.0)
+    post = vals / safe_z[:, None, :]
+    counts += np.bincount(idx, weights=post[valid], minlength=len(counts))
+
+    src_len = s_valid.sum(axis=1, keepdims=True)
+    return float(np.log(safe_z / src_len)[t_valid].sum())
+
+
+class IBM1Trainer:
+    """
+    Vectorized IBM Model 1 trainer.
+    The corpus is tokenized and encoded exactly once into padded integer
+    chunks; t(f|e) lives in a flat array aligned with the CSR co-occurrence
+    pattern (every (e, f) pair that can ever receive probability mass).
+    """
+    def __init__(self, src_docs, tgt_docs, threshold=0.1, chunk_size=2048):
+        self.chunk_size = max(1, int(chunk_size))
+        self.src_vocab, self.tgt_vocab, src_df, tgt_df, co = cooccurrence(src_docs, tgt_docs)
+        dice = dice_matrix(src_df, tgt_df, co)
+        null_id = self.src_vocab.add(NULL)
+
+        # Alignment pattern = observed co-occurrences + a NULL row over all targets.
+        null_cols = np.flatnonzero(tgt_df > 0).astype(np.int32)
+        indptr = np.concatenate([dice.indptr, [dice.indptr[-1] + len(null_cols)]])
+        self.indices = np.concatenate([dice.indices, null_cols])
+        self.indptr = indptr
+        self.rows = np.repeat(np.arange(len(self.src_vocab)), np.diff(indptr))
+        self.n_tgt = max(len(self.tgt_vocab), 1)
+        self.pkeys = self.rows.astype(np.int64) * self.n_tgt + self.indices
+
+        # Dice entries above threshold seed t; everything else starts at EPS_PROB.
+        init = np.full(len(self.indices), EPS_PROB)
+        keep = np.zeros(len(self.indices), dtype=bool)
+        keep[:dice.nnz] = dice.data > threshold
+        init[keep] = dice.data[keep[:dice.nnz]]
+        self.t = init
+        self.present = keep
+        self.normalized = False   # t rows are distributions (after the first M-step)
+        # Expected counts behind t (sufficient statistics for update()), see RESCALE_BELOW
+        self.counts = np.zeros(len(self.t))
+        self.scale = 1.0
+
+        self.chunks = []
+        for lo in range(0, len(src_docs), self.chunk_size):
+            hi = lo + self.chunk_size
+            src_ids = [[null_id] + self.src_vocab.encode(d) for d in src_docs[lo:hi]]
+            tgt_ids = [self.tgt_vocab.encode(d) for d in tgt_docs[lo:hi]]
+            self.chunks.append((pad_ids(src_ids), pad_ids(tgt_ids)))
+
+    def e_step(self, chunks=None):
+        counts = np.zeros(len(self.t))
+        loglik = 0.0
+        for src_pad, tgt_pad in (self.chunks if chunks is None else chunks):
+            loglik += expected_counts(src_pad, tgt_pad, self.pkeys, self.n_tgt, self.t, counts)
+        return counts, loglik
+
+    def m_step(self, counts):
+        total_s = np.bincount(self.rows, weights=counts, minlength=len(self.src_vocab))
+        seen = counts > 0
+        self.t = np.where(seen, counts / np.where(total_s[self.rows] > 0, total_s[self.rows], 1.0), self.t)
+        self.present |= seen
+        self.counts, self.scale = counts, 1.0
+        self.normalized = True
+
+    def iterate(self, e_step=None):
+        """
+        One EM pass. Returns the log-likelihood of the corpus under the
+        parameters before the update, or None for the first pass: its E-step
+        runs on the Dice seeds (as the dict reference does), which are not
+        normalized per source word, so their "likelihood" is not comparable.
+        e_step may be a ParallelEStep.
+        """
+        normalized = self.normalized
+        counts, loglik = (e_step or self.e_step)()
+        self.m_step(counts)
+        return loglik if normalized else None
+
+    def lexicon(self, lexicon):
+        return to_lexicon(self._t_matrix(), self.src_vocab, self.tgt_vocab, lexicon, keep=self.present)
+
+    def lexicon_rows(self, row_ids, factory=dict):
+        """t(f|e) rows as {src_token: {tgt_token: prob}} (present entries only)."""
+        return _row_dicts(self._t_matrix(), row_ids, self.src_vocab, self.tgt_vocab, keep=self.present,
+                          factory=factory)
+
+    def _t_matrix(self):
+        return sp.csr_matrix((self.t, self.indices, self.indptr),
+                             shape=(len(self.src_vocab), len(self.tgt_vocab)))
+
+    def update(self, src_docs, tgt_docs, decay=1.0, em_iter=1):
+        """
+        Online (stepwise) EM: extends the vocabularies and the alignment
+        pattern with the new pairs, decays the stored expected counts, and
+        re-estimates t(f|e) for the touched source rows from
+        old counts + expected counts of the new pairs (em_iter E-steps over
+        the new pairs only). Returns (touched row ids, log-likelihood).
+        """
+        null_id = self.src_vocab.get(NULL)
+        S = incidence_matrix([[NULL] + list(d) for d in src_docs], self.src_vocab)
+        T = incidence_matrix(tgt_docs, self.tgt_vocab)
+        pairs = (S.T @ T).tocoo()
+
+        # Re-key the pattern for the grown target vocabulary and merge the new pairs.
+        n_tgt = max(len(self.tgt_vocab), 1)
+        old_keys = self.rows.astype(np.int64) * n_tgt + self.indices  # still sorted
+        new_keys = np.unique(pairs.row.astype(np.int64) * n_tgt + pairs.col)
+        at = np.searchsorted(old_keys, new_keys)
+        fresh = (at == len(old_keys)) | (old_keys[np.minimum(at, len(old_keys) - 1)] != new_keys)
+        keys = np.insert(old_keys, at[fresh], new_keys[fresh])
+        pos = np.arange(len(old_keys)) + np.searchsorted(new_keys[fresh], old_keys)
+        t = np.full(len(keys), EPS_PROB)
+        t[pos] = self.t
+        counts = np.zeros(len(keys))
+        counts[pos] = self.counts
+        present = np.zeros(len(keys), dtype=bool)
+        present[pos] = self.present
+        self.pkeys, self.n_tgt, self.t, self.present = keys, n_tgt, t, present
+        self.rows = (keys // n_tgt).astype(np.int64)
+        self.indices = (keys % n_tgt).astype(np.int32)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(self.rows, minlength=len(self.src_vocab)))])
+
+        self.scale *= decay
+        if self.scale < RESCALE_BELOW:
+            counts, self.scale = counts * self.scale, 1.0
+        touched = np.flatnonzero(np.asarray(S.sum(axis=0)).ravel())
+        row_mask = np.zeros(len(self.src_vocab), dtype=bool)
+        row_mask[touched] = True
+        entry_mask = row_mask[self.rows]
+
+        batch = []
+        for lo in range(0, len(src_docs), self.chunk_size):
+            src_ids = [[null_id] + self.src_vocab.encode(d) for d in src_docs[lo:lo + self.chunk_size]]
+            tgt_ids = [self.tgt_vocab.encode(d) for d in tgt_docs[lo:lo + self.chunk_size]]
+            batch.append((pad_ids(src_ids), pad_ids(tgt_ids)))
+
+        loglik, stored = 0.0, counts
+        for _ in range(max(1, em_iter)):
+            new, loglik = self.e_step(batch)
+            stored = counts + new / self.scale
+            total_s = np.bincount(self.rows, weights=stored, minlength=len(self.src_vocab))
+            seen = entry_mask & (stored > 0)
+            self.t = np.where(seen, stored / np.where(total_s[self.rows] > 0, total_s[self.rows], 1.0), self.t)
+        self.counts = stored
+        self.present |= entry_mask & (stored > 0)
+        return touched, loglik
+
+
+# --- PARALLEL E-STEP (sharded across processes) ---
+_ATTACHED = {}  # worker-side cache: shm name -> (SharedMemory, ndarray)
+
+
+def _share(blocks, arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[...] = arr
+    blocks.append(shm)
+    return (shm.name, arr.shape, arr.dtype.str), view
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    hit = _ATTACHED.get(name)
+    if hit is None:
+        # Workers share the parent's resource tracker; the parent unlinks every block.
+        shm = shared_memory.SharedMemory(name=name)
+        hit = _ATTACHED[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    return hit[1]
+
+
+def _e_step_shard(job):
+    src_flat = _attach(job["src"])
+    tgt_flat = _attach(job["tgt"])
+    pkeys = _attach(job["pkeys"])
+    t = _attach(job["t"])
+    counts = _attach(job["out"])[job["shard"]]
+    counts[:] = 0.0
+    loglik = 0.0
+    for (s_off, s_shape), (t_off, t_shape) in job["chunks"]:
+        src_pad = src_flat[s_off:s_off + s_shape[0] * s_shape[1]].reshape(s_shape)
+        tgt_pad = tgt_flat[t_off:t_off + t_shape[0] * t_shape[1]].reshape(t_shape)
+        loglik += expected_counts(src_pad, tgt_pad, pkeys, job["n_tgt"], t, counts)
+    return loglik
+
+
+class ParallelEStep:
+    """
+    Shards an IBM1Trainer corpus across a ProcessPoolExecutor.
+    The encoded corpus, the pattern keys and t(f|e) live in shared memory, so
+    each iteration only ships shard descriptors; workers write their partial
+    expected counts into a per-shard row that the parent sums for the M-step.
+    """
+    def __init__(self, trainer, workers):
+        self.trainer = trainer
+        self.workers = max(1, int(workers))
+        self._blocks = []
+
+        chunks = trainer.chunks
+        layout, src_parts, tgt_parts, s_off, t_off = [], [], [], 0, 0
+        for src_pad, tgt_pad in chunks:
+            layout.append(((s_off, src_pad.shape), (t_off, tgt_pad.shape)))
+            src_parts.append(src_pad.ravel())
+            tgt_parts.append(tgt_pad.ravel())
+            s_off += src_pad.size
+            t_off += tgt_pad.size
+        empty = np.zeros(0, dtype=np.int32)
+        src_spec, _ = _share(self._blocks, np.concatenate(src_parts) if src_parts else empty)
+        tgt_spec, _ = _share(self._blocks, np.concatenate(tgt_parts) if tgt_parts else empty)
+        pkeys_spec, _ = _share(self._blocks, trainer.pkeys)
+        t_spec, self._t = _share(self._blocks, trainer.t)
+
+        # Contiguous shards with roughly equal numbers of chunks.
+        n_shards = min(self.workers, max(len(chunks), 1))
+        bounds = np.linspace(0, len(chunks), n_shards + 1).astype(int)
+        out_spec, self._out = _share(self._blocks, np.zeros((n_shards, len(trainer.t))))
+        self.jobs = [
+            {"src": src_spec, "tgt": tgt_spec, "pkeys": pkeys_spec, "t": t_spec, "out": out_spec,
+             "shard": i, "chunks": layout[bounds[i]:bounds[i + 1]], "n_tgt": trainer.n_tgt}
+            for i in range(n_shards)
+        ]
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __call__(self):
+        self._t[:] = self.trainer.t
+        loglik = sum(self.pool.map(_e_step_shard, self.jobs))
+        return self._out.sum(axis=0), loglik
+
+    def close(self):
+        self.pool.shutdown()
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,151 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# --- STREAMING LOG METRICS ---
+# Bounded-memory compliance metrics for logs larger than RAM. Rows flow
+# through a chunked generator pipeline into mergeable sketches: a t-digest
+# for latency quantiles and running counts per status code.
+
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+class TDigest:
+    """
+    Merging t-digest (k1 / arcsin scale). Centroids are recompressed in bulk
+    with NumPy: points are sorted, mapped to k-scale buckets and collapsed
+    with np.add.reduceat. Memory is O(delta) regardless of input size.
+    """
+    def __init__(self, delta=500, buffer_size=100_000):
+        self.delta = delta
+        self.buffer_size = buffer_size
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buf = []
+        self._buf_n = 0
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + self._buf_n
+
+    def update(self, values):
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return self
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        self._buf.append(v)
+        self._buf_n += len(v)
+        if self._buf_n >= self.buffer_size:
+            self._flush()
+        return self
+
+    def merge(self, other):
+        """Folds another digest into this one (digests are mergeable)."""
+        other._flush()
+        self._flush()
+        if len(other.weights):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _flush(self):
+        if not self._buf:
+            return
+        v = np.concatenate(self._buf)
+        self._buf, self._buf_n = [], 0
+        self._compress(np.concatenate([self.means, v]), np.concatenate([self.weights, np.ones(len(v))]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_mid = (np.cumsum(weights) - weights / 2.0) / total
+        k = self.delta / (2.0 * math.pi) * np.arcsin(np.clip(2.0 * q_mid - 1.0, -1.0, 1.0))
+        bucket = np.floor(k)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(bucket)) + 1])
+        w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / w
+        self.weights = w
+
+    def quantile(self, q):
+        self._flush()
+        if not len(self.weights):
+            return math.nan
+        if len(self.weights) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2.0
+        t = q * total
+        # Tails interpolate towards the exact observed min / max.
+        xs = np.concatenate([[0.0], centers, [total]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(t, xs, ys))
+
+    def to_arrays(self):
+        self._flush()
+        return self.means.copy(), self.weights.copy(), self.min, self.max
+
+    @classmethod
+    def from_arrays(cls, means, weights, vmin, vmax, delta=500):
+        d = cls(delta=delta)
+        d.means = np.asarray(means, dtype=np.float64)
+        d.weights = np.asarray(weights, dtype=np.float64)
+        d.min, d.max = float(vmin), float(vmax)
+        return d
+
+
+class LogSummary:
+    """
+    Mergeable per-log sketch: latency digest + status code counts.
+    """
+    def __init__(self, delta=500):
+        self.latency = TDigest(delta=delta)
+        self.status = Counter()
+        self.rows = 0
+
+    def update(self, chunk, latency_col="latency_ms", status_col="status"):
+        if latency_col in chunk:
+            self.latency.update(chunk[latency_col].to_numpy(dtype=np.float64, na_value=np.nan))
+        if status_col in chunk:
+            for code, n in chunk[status_col].astype(str).value_counts().items():
+                self.status[code] += int(n)
+        self.rows += len(chunk)
+        return self
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.status.update(other.status)
+        self.rows += other.rows
+        return self
+
+    def error_ratio(self, prefix="5"):
+        """Share of rows whose status starts with prefix (5xx by default)."""
+        total = sum(self.status.values())
+        if not total:
+            return 0.0
+        return sum(n for code, n in self.status.items() if code.startswith(prefix)) / total
+
+
+def iter_log_chunks(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS, columns=("latency_ms", "status")):
+    """
+    Generator over DataFrame chunks of a (possibly huge) CSV log, reading
+    only the metric columns that exist in the file.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for c in columns if c in header] or None
+    yield from pd.read_csv(csv_path, chunksize=chunk_rows, usecols=usecols)
+
+
+def summarize_log(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS, delta=500):
+    summary = LogSummary(delta=delta)
+    for chunk in iter_log_chunks(csv_path, chunk_rows):
+        summary.update(chunk)
+    return summary
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+# --- TITANS MEMORY STORE ---
+# Ownership memory behind TitansManager. Facts keep the sentence format the
+# LocalTitans helper in test_brain.js writes into titans_memory_db.json
+# ({"short_term": [...], "long_term": [...]}), e.g.
+#   Fact: Developer 'Jane_Doe' is the exclusive owner of the 'Tax_Service'.
+#   Fact: Developer 'Jane Doe' is an owner of the 'Performance' (affinity 2).
+# Everything is loaded once into a hash index (normalized key -> owners);
+# new facts go to an append-only journal that is flushed in the background
+# (write-behind) and folded back into the main file by compact().
+# A path ending in .db / .sqlite selects the SQLite backend instead.
+
+SECTIONS = ("short_term", "long_term")
+FACT_RE = re.compile(
+    r"^Fact: Developer '(?P<owner>[^']+)' is (?:the (?P<exclusive>exclusive) owner|an owner) "
+    r"of the '(?P<key>[^']+)'(?: \(affinity (?P<weight>[0-9.eE+-]+)\))?\.?$"
+)
+DEFAULT_COMPACT_EVERY = 50_000   # journal entries before compaction
+DEFAULT_FLUSH_INTERVAL = 1.0     # seconds between write-behind flushes
+
+log = logging.getLogger("pit_crew.titans")
+
+
+def normalize_key(key):
+    return re.sub(r"[\s_\-]+", " ", str(key)).strip().lower()
+
+
+def format_fact(key, owner, weight=1.0, exclusive=False):
+    if "'" in key or "'" in owner:
+        raise ValueError("Keys and owners cannot contain single quotes")
+    if exclusive:
+        # An exclusive owner keeps its affinity only when compaction merged it with a later fact
+        if weight == 1.0:
+            return f"Fact: Developer '{owner}' is the exclusive owner of the '{key}'."
+        return f"Fact: Developer '{owner}' is the exclusive owner of the '{key}' (affinity {weight:g})."
+    return f"Fact: Developer '{owner}' is an owner of the '{key}' (affinity {weight:g})."
+
+
+def parse_fact(fact):
+    """(key, owner, weight, exclusive) for an ownership fact, else None."""
+    m = FACT_RE.match(fact) if isinstance(fact, str) else None
+    if not m:
+        return None
+    return m["key"], m["owner"], float(m["weight"] or 1.0), bool(m["exclusive"])
+
+
+class TitansStore:
+    """
+    Indexed, persistent ownership memory.
+    owners(key) / best(key) are dict lookups; remember() is O(1) plus a
+    buffered journal append.
+    """
+    def __init__(self, path="titans_memory_db.json", compact_every=DEFAULT_COMPACT_EVERY,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.backend = "sqlite" if path.endswith((".db", ".sqlite")) else "json"
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self.sections = {s: [] for s in SECTIONS}   # facts in file order
+        self._known = set()                           # (section, fact) dedup
+        self.index = {}                               # norm key -> {owner: (weight, exclusive, seq)}
+        self._ranked = {}                             # norm key -> [owners] (cache)
+        self._seq = 0
+        self._pending = []                            # (section, fact) not yet written
+        self._journal_len = 0
+        self._lock = threading.RLock()
+        self._db = None
+        self.load()
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                             name="titans-write-behind", daemon=True)
+            self._flusher.start()
+
+    # --- LOADING ---
+    def load(self):
+        """Reads the whole store (and replays the journal) in O(size)."""
+        with self._lock:
+            if self.backend == "sqlite":
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS facts "
+                                 "(seq INTEGER PRIMARY KEY, section TEXT NOT NULL, fact TEXT NOT NULL)")
+                self._db.commit()
+                for section, fact in self._db.execute("SELECT section, fact FROM facts ORDER BY seq"):
+                    self._apply(section, fact)
+                return
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for section in SECTIONS:
+                    for fact in data.get(section, []):
+                        self._apply(section, fact)
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._apply(entry["section"], entry["fact"])
+                            self._journal_len += 1
+
+    def _apply(self, section, fact):
+        if (section, fact) in self._known:
+            return False
+        self._known.add((section, fact))
+        self.sections[section].append(fact)
+        parsed = parse_fact(fact)
+        if parsed:
+            key, owner, weight, exclusive = parsed
+            nk = normalize_key(key)
+            owners = self.index.setdefault(nk, {})
+            prev = owners.get(owner)
+            # Latest fact for (key, owner) sets the affinity; first-seen order breaks ties
+            owners[owner] = (weight, exclusive or bool(prev and prev[1]), prev[2] if prev else self._seq)
+            self._seq += 1
+            self._ranked.pop(nk, None)
+        return True
+
+    # --- QUERIES ---
+    def owners(self, key, k=None):
+        """Owners of a context key / component, best first."""
+        nk = normalize_key(key)
+        ranked = self._ranked.get(nk)
+        if ranked is None:
+            with self._lock:
+                entries = self.index.get(nk, {})
+                ranked = [o for o, _ in sorted(entries.items(), key=lambda kv: (not kv[1][1], -kv[1][0], kv[1][2]))]
+                self._ranked[nk] = ranked
+        return ranked[:k] if k else list(ranked)
+
+    def best(self, key, default=None):
+        ranked = self._ranked.get(normalize_key(key))
+        if ranked is None:
+            ranked = self.owners(key)
+        return ranked[0] if ranked else default
+
+    def affinities(self, key):
+        """{owner: (weight, exclusive)} recorded for a context key / component."""
+        with self._lock:
+            return {o: (w, ex) for o, (w, ex, _) in self.index.get(normalize_key(key), {}).items()}
+
+    def developers(self):
+        """Every owner named by a fact, first-seen order."""
+        with self._lock:
+            seen = {}
+            for owners in self.index.values():
+                for owner, (_, _, seq) in owners.items():
+                    if seq < seen.get(owner, seq + 1):
+                        seen[owner] = seq
+            return sorted(seen, key=seen.get)
+
+    def __contains__(self, key):
+        return normalize_key(key) in self.index
+
+    def __len__(self):
+        return sum(len(v) for v in self.sections.values())
+
+    # --- WRITES ---
+    def remember(self, key, owner, weight=1.0, exclusive=False, section="long_term", persist=True):
+        """
+        Records an ownership fact. Persisted facts are journaled write-behind;
+        persist=False only updates the in-memory index (e.g. built-in defaults).
+        """
+        return self.remember_fact(format_fact(key, owner, weight, exclusive), section, persist)
+
+    def remember_fact(self, fact, section="long_term", persist=True):
+        if section not in SECTIONS:
+            raise ValueError(f"Unknown memory section: {section}")
+        with self._lock:
+            if not self._apply(section, fact):
+                return False
+            if persist:
+                self._pending.append((section, fact))
+            else:
+                self._known.discard((section, fact))
+                self.sections[section].pop()
+        return True
+
+    def flush(self):
+        """Writes buffered facts (journal append or one SQLite transaction)."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            if self.backend == "sqlite":
+                self._db.executemany("INSERT INTO facts (section, fact) VALUES (?, ?)", pending)
+                self._db.commit()
+            else:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps({"section": s, "fact": fact}) + "\n" for s, fact in pending))
+                self._journal_len += len(pending)
+                if self._journal_len >= self.compact_every:
+                    self.compact()
+            return len(pending)
+
+    def compact(self):
+        """
+        Folds the journal into the main JSON file (atomic replace), keeping
+        one fact per (key, owner): the latest affinity, exclusive if any fact
+        was, at the position of the first fact so first-seen tie-breaks
+        survive a reload. SQLite stores are compacted the same way in place.
+        """
+        with self._lock:
+            merged = {}   # (norm key, owner) -> [section, position, key, weight, exclusive]
+            for section in SECTIONS:
+                for i, fact in enumerate(self.sections[section]):
+                    parsed = parse_fact(fact)
+                    if parsed:
+                        key, owner, weight, exclusive = parsed
+                        m = merged.get((normalize_key(key), owner))
+                        if m is None:
+                            merged[(normalize_key(key), owner)] = [section, i, key, weight, exclusive]
+                        else:
+                            m[3], m[4] = weight, exclusive or m[4]
+            for section in SECTIONS:
+                kept = [(i, fact) for i, fact in enumerate(self.sections[section]) if parse_fact(fact) is None]
+                kept += [(i, format_fact(key, owner, weight, exclusive))
+                         for (_, owner), (s, i, key, weight, exclusive) in merged.items() if s == section]
+                self.sections[section] = [fact for _, fact in sorted(kept, key=lambda e: e[0])]
+            self._known = {(s, fact) for s in SECTIONS for fact in self.sections[s]}
+            # Anything still buffered is part of self.sections and gets written now
+            self._pending = []
+            if self.backend == "sqlite":
+                self._db.execute("DELETE FROM facts")
+                self._db.executemany("INSERT INTO facts (section, fact) VALUES (?, ?)",
+                                     [(s, fact) for s in SECTIONS for fact in self.sections[s]])
+                self._db.commit()
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.sections, f, indent=2)
+            os.replace(tmp, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_len = 0
+
+    def _flush_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning("[C] Titans journal flush failed: %s", e)
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """Upgrades a titans_memory_db.json (+ journal) to a SQLite store."""
+    src = TitansStore(json_path, flush_interval=0)
+    dst = TitansStore(db_path, flush_interval=0)
+    for section in SECTIONS:
+        for fact in src.sections[section]:
+            dst.remember_fact(fact, section)
+    dst.close()
+    src.close()
+    return db_path